@@ -1,32 +1,155 @@
-from flask import Flask
-import pandas as pd
 from sqlalchemy import text
 from flask_sqlalchemy import SQLAlchemy
 import logging
 import random
-from flask import Flask, jsonify
-from faker import Faker
+from flask import Blueprint, Flask, current_app, jsonify
 from datetime import date, timedelta, datetime
 import os
 import urllib
-import calendar
+import sys
+import base64
+import io
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.exc import OperationalError, ProgrammingError
-app = Flask(__name__)
 
-db_user = 'postgres'
-db_pass = 'password'
-db_host = 'localhost'
-db_name = 'dblight'
-db_port = '5432'
+# Código compartilhado (comum/) fica na raiz do repositório
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from comum import conexao, copia_postgres, esquemas, metricas
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
+# A aplicação é montada por criar_app() (no fim do arquivo): as rotas ficam no blueprint e o
+# SQLAlchemy é ligado a ela com init_app. pandas, NumPy e Faker são importados dentro das funções
+# que os usam, então importar o módulo e criar a aplicação não os carrega.
+bp = Blueprint('flasklight', __name__)
+db = SQLAlchemy()
 logging.basicConfig(level=logging.INFO)
 
-#Inicializa o Faker aqui, no escopo global
-fake = Faker('pt_BR')
+TIMEOUT_LEITURA_API_MS = int(os.environ.get('FLASKLIGHT_TIMEOUT_LEITURA_MS', 15_000))  # Limite das consultas das APIs de leitura
+
+# --- Instrumentação (métricas no formato do Prometheus, em GET /metrics) ---
+# Latência por rota (before/after_request), tempo e linhas por comando SQL (eventos do engine do
+# SQLAlchemy), espera por conexão no pool (PoolComMetricas) e tempo das conversões do Pandas
+# (cronometrar_pandas). Os comandos SQL são agrupados por operação + primeira tabela, para manter
+# a cardinalidade dos labels baixa.
+METRICA_ROTAS = 'flasklight_http_request_duration_seconds'
+METRICA_SQL = 'flasklight_sql_duration_seconds'
+METRICA_SQL_LINHAS = 'flasklight_sql_rows_total'
+METRICA_SQL_ERROS = 'flasklight_sql_errors_total'
+METRICA_POOL_ESPERA = 'flasklight_pool_checkout_wait_seconds'
+METRICA_POOL_CONEXOES = 'flasklight_pool_connections'
+METRICA_PANDAS = 'flasklight_pandas_duration_seconds'
+METRICA_CACHES = 'flasklight_cache_events_total'
+METRICA_JOBS = 'flasklight_jobs'
+
+metricas.registrar(METRICA_ROTAS, metricas.HISTOGRAMA, "Latência das requisições por rota, método e status.")
+metricas.registrar(METRICA_SQL, metricas.HISTOGRAMA, "Duração dos comandos SQL por operação e tabela.")
+metricas.registrar(METRICA_SQL_LINHAS, metricas.CONTADOR, "Linhas afetadas/retornadas (rowcount) pelos comandos SQL.")
+metricas.registrar(METRICA_SQL_ERROS, metricas.CONTADOR, "Comandos SQL que terminaram em erro.")
+metricas.registrar(METRICA_POOL_ESPERA, metricas.HISTOGRAMA,
+                   "Espera para obter uma conexão do pool (inclui abrir uma conexão nova).")
+metricas.registrar(METRICA_POOL_CONEXOES, metricas.GAUGE, "Conexões do pool por estado, no momento da coleta.")
+metricas.registrar(METRICA_PANDAS, metricas.HISTOGRAMA, "Duração das leituras e conversões do Pandas por operação.")
+metricas.registrar(METRICA_CACHES, metricas.CONTADOR, "Eventos dos caches em memória (dimensões e API dos marts).")
+metricas.registrar(METRICA_JOBS, metricas.GAUGE, "Jobs em memória por tipo e status, no momento da coleta.")
+
+_RE_COMENTARIO_SQL = re.compile(r'--[^\n]*')
+_RE_TABELA_SQL = re.compile(r'\b(?:FROM|INTO|UPDATE|(?:TABLE|VIEW|SEQUENCE)(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+([\w."]+)',
+                            re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def rotulo_sql(comando):
+    """Rótulo de um comando SQL para as métricas: operação e primeira tabela (ex.: 'SELECT public.clientes_bruto')."""
+    texto = _RE_COMENTARIO_SQL.sub('', comando).strip()
+    if not texto:
+        return 'VAZIO'
+    operacao = texto.split(None, 1)[0].upper()
+    tabela = _RE_TABELA_SQL.search(texto)
+    return f"{operacao} {tabela.group(1)}" if tabela else operacao
+
+
+def _antes_do_comando_sql(conn, cursor, comando, parametros, contexto, executemany):
+    conn.info.setdefault('inicio_comandos', []).append(time.perf_counter())
+
+
+def _depois_do_comando_sql(conn, cursor, comando, parametros, contexto, executemany):
+    inicio = conn.info['inicio_comandos'].pop()
+    rotulo = rotulo_sql(comando)
+    metricas.observar(METRICA_SQL, time.perf_counter() - inicio, comando=rotulo)
+    if cursor.rowcount >= 0:  # -1 quando o driver não sabe (ex.: cursor do lado do servidor)
+        metricas.incrementar(METRICA_SQL_LINHAS, cursor.rowcount, comando=rotulo)
+
+
+def _erro_no_comando_sql(contexto):
+    if contexto.connection is not None and contexto.connection.info.get('inicio_comandos'):
+        contexto.connection.info['inicio_comandos'].pop()
+    metricas.incrementar(METRICA_SQL_ERROS, comando=rotulo_sql(contexto.statement or ''))
+
+
+def instrumentar_engine(engine):
+    """Liga os eventos de tempo/linhas/erros de SQL a um engine do SQLAlchemy."""
+    event.listen(engine, 'before_cursor_execute', _antes_do_comando_sql)
+    event.listen(engine, 'after_cursor_execute', _depois_do_comando_sql)
+    event.listen(engine, 'handle_error', _erro_no_comando_sql)
+
+
+class PoolComMetricas(QueuePool):
+    """QueuePool que registra quanto tempo cada checkout esperou por uma conexão."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metricas.observar(METRICA_POOL_ESPERA, time.perf_counter() - inicio)
+
+
+def cronometrar_pandas(operacao):
+    """Mede uma leitura/conversão do Pandas (ex.: 'read_sql_dimensoes', 'to_html_duplicatas')."""
+    return metricas.cronometrar(METRICA_PANDAS, operacao=operacao)
+
+
+@bp.before_app_request
+def iniciar_cronometro_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+
+
+@bp.after_app_request
+def registrar_latencia_requisicao(resposta):
+    # Em respostas em streaming, mede até o início do envio (o corpo é gerado depois)
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule is not None else 'nao_encontrada'
+        metricas.observar(METRICA_ROTAS, time.perf_counter() - inicio,
+                          rota=rota, metodo=request.method, status=resposta.status_code)
+    return resposta
+
+
+def engine_leitura():
+    """Engine das consultas analíticas somente leitura: o bind 'leitura', se configurado, senão o principal."""
+    return db.engines.get('leitura', db.engine)
+
+
+@lru_cache(maxsize=1)
+def obter_faker():
+    """Faker pt_BR do processo, criado no primeiro uso (só as rotas de geração de clientes precisam dele)."""
+    from faker import Faker
+    return Faker('pt_BR')
+
+
 DADOS_BASE = {}
 
 MAP_ESTADOS_ID = {
@@ -36,14 +159,75 @@ MAP_ESTADOS_ID = {
 }
 
 
-# --- Lógica de Setup ---
+# --- Cache das Dimensões ---
+# DADOS_BASE é um snapshot imutável, trocado inteiro a cada recarga: quem leu o snapshot continua
+# usando-o até o fim da requisição. As localizações ficam em forma colunar (para cada coluna,
+# códigos int32 por linha + valores distintos), o que permite sortear N linhas com um único
+# rng.integers. Passado o TTL, a próxima leitura devolve o snapshot antigo e dispara a recarga em
+# uma thread de fundo; POST /dimensoes/invalidar força a recarga (ex.: depois de um dbt run).
+TTL_DIMENSOES_SEGUNDOS = int(os.environ.get('FLASKLIGHT_TTL_DIMENSOES', 300))
+ESPERA_APOS_FALHA_SEGUNDOS = 30  # Nova tentativa de recarga depois de uma falha
+COLUNAS_LOCALIZACAO = ['id_localizacao', 'id_estado', 'cidade', 'estado_sigla']
+
+METRICAS_DIMENSOES = {
+    'hits': 0,  # Leituras servidas por um snapshot dentro do TTL
+    'stale': 0,  # Leituras servidas por um snapshot expirado enquanto a recarga roda em segundo plano
+    'misses': 0,  # Leituras que precisaram carregar as dimensões na hora (cache vazio)
+    'recargas': 0,
+    'recargas_em_segundo_plano': 0,
+    'falhas_recarga': 0,
+    'invalidacoes': 0,
+    'segundos_ultima_recarga': None,
+    'ultima_recarga_em': None,
+}
+_LOCK_DIMENSOES = threading.Lock()
+# Protegido por _LOCK_DIMENSOES; 'pid' é o processo cuja thread está recarregando (após um fork, não há thread no filho)
+_ESTADO_RECARGA = {'em_andamento': False, 'pedida_de_novo': False, 'pid': None}
+_CARGA_EM_SEGUNDO_PLANO_CONCLUIDA = threading.Event()  # Marcado ao fim de cada carga da thread de recarga
+
+# --- Aquecimento e prontidão ---
+# criar_app() só monta a aplicação: as dimensões são carregadas numa thread de fundo (aquecimento)
+# e GET /prontidao responde 503 até o primeiro snapshot vindo do banco estar em memória. Uma
+# requisição que precisa das dimensões durante o aquecimento espera por ele em vez de carregar de novo.
+ESPERA_AQUECIMENTO_SEGUNDOS = 30
+_INICIO_PROCESSO = time.monotonic()
+_ESTADO_AQUECIMENTO = {'iniciado_em': None, 'pronto_apos_segundos': None}
+
+
+def _colunas_compactas(df):
+    """Cada coluna do DataFrame como (códigos int32 por linha, array com os valores distintos)."""
+    import numpy as np
+    import pandas as pd
+    colunas = {}
+    for nome in df.columns:
+        codigos, valores = pd.factorize(df[nome], use_na_sentinel=False)
+        colunas[nome] = (codigos.astype(np.int32), np.asarray(valores, dtype=object))
+    return colunas
+
+
+def amostrar_localizacoes(dimensoes, n, rng):
+    """Sorteia n localizações (com reposição): dicionário coluna -> array de n valores."""
+    indices = rng.integers(0, dimensoes['n_localizacoes'], size=n)
+    return {nome: valores[codigos[indices]] for nome, (codigos, valores) in dimensoes['localizacoes'].items()}
+
+
+def localizacao_por_indice(dimensoes, indice):
+    """Uma localização do snapshot como dicionário (O(1) por coluna)."""
+    return {nome: valores[codigos[indice]] for nome, (codigos, valores) in dimensoes['localizacoes'].items()}
+
+
 def setup_dimensoes_em_memoria():
     """
-    Carrega localizações válidas do DB e tipos de cliente para a memória.
-    Esta função AGORA será chamada no início da aplicação.
+    Carrega localizações válidas do DB e tipos de cliente para a memória, montando um novo
+    snapshot de DADOS_BASE. Se a carga falhar e já houver um snapshot, ele é mantido (e uma nova
+    tentativa só acontece após ESPERA_APOS_FALHA_SEGUNDOS); sem snapshot, usa o fallback de segurança.
+    Precisa rodar dentro do app_context().
     """
+    import numpy as np
+    import pandas as pd
     global DADOS_BASE
     logging.info("Iniciando setup: Carregando dimensões do BD...")
+    inicio = time.perf_counter()
 
     sql_localizacoes = text("""
                             SELECT l.id_localizacao,
@@ -62,76 +246,293 @@ def setup_dimensoes_em_memoria():
 
     try:
         # Abertura de conexão para as operações de leitura
-        # Isso funciona porque estaremos dentro do app_context()
         with db.engine.connect() as conn:
             # 1. Carrega as Localizações Válidas do BD
-            df_local = pd.read_sql(sql_localizacoes, conn)
-            DADOS_BASE['localizacoes'] = df_local.to_dict('records')
+            with cronometrar_pandas('read_sql_dimensoes'):
+                df_local = pd.read_sql_query(sql_localizacoes, conn)
 
             # 2. Carrega os Tipos de Cliente Distintos
-            df_tipos = pd.read_sql(sql_tipos_cliente, conn)
-            DADOS_BASE['tipos_cliente'] = df_tipos['tipo_cliente'].astype(str).unique().tolist()
-
+            with cronometrar_pandas('read_sql_dimensoes'):
+                df_tipos = pd.read_sql_query(sql_tipos_cliente, conn)
+
+        with cronometrar_pandas('colunas_compactas_dimensoes'):
+            localizacoes = _colunas_compactas(df_local[COLUNAS_LOCALIZACAO])
+        novo = {
+            'localizacoes': localizacoes,
+            'n_localizacoes': len(df_local),
+            'tipos_cliente': df_tipos['tipo_cliente'].astype(str).unique().tolist(),
             # Data de adesão em 2025
-            DADOS_BASE['intervalo_data'] = (date(2025, 1, 1), date(2025, 1, 31))
+            'intervalo_data': (date(2025, 1, 1), date(2025, 1, 31)),
+            'versao': DADOS_BASE.get('versao', 0) + 1,
+            'carregado_em': datetime.now().isoformat(timespec='seconds'),
+            'expira_em': time.monotonic() + TTL_DIMENSOES_SEGUNDOS,
+        }
+        DADOS_BASE = novo
+        if _ESTADO_AQUECIMENTO['pronto_apos_segundos'] is None:
+            _ESTADO_AQUECIMENTO['pronto_apos_segundos'] = round(time.monotonic() - _INICIO_PROCESSO, 3)
+
+        segundos = time.perf_counter() - inicio
+        with _LOCK_DIMENSOES:
+            METRICAS_DIMENSOES['recargas'] += 1
+            METRICAS_DIMENSOES['segundos_ultima_recarga'] = round(segundos, 3)
+            METRICAS_DIMENSOES['ultima_recarga_em'] = novo['carregado_em']
+
+        # Log de sucesso
+        logging.info(
+            f"✅ Setup concluído em {segundos:.2f}s (versão {novo['versao']}). {novo['n_localizacoes']} localizações e {len(novo['tipos_cliente'])} tipos de cliente carregados.")
 
-            # Log de sucesso
-            logging.info(
-                f"✅ Setup concluído. {len(DADOS_BASE['localizacoes'])} localizações e {len(DADOS_BASE['tipos_cliente'])} tipos de cliente carregados.")
-
-    except (OperationalError, ProgrammingError) as e:
-        logging.error(f"ERRO FATAL no Setup: Falha na Conexão ou SQL.")
-        logging.error(
-            f"   Por favor, verifique se o PostgreSQL está rodando e se as tabelas (dim_localizacao, clientes_bruto) existem.")
-        logging.error(f"   Detalhes do Erro: {e}")
+    except Exception as e:
+        if isinstance(e, (OperationalError, ProgrammingError)):
+            logging.error(f"ERRO FATAL no Setup: Falha na Conexão ou SQL.")
+            logging.error(
+                f"   Por favor, verifique se o PostgreSQL está rodando e se as tabelas (dim_localizacao, clientes_bruto) existem.")
+            logging.error(f"   Detalhes do Erro: {e}")
+        else:
+            logging.error(f"ERRO INESPERADO no Setup: {e}")
+
+        with _LOCK_DIMENSOES:
+            METRICAS_DIMENSOES['falhas_recarga'] += 1
+
+        if DADOS_BASE.get('n_localizacoes'):
+            # Mantém o snapshot anterior (dados velhos são melhores que nenhum) e adia a nova tentativa
+            logging.error(f"   Mantendo as dimensões da versão {DADOS_BASE['versao']}.")
+            DADOS_BASE = {**DADOS_BASE, 'expira_em': time.monotonic() + ESPERA_APOS_FALHA_SEGUNDOS}
+            return
 
         # Fallback de segurança
-        DADOS_BASE['localizacoes'] = []
-        DADOS_BASE['tipos_cliente'] = ['Comercial', 'Industrial']
-        DADOS_BASE['intervalo_data'] = (date(2025, 1, 1), date(2025, 12, 31))
+        DADOS_BASE = {
+            'localizacoes': {nome: (np.empty(0, dtype=np.int32), np.empty(0, dtype=object)) for nome in COLUNAS_LOCALIZACAO},
+            'n_localizacoes': 0,
+            'tipos_cliente': ['Comercial', 'Industrial'],
+            'intervalo_data': (date(2025, 1, 1), date(2025, 12, 31)),
+            'versao': DADOS_BASE.get('versao', 0),
+            'carregado_em': None,
+            'expira_em': time.monotonic() + ESPERA_APOS_FALHA_SEGUNDOS,
+        }
+
+
+def _recarregar_dimensoes_em_segundo_plano(aplicacao):
+    try:
+        while True:
+            with aplicacao.app_context():
+                setup_dimensoes_em_memoria()
+            _CARGA_EM_SEGUNDO_PLANO_CONCLUIDA.set()
+            with _LOCK_DIMENSOES:
+                # Uma invalidação que chegou durante a carga pode não estar refletida nela: carrega de novo
+                if not _ESTADO_RECARGA['pedida_de_novo']:
+                    _ESTADO_RECARGA['em_andamento'] = False
+                    return
+                _ESTADO_RECARGA['pedida_de_novo'] = False
+    except Exception:
+        with _LOCK_DIMENSOES:
+            _ESTADO_RECARGA['em_andamento'] = False
+        raise
+
+
+def _recarga_em_andamento():
+    """Há uma thread de recarga rodando neste processo? Chamar com _LOCK_DIMENSOES."""
+    return _ESTADO_RECARGA['em_andamento'] and _ESTADO_RECARGA['pid'] == os.getpid()
+
+
+def disparar_recarga_dimensoes(repetir_se_em_andamento=False, aplicacao=None):
+    """
+    Inicia a recarga numa thread de fundo, se ainda não houver uma em andamento. Com
+    repetir_se_em_andamento (invalidação), uma recarga já em curso é seguida de outra.
+    Fora de um contexto da aplicação, passe `aplicacao` (ex.: o aquecimento do criar_app).
+    """
+    aplicacao = aplicacao or current_app._get_current_object()
+    with _LOCK_DIMENSOES:
+        if _recarga_em_andamento():
+            _ESTADO_RECARGA['pedida_de_novo'] |= repetir_se_em_andamento
+            return False
+        _ESTADO_RECARGA.update(em_andamento=True, pid=os.getpid())
+        METRICAS_DIMENSOES['recargas_em_segundo_plano'] += 1
+    threading.Thread(target=_recarregar_dimensoes_em_segundo_plano, args=(aplicacao,), name='recarga-dimensoes',
+                     daemon=True).start()
+    return True
+
+
+def obter_dimensoes():
+    """
+    Snapshot atual das dimensões. Dentro do TTL é só uma leitura (hit); expirado, devolve o
+    snapshot antigo e dispara a recarga em segundo plano (stale); sem snapshot, espera o
+    aquecimento em curso ou carrega na hora (miss).
+    """
+    dimensoes = DADOS_BASE
+    if not dimensoes:
+        with _LOCK_DIMENSOES:
+            METRICAS_DIMENSOES['misses'] += 1
+            aquecendo = _recarga_em_andamento()
+        if aquecendo and _CARGA_EM_SEGUNDO_PLANO_CONCLUIDA.wait(ESPERA_AQUECIMENTO_SEGUNDOS) and DADOS_BASE:
+            return DADOS_BASE
+        setup_dimensoes_em_memoria()
+        return DADOS_BASE
+
+    if time.monotonic() < dimensoes['expira_em']:
+        with _LOCK_DIMENSOES:
+            METRICAS_DIMENSOES['hits'] += 1
+    else:
+        with _LOCK_DIMENSOES:
+            METRICAS_DIMENSOES['stale'] += 1
+        disparar_recarga_dimensoes()
+    return dimensoes
 
-    except Exception as e:
-        logging.error(f"ERRO INESPERADO no Setup: {e}")
-        DADOS_BASE['localizacoes'] = []
-        DADOS_BASE['tipos_cliente'] = ['Comercial', 'Industrial']
-        DADOS_BASE['intervalo_data'] = (date(2025, 1, 1), date(2025, 12, 31))
+
+def invalidar_dimensoes():
+    """Expira o snapshot atual e dispara a recarga em segundo plano."""
+    global DADOS_BASE
+    if DADOS_BASE:
+        DADOS_BASE = {**DADOS_BASE, 'expira_em': 0}
+    with _LOCK_DIMENSOES:
+        METRICAS_DIMENSOES['invalidacoes'] += 1
+    return disparar_recarga_dimensoes(repetir_se_em_andamento=True)
+
+
+def iniciar_aquecimento(aplicacao):
+    """Dispara a carga das dimensões em segundo plano, sem bloquear o início do servidor."""
+    _ESTADO_AQUECIMENTO['iniciado_em'] = datetime.now().isoformat(timespec='seconds')
+    logging.info("Aquecimento: carregando as dimensões em segundo plano...")
+    return disparar_recarga_dimensoes(aplicacao=aplicacao)
+
+
+def estado_aquecimento():
+    """'pronto' (snapshot carregado do banco), 'aquecendo', 'falhou' (sem snapshot do banco) ou 'pendente'."""
+    with _LOCK_DIMENSOES:
+        carregando = _recarga_em_andamento()
+        falhas = METRICAS_DIMENSOES['falhas_recarga']
+    if DADOS_BASE.get('carregado_em'):
+        return 'pronto'
+    if carregando:
+        return 'aquecendo'
+    return 'falhou' if falhas else 'pendente'
+
+
+# --- Alocação de IDs ---
+# Cada processo reserva blocos de TAMANHO_BLOCO_IDS ids numa SEQUENCE do PostgreSQL (uma por
+# tabela bruta, com INCREMENT BY igual ao bloco) e os entrega da memória: um nextval a cada
+# TAMANHO_BLOCO_IDS ids, sem MAX(id) por requisição e sem ids duplicados entre workers.
+# O tamanho do bloco deve ser o mesmo em todos os processos (a sequência é ajustada a ele).
+TAMANHO_BLOCO_IDS = 1000
+_BLOCOS_IDS = {}  # tabela -> lista de blocos [próximo id livre, último id do bloco]
+_SEQUENCIAS_PRONTAS = set()
+_LOCK_IDS = threading.Lock()
+_PID_BLOCOS = os.getpid()
+
+
+def nome_sequencia_ids(tabela):
+    """Sequência de ids da tabela bruta (ex.: public.clientes_bruto_id_cliente_seq)."""
+    return f"public.{tabela}_{esquemas.ESQUEMAS[tabela]['id']}_seq"
+
+
+def preparar_sequencia_ids(conn, tabela):
+    """
+    Cria a sequência da tabela (se ainda não existir), ajusta o INCREMENT BY ao tamanho do bloco e
+    a posiciona depois do MAX(id) atual, para não colidir com linhas carregadas por fora (data_loader).
+    Roda uma vez por processo e tabela, sob o advisory lock exclusivo da sequência: ele espera as
+    reservas em andamento (que seguram o mesmo lock compartilhado até o commit) e impede novas até o
+    fim da transação, então nenhum nextval acontece entre a leitura do last_value e o setval.
+    """
+    sequencia = nome_sequencia_ids(tabela)
+    coluna_id = esquemas.ESQUEMAS[tabela]['id']
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:sequencia))"), {'sequencia': sequencia})
+    conn.execute(text(
+        f"CREATE SEQUENCE IF NOT EXISTS {sequencia} INCREMENT BY {TAMANHO_BLOCO_IDS} MINVALUE 0 START WITH 0"
+    ))
+    conn.execute(text(f"ALTER SEQUENCE {sequencia} INCREMENT BY {TAMANHO_BLOCO_IDS}"))
+    # Nunca volta a sequência: o maior entre o último id da tabela e o último bloco entregue
+    conn.execute(text(f"""
+        SELECT setval('{sequencia}', GREATEST(
+            (SELECT COALESCE(MAX({coluna_id}), 0) FROM public.{tabela}),
+            (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {sequencia})
+        ))
+    """))
+
+
+def _reservar_blocos_ids(tabela, n_blocos=1):
+    """
+    Reserva `n_blocos` blocos da sequência numa só ida ao banco: cada nextval devolve o último id de um bloco.
+    O nextval roda sob o advisory lock compartilhado da sequência, para não cair no meio do setval de
+    um processo que esteja preparando a sequência (ver preparar_sequencia_ids).
+    """
+    with db.engine.begin() as conn:
+        if tabela not in _SEQUENCIAS_PRONTAS:
+            preparar_sequencia_ids(conn, tabela)
+        else:
+            conn.execute(text("SELECT pg_advisory_xact_lock_shared(hashtext(:sequencia))"),
+                         {'sequencia': nome_sequencia_ids(tabela)})
+        fins = conn.execute(text("SELECT nextval(:sequencia) FROM generate_series(1, :n)"),
+                            {'sequencia': nome_sequencia_ids(tabela), 'n': n_blocos}).scalars().all()
+    _SEQUENCIAS_PRONTAS.add(tabela)
+    logging.info(f"{n_blocos} bloco(s) de ids reservado(s) para {tabela}, até o id {max(fins)}")
+    return [[fim - TAMANHO_BLOCO_IDS + 1, fim] for fim in sorted(fins)]
+
+
+def reservar_ids(tabela, quantidade):
+    """
+    Devolve `quantidade` ids novos para a tabela bruta, servidos dos blocos em memória do processo.
+    Os ids são crescentes, mas podem ter saltos entre blocos (ou entre processos).
+    """
+    global _PID_BLOCOS
+    ids = []
+    with _LOCK_IDS:
+        # Após um fork (gunicorn), o filho não pode reaproveitar os blocos nem as conexões herdadas do pai
+        if _PID_BLOCOS != os.getpid():
+            _BLOCOS_IDS.clear()
+            for engine_app in db.engines.values():
+                engine_app.dispose(close=False)
+            _PID_BLOCOS = os.getpid()
+
+        blocos = _BLOCOS_IDS.setdefault(tabela, [])
+        while len(ids) < quantidade:
+            if not blocos:
+                # Pedidos grandes reservam todos os blocos que faltam de uma vez
+                faltam = quantidade - len(ids)
+                blocos.extend(_reservar_blocos_ids(tabela, -(-faltam // TAMANHO_BLOCO_IDS)))
+            bloco = blocos[0]
+            n = min(quantidade - len(ids), bloco[1] - bloco[0] + 1)
+            ids.extend(range(bloco[0], bloco[0] + n))
+            bloco[0] += n
+            if bloco[0] > bloco[1]:
+                blocos.pop(0)
+    return ids
 
 
 # --- Lógica de Geração ---
 def get_proximo_id_cliente(db_instance):
     """
-    Busca o MAX(id_cliente) na tabela clientes_bruto e retorna + 1.
+    Retorna o próximo id_cliente do alocador de blocos (sem consultar o MAX(id_cliente) a cada chamada).
+    Se o alocador falhar, o erro é repassado: um id inventado poderia repetir um existente (a tabela
+    bruta não tem chave primária) ou um que a sequência ainda vai entregar.
     """
-    sql_max_id = text("SELECT MAX(id_cliente) AS ultimo_id FROM public.clientes_bruto;")
-
     try:
-        with db_instance.engine.connect() as conn:
-            resultado = conn.execute(sql_max_id).scalar()
-            proximo_id = (resultado or 0) + 1
-            logging.info(f"Próximo ID de cliente: {proximo_id}")
-            return proximo_id
+        proximo_id = reservar_ids('clientes_bruto', 1)[0]
     except Exception as e:
-        logging.error(f"ERRO ao buscar MAX(id_cliente): {e}")
-        return random.randint(900000, 999999)
+        logging.error(f"ERRO ao reservar id_cliente: {e}")
+        raise
+    logging.info(f"Próximo ID de cliente: {proximo_id}")
+    return proximo_id
 
 
-def criar_cliente_aleatorio(db_instance):
+def criar_cliente_aleatorio(db_instance, reservar_id=True):
     """
     Cria um cliente combinando dados do Faker (nome, data)
     com dados coerentes do BD (localização, tipo_cliente) e id sequencial.
+    Com reservar_id=False (só pré-visualização), nenhum id é consumido do alocador e id_cliente vem None.
     """
-    if not DADOS_BASE.get('localizacoes'):
+    dimensoes = obter_dimensoes()
+    if not dimensoes['n_localizacoes']:
         logging.error("Dados base não disponíveis. Setup falhou ou não encontrou localizações.")
         return None
 
     #1.Busca o ID sequencial
-    proximo_id = get_proximo_id_cliente(db_instance)
+    proximo_id = get_proximo_id_cliente(db_instance) if reservar_id else None
 
     #2.Seleção aleatória de localização coerente
-    local = random.choice(DADOS_BASE['localizacoes'])
-    data_inicio, data_fim = DADOS_BASE['intervalo_data']
+    local = localizacao_por_indice(dimensoes, random.randrange(dimensoes['n_localizacoes']))
+    data_inicio, data_fim = dimensoes['intervalo_data']
 
     #Gera a data aleatória em 2025
+    fake = obter_faker()
     data_adesao = fake.date_between(start_date=data_inicio, end_date=data_fim).strftime('%Y-%m-%d')
 
     novo_cliente = {
@@ -141,12 +542,12 @@ def criar_cliente_aleatorio(db_instance):
         "nome_cliente": fake.name(),
         "cidade": local['cidade'],
         "estado_sigla": local['estado_sigla'],
-        "tipo_cliente": random.choice(DADOS_BASE['tipos_cliente']),
+        "tipo_cliente": random.choice(dimensoes['tipos_cliente']),
         "data_adesao": data_adesao,
     }
     return novo_cliente
 
-@app.route('/')
+@bp.route('/')
 def index():
     return (
         "<h1>Aplicação Flask de Preparação de Dados!</h1>"
@@ -154,7 +555,7 @@ def index():
     )
 
 
-@app.route('/adicionar-localizacao-cidade-estado')
+@bp.route('/adicionar-localizacao-cidade-estado')
 def preparar_dim_localizacao():
     """
     Esta rota altera a tabela 'public_analytics.dim_localizacao' para:
@@ -174,7 +575,7 @@ def preparar_dim_localizacao():
     # Usamos a sintaxe UPDATE...FROM... para fazer a junção.
     sql_update_data = text("""
                            UPDATE public_analytics.dim_localizacao AS l
-                           SET chave_estado_cidade_key = l.cidade || '_' || e.estado FROM public_analytics.dim_estado AS e
+                           SET chave_estado_cidade_key = COALESCE(l.cidade, '') || '_' || COALESCE(e.estado, '') FROM public_analytics.dim_estado AS e
                            WHERE l.id_estado = e.id_estado;
                            """)
 
@@ -203,13 +604,253 @@ def preparar_dim_localizacao():
         return f"<h1>Ocorreu um erro ao preparar a tabela</h1><p>{e}</p>"
 
 
-@app.route('/processar-cidades-sinalizar-duplicadas')
-def processar_etl_completo():
+# --- Jobs em Segundo Plano ---
+# Rotas longas (ETL, limpeza, geração de mock) podem ser submetidas como jobs: a submissão devolve
+# um job_id na hora, o trabalho roda num pool limitado de threads e GET /jobs/<job_id> mostra o
+# status, o resultado e o tempo de cada etapa. Submissões iguais (mesmo tipo e parâmetros) enquanto
+# a anterior ainda está pendente ou executando devolvem o job já existente.
+MAX_WORKERS_JOBS = 2
+MAX_JOBS_HISTORICO = 200  # Jobs finalizados mantidos em memória para consulta
+JOB_PENDENTE = 'pendente'
+JOB_EXECUTANDO = 'executando'
+JOB_CONCLUIDO = 'concluido'
+JOB_ERRO = 'erro'
+
+# Tarefas que recriam ou alteram as mesmas tabelas (dim_localizacao, a tabela de status, o índice de
+# chaves, a VIEW limpa e clientes_enriquecido) dividem uma trava no banco, valendo entre processos e
+# também para as rotas síncronas. As demais (geração de mock) travam só a mesma submissão.
+TRAVA_DIM_LOCALIZACAO = 'tarefa:dim_localizacao'
+TRAVAS_TAREFAS = {
+    'processar-cidades-sinalizar-duplicadas': TRAVA_DIM_LOCALIZACAO,
+    'sinalizar-duplicadas-incremental': TRAVA_DIM_LOCALIZACAO,
+    'remover-duplicatas': TRAVA_DIM_LOCALIZACAO,
+    'sincronizar-status': TRAVA_DIM_LOCALIZACAO,
+    'enriquecer-clientes-incremental': TRAVA_DIM_LOCALIZACAO,
+}
+
+JOBS = {}  # job_id -> registro do job (ordem de criação)
+_JOBS_ATIVOS = {}  # chave de deduplicação -> job_id pendente/executando
+_LOCK_JOBS = threading.Lock()
+_EXECUTOR_JOBS = ThreadPoolExecutor(max_workers=MAX_WORKERS_JOBS, thread_name_prefix='job')
+
+
+def novo_job(tipo, parametros=None):
+    """Registro de um job (também usado pelas rotas síncronas, só para medir as etapas)."""
+    return {
+        'job_id': uuid.uuid4().hex,
+        'tipo': tipo,
+        'parametros': parametros or {},
+        'status': JOB_PENDENTE,
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'iniciado_em': None,
+        'finalizado_em': None,
+        'segundos': None,
+        'etapas': [],
+        'etapa_com_erro': None,
+        'resultado': None,
+        'erro': None,
+    }
+
+
+def chave_job(tipo, parametros=None):
+    """Chave de deduplicação: o tipo e os parâmetros em JSON canônico."""
+    return f"{tipo}:{json.dumps(parametros or {}, sort_keys=True, default=str)}"
+
+
+class TarefaEmAndamento(RuntimeError):
+    """A trava da tarefa está com outra execução (neste ou em outro processo)."""
+
+
+@contextmanager
+def trava_tarefa(tipo, parametros=None):
+    """
+    Advisory lock de sessão da tarefa (TRAVAS_TAREFAS, ou a chave de deduplicação) enquanto ela roda.
+    A conexão fica em AUTOCOMMIT: sem transação aberta, ela não é derrubada pelo
+    idle_in_transaction_session_timeout no meio de um job longo. Não espera: se a trava estiver
+    ocupada, levanta TarefaEmAndamento na hora, sem prender um worker do pool.
+    """
+    chave = TRAVAS_TAREFAS.get(tipo) or chave_job(tipo, parametros)
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:chave))"), {'chave': chave}).scalar():
+            raise TarefaEmAndamento(f"'{tipo}' não foi iniciada: outra tarefa com a trava '{chave}' está em andamento.")
+        try:
+            yield
+        finally:
+            try:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:chave))"), {'chave': chave})
+            except Exception as e:
+                # A trava de sessão cai junto com a conexão: o resultado da tarefa continua valendo
+                logging.error(f"ERRO ao liberar a trava '{chave}': {e}")
+
+
+@contextmanager
+def etapa_job(job, nome):
+    """Mede uma etapa do job; se ela falhar, marca a etapa com erro e repassa a exceção."""
+    etapa = {'nome': nome, 'status': JOB_EXECUTANDO, 'segundos': None}
+    job['etapas'].append(etapa)
+    inicio = time.perf_counter()
+    try:
+        yield etapa
+        etapa['status'] = JOB_CONCLUIDO
+    except Exception:
+        etapa['status'] = JOB_ERRO
+        job['etapa_com_erro'] = nome
+        raise
+    finally:
+        etapa['segundos'] = round(time.perf_counter() - inicio, 3)
+
+
+def _executar_job(aplicacao, job, chave):
+    """Corpo executado no pool: roda a tarefa dentro do app_context e registra o desfecho."""
+    job['status'] = JOB_EXECUTANDO
+    job['iniciado_em'] = datetime.now().isoformat(timespec='seconds')
+    inicio = time.perf_counter()
+    try:
+        with aplicacao.app_context():
+            # Serializa as tarefas conflitantes entre processos (vários workers do servidor)
+            with trava_tarefa(job['tipo'], job['parametros']):
+                job['resultado'] = TAREFAS_JOBS[job['tipo']](job, **job['parametros'])
+        job['status'] = JOB_CONCLUIDO
+        logging.info(f"Job {job['job_id']} ({job['tipo']}) concluído.")
+    except Exception as e:
+        job['status'] = JOB_ERRO
+        job['erro'] = str(e)
+        logging.error(f"Job {job['job_id']} ({job['tipo']}) falhou na etapa {job['etapa_com_erro']}: {e}")
+    finally:
+        job['segundos'] = round(time.perf_counter() - inicio, 3)
+        job['finalizado_em'] = datetime.now().isoformat(timespec='seconds')
+        with _LOCK_JOBS:
+            _JOBS_ATIVOS.pop(chave, None)
+
+
+def submeter_job(tipo, parametros=None):
+    """
+    Enfileira um job no pool e devolve (job, criado). Se já houver um job do mesmo tipo com os
+    mesmos parâmetros pendente ou executando, devolve esse job e criado=False. Chamar dentro do
+    contexto da aplicação (o job roda no app_context dela).
+    """
+    parametros = parametros or {}
+    chave = chave_job(tipo, parametros)
+    with _LOCK_JOBS:
+        job_id = _JOBS_ATIVOS.get(chave)
+        if job_id is not None:
+            return JOBS[job_id], False
+
+        job = novo_job(tipo, parametros)
+        JOBS[job['job_id']] = job
+        _JOBS_ATIVOS[chave] = job['job_id']
+        # Descarta os jobs finalizados mais antigos além do limite do histórico
+        finalizados = [jid for jid, j in JOBS.items() if j['status'] in (JOB_CONCLUIDO, JOB_ERRO)]
+        for jid in finalizados[:max(0, len(JOBS) - MAX_JOBS_HISTORICO)]:
+            del JOBS[jid]
+
+    _EXECUTOR_JOBS.submit(_executar_job, current_app._get_current_object(), job, chave)
+    logging.info(f"Job {job['job_id']} ({tipo}) submetido.")
+    return job, True
+
+
+# --- Enriquecimento de Clientes (SQL) ---
+# clientes_enriquecido é montado dentro do banco, sem trazer clientes_bruto e a VIEW limpa para o
+# Pandas e reescrever tudo com to_sql. Mudanças para quem consome a tabela (Power BI) em relação
+# à versão com to_sql: id_cliente agora é INTEGER (o tipo do cadastro em clientes_bruto), e não mais
+# BIGINT; e ids repetidos em clientes_bruto viram uma linha só (a adesão mais recente, pelo
+# DISTINCT ON de enriquecer_clientes_completo). As demais colunas continuam text e timestamp.
+SQL_SELECT_CLIENTES_ENRIQUECIDOS = """
+    SELECT c.id_cliente,
+           c.nome_cliente::text                                      AS nome_cliente,
+           c.cidade::text                                            AS cidade,
+           c.estado::text                                            AS estado,
+           c.tipo_cliente::text                                      AS tipo_cliente,
+           c.data_adesao::timestamp                                  AS data_adesao,
+           COALESCE(c.cidade, '') || '_' || COALESCE(c.estado, '')   AS chave_estado_cidade_key,
+           l.id_localizacao
+    FROM public.clientes_bruto AS c
+             LEFT JOIN public_analytics.dim_localizacao_limpa AS l
+                       ON l.chave_estado_cidade_key = COALESCE(c.cidade, '') || '_' || COALESCE(c.estado, '')
+"""
+
+
+def enriquecer_clientes_completo():
+    """
+    Recria 'public.clientes_enriquecido' com um único CREATE TABLE ... AS SELECT. A tabela nova é
+    montada e indexada ao lado da antiga e trocada por RENAME numa transação curta: quem lê a
+    tabela nunca a encontra vazia ou pela metade. Se 'clientes_bruto' tiver ids repetidos, só a
+    linha de adesão mais recente de cada id entra (o índice por id_cliente é único) e as repetidas
+    são registradas no log, em vez de abortar a troca. Retorna o número de clientes enriquecidos.
+    """
+    with db.session.begin():
+        db.session.execute(text("DROP TABLE IF EXISTS public.clientes_enriquecido_novo"))
+        resultado = db.session.execute(text(f"""
+            CREATE TABLE public.clientes_enriquecido_novo AS
+            SELECT DISTINCT ON (e.id_cliente) e.*
+            FROM ({SQL_SELECT_CLIENTES_ENRIQUECIDOS}) AS e
+            ORDER BY e.id_cliente, e.data_adesao DESC NULLS LAST
+        """))
+        linhas_brutas = db.session.execute(text("SELECT count(*) FROM public.clientes_bruto")).scalar()
+        if linhas_brutas > resultado.rowcount:
+            logging.warning(f"'clientes_bruto' tem {linhas_brutas - resultado.rowcount} linha(s) com id_cliente "
+                            f"repetido: mantida só a adesão mais recente de cada id em 'clientes_enriquecido'.")
+        db.session.execute(text("""
+                                CREATE UNIQUE INDEX clientes_enriquecido_novo_id_cliente_idx
+                                    ON public.clientes_enriquecido_novo (id_cliente);
+                                CREATE INDEX clientes_enriquecido_novo_chave_idx
+                                    ON public.clientes_enriquecido_novo (chave_estado_cidade_key);
+                                ANALYZE public.clientes_enriquecido_novo;
+                                """))
+
+    with db.session.begin():
+        db.session.execute(text("""
+                                DROP TABLE IF EXISTS public.clientes_enriquecido;
+                                ALTER TABLE public.clientes_enriquecido_novo RENAME TO clientes_enriquecido;
+                                ALTER INDEX public.clientes_enriquecido_novo_id_cliente_idx
+                                    RENAME TO clientes_enriquecido_id_cliente_idx;
+                                ALTER INDEX public.clientes_enriquecido_novo_chave_idx
+                                    RENAME TO clientes_enriquecido_chave_idx;
+                                """))
+    return resultado.rowcount
+
+
+def enriquecer_clientes_incremental():
+    """
+    Enriquece só os clientes de 'clientes_bruto' que ainda não estão em 'clientes_enriquecido'
+    (anti-join pelo id_cliente, feito no banco). Os ids vêm em blocos por processo e podem ser
+    gravados fora de ordem, por isso a comparação é por existência e não por MAX(id_cliente).
+    Se a tabela ainda não existir (ou for da versão antiga, sem o índice único), recria por completo.
+    Retorna (modo, clientes inseridos).
+    """
+    with db.engine.connect() as conn:
+        indice = conn.execute(text("SELECT to_regclass('public.clientes_enriquecido_id_cliente_idx')")).scalar()
+    if indice is None:
+        logging.info("'clientes_enriquecido' sem índice por id_cliente: fazendo o enriquecimento completo.")
+        return 'completo', enriquecer_clientes_completo()
+
+    with db.session.begin():
+        resultado = db.session.execute(text(f"""
+            INSERT INTO public.clientes_enriquecido
+            {SQL_SELECT_CLIENTES_ENRIQUECIDOS}
+            WHERE NOT EXISTS (SELECT 1 FROM public.clientes_enriquecido AS e WHERE e.id_cliente = c.id_cliente)
+            ON CONFLICT (id_cliente) DO NOTHING
+        """))
+    return 'incremental', resultado.rowcount
+
+
+def executar_enriquecimento_incremental(job):
+    """Tarefa do enriquecimento incremental (usa a VIEW limpa criada pelo ETL completo)."""
+    logging.info("Iniciando o enriquecimento incremental de 'clientes_enriquecido'...")
+    with etapa_job(job, 'Enriquecimento incremental'):
+        modo, inseridos = enriquecer_clientes_incremental()
+    logging.info(f"Enriquecimento ({modo}) concluído. {inseridos} clientes gravados.")
+    return {'modo': modo, 'clientes_inseridos': inseridos}
+
+
+# --- Tarefas (usadas pelas rotas síncronas e pelos jobs) ---
+def executar_etl_completo(job):
     """
     Processo de ETL Não-Destrutivo (Melhor Prática):
-    1. CRIA 'dim_localizacao_suja_com_status' (cópia + flags 'VALID'/'DUPLICATE_ERROR').
+    1. CRIA 'dim_localizacao_suja_com_status' (cópia + flags 'VALID'/'DUPLICATE_ERROR') e o índice
+       de chaves 'dim_localizacao_dq_chaves' usado pelo modo incremental.
     2. CRIA a VIEW 'dim_localizacao_limpa' (filtrando apenas os 'VALID').
-    3. ENRIQUECE 'clientes_bruto' usando a VIEW limpa e salva em 'clientes_enriquecido'.
+    3. ENRIQUECE 'clientes_bruto' usando a VIEW limpa e salva em 'clientes_enriquecido' (em SQL).
     4. NÃO MODIFICA as tabelas originais.
     """
 
@@ -218,8 +859,8 @@ def processar_etl_completo():
 
     # Este SQL é mais eficiente: Cria a tabela nova já com toda a lógica.
     sql_etapa_1 = text("""
-                       -- 1. Apaga a tabela antiga, se existir
-                       DROP TABLE IF EXISTS public_analytics.dim_localizacao_suja_com_status;
+                       -- 1. Apaga a tabela antiga, se existir (CASCADE: a VIEW limpa depende dela e é recriada na Etapa 2)
+                       DROP TABLE IF EXISTS public_analytics.dim_localizacao_suja_com_status CASCADE;
 
                        -- 2. Cria a nova tabela 'suja' com a lógica de 'flagging'
                        CREATE TABLE public_analytics.dim_localizacao_suja_com_status AS
@@ -227,8 +868,8 @@ def processar_etl_completo():
                            -- Junta a localização com o estado
                            SELECT l.*, -- Pega todas as colunas originais de 'l' (dim_localizacao)
                                   e.estado,
-                                  -- Cria a chave composta
-                                  l.cidade || '_' || e.estado AS chave_estado_cidade_key_calc,
+                                  -- Cria a chave composta (nunca NULL: é a chave do keyset da API de duplicatas)
+                                  COALESCE(l.cidade, '') || '_' || COALESCE(e.estado, '') AS chave_estado_cidade_key_calc,
                                   -- A 'Regra de Sobrevivência': Acha o primeiro (rn = 1) de cada grupo
                                   ROW_NUMBER()                   OVER(
                     PARTITION BY l.cidade, e.estado 
@@ -249,16 +890,42 @@ def processar_etl_completo():
                                   ELSE 'DUPLICATE_ERROR'
                                   END                      AS dq_status
                        FROM ranked_locations;
+
+                       -- 4. Índice da chave de junção do enriquecimento (só as linhas da VIEW limpa)
+                       CREATE INDEX dim_localizacao_suja_com_status_chave_valid_idx
+                           ON public_analytics.dim_localizacao_suja_com_status (chave_estado_cidade_key)
+                           WHERE dq_status = 'VALID';
+
+                       -- 5. Índices da paginação por keyset do /api/duplicatas (com e sem filtro de estado)
+                       CREATE INDEX dim_localizacao_suja_com_status_dup_idx
+                           ON public_analytics.dim_localizacao_suja_com_status (chave_estado_cidade_key, id_localizacao)
+                           WHERE dq_status = 'DUPLICATE_ERROR';
+                       CREATE INDEX dim_localizacao_suja_com_status_dup_estado_idx
+                           ON public_analytics.dim_localizacao_suja_com_status (estado, chave_estado_cidade_key, id_localizacao)
+                           WHERE dq_status = 'DUPLICATE_ERROR';
+
+                       -- 6. Índice persistente das chaves já vistas (hash de (cidade, estado) -> sobrevivente),
+                       --    usado pelo modo incremental para classificar só as localizações novas;
+                       --    a chave é a mesma partição do ROW_NUMBER acima (SQL_CHAVE_DQ)
+                       DROP TABLE IF EXISTS public_analytics.dim_localizacao_dq_chaves;
+                       CREATE TABLE public_analytics.dim_localizacao_dq_chaves (
+                           chave_hash            BIGINT PRIMARY KEY,
+                           chave_dq              TEXT NOT NULL,
+                           id_localizacao_valido TEXT NOT NULL
+                       );
+                       INSERT INTO public_analytics.dim_localizacao_dq_chaves
+                       SELECT hashtextextended(ROW(cidade, estado)::text, 0),
+                              ROW(cidade, estado)::text,
+                              id_localizacao
+                       FROM public_analytics.dim_localizacao_suja_com_status
+                       WHERE dq_status = 'VALID'
+                       ON CONFLICT (chave_hash) DO NOTHING;
                        """)
 
-    try:
+    with etapa_job(job, 'Etapa 1 (Criação da Tabela Suja)'):
         with db.session.begin():  # Inicia uma transação
             db.session.execute(sql_etapa_1)
-        logging.info("ETAPA 1 concluída. Tabela 'dim_localizacao_suja_com_status' criada.")
-    except Exception as e:
-        db.session.rollback()
-        logging.error(f"ERRO na ETAPA 1: {e}")
-        return f"<h1>Ocorreu um erro na Etapa 1 (Criação da Tabela Suja)</h1><p>{e}</p>"
+    logging.info("ETAPA 1 concluída. Tabela 'dim_localizacao_suja_com_status' criada.")
 
     # --- ETAPA 2: CRIAR A VIEW 'LIMPA' (SQL) ---
     logging.info("ETAPA 2: Criando a VIEW 'dim_localizacao_limpa'...")
@@ -272,70 +939,145 @@ def processar_etl_completo():
                        WHERE dq_status = 'VALID';
                        """)
 
-    try:
+    with etapa_job(job, 'Etapa 2 (Criação da VIEW)'):
         with db.session.begin():
             db.session.execute(sql_etapa_2)
-        logging.info("ETAPA 2 concluída. VIEW 'dim_localizacao_limpa' criada.")
-    except Exception as e:
-        db.session.rollback()
-        logging.error(f"ERRO na ETAPA 2: {e}")
-        return f"<h1>Ocorreu um erro na Etapa 2 (Criação da VIEW)</h1><p>{e}</p>"
+    logging.info("ETAPA 2 concluída. VIEW 'dim_localizacao_limpa' criada.")
 
-    # --- ETAPA 3: ENRIQUECER OS CLIENTES (Pandas) ---
+    # --- ETAPA 3: ENRIQUECER OS CLIENTES (SQL) ---
     logging.info("ETAPA 3: Enriquecendo a tabela de clientes...")
 
-    try:
-        query_clientes = text("SELECT * FROM public.clientes_bruto")
-        # Lemos da nova VIEW limpa
-        query_local_limpa = text("SELECT * FROM public_analytics.dim_localizacao_limpa")
+    with etapa_job(job, 'Etapa 3 (Enriquecimento)'):
+        # Um CREATE TABLE ... AS SELECT com LEFT JOIN na VIEW limpa, dentro do banco
+        clientes_enriquecidos = enriquecer_clientes_completo()
 
-        with db.engine.connect() as conn:
-            df_clientes = pd.read_sql(query_clientes, conn)
-            df_local_limpa = pd.read_sql(query_local_limpa, conn)
-
-        # Prepara a chave na tabela de clientes
-        df_clientes['chave_estado_cidade_key'] = (
-                df_clientes['cidade'].fillna('') + "_" + df_clientes['estado'].fillna('')
-        )
+    logging.info("ETAPA 3 concluída. Tabela 'clientes_enriquecido' criada.")
+    return {
+        'tabela_status': 'public_analytics.dim_localizacao_suja_com_status',
+        'view_limpa': 'public_analytics.dim_localizacao_limpa',
+        'tabela_enriquecida': 'public.clientes_enriquecido',
+        'clientes_enriquecidos': clientes_enriquecidos,
+    }
 
-        # Enriquece os clientes usando a VIEW limpa
-        df_clientes_enriquecido = pd.merge(
-            df_clientes,
-            # Pegamos o 'id_localizacao' da VIEW limpa
-            df_local_limpa[['id_localizacao', 'chave_estado_cidade_key']],
-            on='chave_estado_cidade_key',
-            how='left'
-        )
 
-        # Salva o resultado final em uma nova tabela
-        nome_tabela_nova = 'clientes_enriquecido'
-        schema_nome = 'public'
+# Chave de DQ: o par (cidade, estado) exato, o mesmo do PARTITION BY do ETL completo, em texto
+# (o ROW()::text não confunde 'a_b'/'c' com 'a'/'b_c' nem perde NULLs). O hash dela é a chave
+# primária do índice persistente 'dim_localizacao_dq_chaves'. Mudar a regra aqui exige mudar a
+# partição da Etapa 1 (e vice-versa): os dois modos têm de concordar.
+SQL_CHAVE_DQ = "ROW({cidade}, {estado})::text"
+
+SQL_SINALIZAR_DUPLICADAS_INCREMENTAL = f"""
+    WITH contagem_dim AS (
+        -- O id_localizacao (md5 de estado + cidade) se repete quando a mesma cidade vem de duas
+        -- fontes: as localizações novas são as cópias além das que já têm status. Estas duas
+        -- contagens leem as duas tabelas inteiras (ver sinalizar_duplicadas_incremental)
+        SELECT id_localizacao, id_estado, cidade, count(*) AS copias
+        FROM public_analytics.dim_localizacao
+        GROUP BY id_localizacao, id_estado, cidade
+    ),
+    contagem_status AS (
+        SELECT id_localizacao, count(*) AS copias
+        FROM public_analytics.dim_localizacao_suja_com_status
+        GROUP BY id_localizacao
+    ),
+    novas AS (
+        SELECT d.id_localizacao,
+               d.id_estado,
+               d.cidade,
+               e.estado,
+               COALESCE(d.cidade, '') || '_' || COALESCE(e.estado, '') AS chave_estado_cidade_key,
+               {SQL_CHAVE_DQ.format(cidade='d.cidade', estado='e.estado')} AS chave_dq,
+               generate_series(1, d.copias - COALESCE(s.copias, 0)) AS copia
+        FROM contagem_dim AS d
+                 JOIN public_analytics.dim_estado AS e ON d.id_estado = e.id_estado
+                 LEFT JOIN contagem_status AS s ON s.id_localizacao = d.id_localizacao
+        WHERE d.copias > COALESCE(s.copias, 0)
+    ),
+    classificadas AS (
+        -- Chave já no índice: duplicata. Chave inédita: o menor id entre as novas é o sobrevivente.
+        -- A janela percorre só as linhas novas; o status das linhas antigas não muda.
+        SELECT n.*,
+               CASE
+                   WHEN k.chave_hash IS NULL
+                       AND ROW_NUMBER() OVER (PARTITION BY n.chave_dq
+                                              ORDER BY n.id_localizacao, n.copia) = 1 THEN 'VALID'
+                   ELSE 'DUPLICATE_ERROR'
+                   END AS dq_status
+        FROM novas AS n
+                 LEFT JOIN public_analytics.dim_localizacao_dq_chaves AS k
+                           ON k.chave_hash = hashtextextended(n.chave_dq, 0)
+                               AND k.chave_dq = n.chave_dq
+    ),
+    inseridas AS (
+        INSERT INTO public_analytics.dim_localizacao_suja_com_status
+            (id_localizacao, id_estado, cidade, estado, chave_estado_cidade_key, dq_status)
+        SELECT id_localizacao, id_estado, cidade, estado, chave_estado_cidade_key, dq_status
+        FROM classificadas
+        RETURNING id_localizacao, dq_status, {SQL_CHAVE_DQ.format(cidade='cidade', estado='estado')} AS chave_dq
+    ),
+    chaves_novas AS (
+        INSERT INTO public_analytics.dim_localizacao_dq_chaves (chave_hash, chave_dq, id_localizacao_valido)
+        SELECT hashtextextended(chave_dq, 0), chave_dq, id_localizacao
+        FROM inseridas
+        WHERE dq_status = 'VALID'
+        ON CONFLICT (chave_hash) DO NOTHING
+    )
+    SELECT dq_status, count(*) AS linhas
+    FROM inseridas
+    GROUP BY dq_status
+"""
 
-        df_clientes_enriquecido.to_sql(
-            nome_tabela_nova,
-            db.engine,
-            schema=schema_nome,
-            if_exists='replace',
-            index=False
-        )
 
-        logging.info("ETAPA 3 concluída. Tabela 'clientes_enriquecido' criada.")
+def sinalizar_duplicadas_incremental():
+    """
+    Classifica como 'VALID'/'DUPLICATE_ERROR' só as localizações da 'dim_localizacao' que ainda não
+    têm status e as acrescenta à 'dim_localizacao_suja_com_status', consultando o índice de chaves
+    'dim_localizacao_dq_chaves' em vez de refazer a janela sobre a dimensão inteira. Localizações
+    apagadas da dimensão continuam na tabela de status até o próximo ETL completo.
+
+    Custo: a janela, a consulta ao índice de chaves e as gravações seguem o número de linhas novas,
+    mas achar essas linhas não: a dimensão é recriada pelo dbt a cada execução (sem coluna de
+    carga, e o xmin/ctid mudam todos) e o id_localizacao não é único, então as cópias novas de um
+    id já conhecido só aparecem comparando as contagens. Cada passada faz por isso duas agregações
+    por hash sobre a dimensão e a tabela de status inteiras, O(dimensão), sem a ordenação da janela.
+
+    A chave de DQ é o par (cidade, estado) exato (SQL_CHAVE_DQ), sem normalizar maiúsculas ou
+    espaços: de propósito, para classificar igual ao PARTITION BY do ETL completo. Normalizar só
+    aqui faria os dois modos divergirem; normalizar nos dois mudaria o resultado do ETL completo.
+    Retorna a contagem de linhas novas por status.
+    """
+    with db.session.begin():
+        # SHARE ROW EXCLUSIVE: serializa com outra passada incremental e com o DROP do ETL completo
+        db.session.execute(text(
+            "LOCK TABLE public_analytics.dim_localizacao_suja_com_status IN SHARE ROW EXCLUSIVE MODE"))
+        linhas = db.session.execute(text(SQL_SINALIZAR_DUPLICADAS_INCREMENTAL)).all()
+    return {status: quantidade for status, quantidade in linhas}
 
-        return (
-            f"<h1>ETL Completo!</h1>"
-            f"<p>1. Tabela 'dim_localizacao_suja_com_status' criada com flags 'VALID'/'DUPLICATE_ERROR'.</p>"
-            f"<p>2. VIEW 'dim_localizacao_limpa' criada (filtrando 'VALID').</p>"
-            f"<p>3. Tabela 'clientes_enriquecido' criada e pronta para o Power BI.</p>"
-            f"<p><b>SUAS TABELAS ORIGINAIS NÃO FORAM ALTERADAS.</b></p>"
-        )
 
-    except Exception as e:
-        logging.error(f"ERRO na ETAPA 3: {e}")
-        return f"<h1>Ocorreu um erro na Etapa 3 (Enriquecimento)</h1><p>{e}</p>"
+def executar_sinalizacao_incremental(job):
+    """
+    Tarefa do modo incremental de DQ. Sem o índice de chaves (primeira execução ou tabela de status
+    da versão antiga), roda o ETL completo, que cria a tabela de status, o índice e a VIEW limpa.
+    """
+    with db.engine.connect() as conn:
+        indice = conn.execute(text("SELECT to_regclass('public_analytics.dim_localizacao_dq_chaves')")).scalar()
+    if indice is None:
+        logging.info("Índice de chaves de DQ inexistente: executando o ETL completo.")
+        return {'modo': 'completo', **executar_etl_completo(job)}
+
+    logging.info("Classificando as localizações novas (DQ incremental)...")
+    with etapa_job(job, 'Sinalização incremental'):
+        novas_por_status = sinalizar_duplicadas_incremental()
+    logging.info(f"DQ incremental concluído. Localizações novas por status: {novas_por_status}")
+    return {
+        'modo': 'incremental',
+        'localizacoes_novas': sum(novas_por_status.values()),
+        'validas': novas_por_status.get('VALID', 0),
+        'duplicadas': novas_por_status.get('DUPLICATE_ERROR', 0),
+    }
 
 
-@app.route('/remover-duplicatas')
-def remover_duplicatas():
+def executar_remocao_duplicatas(job):
     """
     Processo DESTRUTIVO: Remove permanentemente os registros duplicados
     (aqueles que não são a 'primeira' ocorrência física) da tabela 'dim_localizacao'.
@@ -363,30 +1105,19 @@ def remover_duplicatas():
                                      WHERE rn > 1);
                                  """)
 
-    try:
+    with etapa_job(job, 'Remoção de duplicatas'):
         with db.session.begin():
             logging.info("Executando: DELETE para remover duplicatas usando ctid...")
             resultado = db.session.execute(sql_delete_duplicates)
 
-        linhas_afetadas = resultado.rowcount
-        logging.info(f"Remoção concluída. {linhas_afetadas} linhas duplicadas foram apagadas.")
-        return (
-            f"<h1>Remoção Concluída!</h1>"
-            f"<p><b>{linhas_afetadas}</b> linhas duplicadas foram permanentemente apagadas "
-            f"da tabela 'public_analytics.dim_localizacao'.</p>"
-            f"<p>A tabela agora está limpa e sem duplicatas físicas.</p>"
-        )
-
-    except Exception as e:
-        db.session.rollback()
-        logging.error(f"ERRO na remoção de duplicatas: {e}")
-        return f"<h1>Ocorreu um erro ao remover duplicatas</h1><p>{e}</p>"
+    linhas_afetadas = resultado.rowcount
+    logging.info(f"Remoção concluída. {linhas_afetadas} linhas duplicadas foram apagadas.")
+    return {'linhas_apagadas': linhas_afetadas}
 
 
-@app.route('/sincronizar-status')
-def sincronizar_status():
+def executar_sincronizacao_status(job):
     """
-    Script focado em atualizar a 'dim_localizacao' com o 'dq_status'
+    Atualiza a 'dim_localizacao' com o 'dq_status'
     calculado na 'dim_localizacao_suja_com_status', usando o ID como chave.
     """
     logging.info("Iniciando a sincronização do DQ_Status...")
@@ -406,7 +1137,7 @@ def sincronizar_status():
                                  original.id_localizacao = suja.id_localizacao;
                              """)
 
-    try:
+    with etapa_job(job, 'Sincronização do dq_status'):
         with db.session.begin():  # Garante que as operações sejam atômicas
             logging.info("Executando: ALTER TABLE para garantir que a coluna 'dq_status' exista...")
             db.session.execute(sql_alter_table)
@@ -414,24 +1145,134 @@ def sincronizar_status():
             logging.info("Executando: UPDATE para sincronizar o status...")
             resultado = db.session.execute(sql_update_status)
 
-        linhas_afetadas = resultado.rowcount
-        logging.info(f"Sincronização concluída. {linhas_afetadas} linhas foram atualizadas.")
+    linhas_afetadas = resultado.rowcount
+    logging.info(f"Sincronização concluída. {linhas_afetadas} linhas foram atualizadas.")
+    return {'linhas_atualizadas': linhas_afetadas}
+
+
+@bp.route('/processar-cidades-sinalizar-duplicadas')
+def processar_etl_completo():
+    """Executa o ETL não-destrutivo de forma síncrona (para rodar em segundo plano, use POST /jobs/<tipo>)."""
+    job = novo_job('processar-cidades-sinalizar-duplicadas')
+    try:
+        with trava_tarefa(job['tipo']):
+            executar_etl_completo(job)
+    except TarefaEmAndamento as e:
+        return f"<h1>Tarefa em andamento</h1><p>{e}</p>", 409
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"ERRO na {job['etapa_com_erro']}: {e}")
+        return f"<h1>Ocorreu um erro na {job['etapa_com_erro']}</h1><p>{e}</p>"
+
+    return (
+        f"<h1>ETL Completo!</h1>"
+        f"<p>1. Tabela 'dim_localizacao_suja_com_status' criada com flags 'VALID'/'DUPLICATE_ERROR'.</p>"
+        f"<p>2. VIEW 'dim_localizacao_limpa' criada (filtrando 'VALID').</p>"
+        f"<p>3. Tabela 'clientes_enriquecido' criada e pronta para o Power BI.</p>"
+        f"<p><b>SUAS TABELAS ORIGINAIS NÃO FORAM ALTERADAS.</b></p>"
+    )
+
+
+@bp.route('/sinalizar-duplicadas-incremental')
+def sinalizar_duplicadas_incremental_rota():
+    """Classifica só as localizações novas de forma síncrona (para rodar em segundo plano, use POST /jobs/<tipo>)."""
+    job = novo_job('sinalizar-duplicadas-incremental')
+    try:
+        with trava_tarefa(job['tipo']):
+            resultado = executar_sinalizacao_incremental(job)
+    except TarefaEmAndamento as e:
+        return f"<h1>Tarefa em andamento</h1><p>{e}</p>", 409
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"ERRO no DQ incremental ({job['etapa_com_erro']}): {e}")
+        return f"<h1>Ocorreu um erro na sinalização incremental</h1><p>{e}</p>"
+
+    if resultado['modo'] == 'completo':
         return (
-            f"<h1>Sincronização Concluída!</h1>"
-            f"<p>A coluna 'dq_status' na tabela 'public_analytics.dim_localizacao' "
-            f"foi atualizada com sucesso para {linhas_afetadas} linhas.</p>"
+            f"<h1>ETL Completo!</h1>"
+            f"<p>O índice de chaves ainda não existia: a tabela 'dim_localizacao_suja_com_status', o índice "
+            f"'dim_localizacao_dq_chaves' e a VIEW 'dim_localizacao_limpa' foram recriados.</p>"
         )
+    return (
+        f"<h1>Sinalização Incremental Concluída!</h1>"
+        f"<p>{resultado['localizacoes_novas']} localizações novas classificadas: "
+        f"<b>{resultado['validas']}</b> 'VALID' e <b>{resultado['duplicadas']}</b> 'DUPLICATE_ERROR'.</p>"
+    )
+
 
+@bp.route('/remover-duplicatas')
+def remover_duplicatas():
+    """Remove as duplicatas físicas da 'dim_localizacao' de forma síncrona (ver executar_remocao_duplicatas)."""
+    try:
+        with trava_tarefa('remover-duplicatas'):
+            linhas_afetadas = executar_remocao_duplicatas(novo_job('remover-duplicatas'))['linhas_apagadas']
+    except TarefaEmAndamento as e:
+        return f"<h1>Tarefa em andamento</h1><p>{e}</p>", 409
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"ERRO na remoção de duplicatas: {e}")
+        return f"<h1>Ocorreu um erro ao remover duplicatas</h1><p>{e}</p>"
+
+    return (
+        f"<h1>Remoção Concluída!</h1>"
+        f"<p><b>{linhas_afetadas}</b> linhas duplicadas foram permanentemente apagadas "
+        f"da tabela 'public_analytics.dim_localizacao'.</p>"
+        f"<p>A tabela agora está limpa e sem duplicatas físicas.</p>"
+    )
+
+
+@bp.route('/sincronizar-status')
+def sincronizar_status():
+    """Sincroniza o 'dq_status' da 'dim_localizacao' de forma síncrona (ver executar_sincronizacao_status)."""
+    try:
+        with trava_tarefa('sincronizar-status'):
+            linhas_afetadas = executar_sincronizacao_status(novo_job('sincronizar-status'))['linhas_atualizadas']
+    except TarefaEmAndamento as e:
+        return f"<h1>Tarefa em andamento</h1><p>{e}</p>", 409
     except Exception as e:
         db.session.rollback()
         logging.error(f"ERRO na sincronização: {e}")
         return f"<h1>Ocorreu um erro na sincronização</h1><p>{e}</p>"
-@app.route('/listar-duplicatas')
+
+    return (
+        f"<h1>Sincronização Concluída!</h1>"
+        f"<p>A coluna 'dq_status' na tabela 'public_analytics.dim_localizacao' "
+        f"foi atualizada com sucesso para {linhas_afetadas} linhas.</p>"
+    )
+
+
+@bp.route('/enriquecer-clientes-incremental')
+def enriquecer_clientes_incremental_rota():
+    """Grava em 'clientes_enriquecido' só os clientes novos (para rodar em segundo plano, use POST /jobs/<tipo>)."""
+    try:
+        with trava_tarefa('enriquecer-clientes-incremental'):
+            resultado = executar_enriquecimento_incremental(novo_job('enriquecer-clientes-incremental'))
+    except TarefaEmAndamento as e:
+        return f"<h1>Tarefa em andamento</h1><p>{e}</p>", 409
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"ERRO no enriquecimento incremental: {e}")
+        return (
+            f"<h1>Ocorreu um erro no enriquecimento incremental</h1><p>{e}</p>"
+            f"<p><b>Dica:</b> A VIEW 'dim_localizacao_limpa' é criada por "
+            f"<a href='/processar-cidades-sinalizar-duplicadas'>/processar-cidades-sinalizar-duplicadas</a>.</p>"
+        )
+
+    return (
+        f"<h1>Enriquecimento Concluído!</h1>"
+        f"<p>Modo: <b>{resultado['modo']}</b>. {resultado['clientes_inseridos']} clientes gravados "
+        f"em 'public.clientes_enriquecido'.</p>"
+    )
+
+
+@bp.route('/listar-duplicatas')
 def listar_duplicatas():
     """
     Endpoint GET para listar todos os registros da dimensão de localização
     que foram sinalizados como 'DUPLICATE_ERROR' pelo processo de ETL.
+    Tabela HTML com tudo, para consulta manual; para outros serviços, use /api/duplicatas (JSON paginado).
     """
+    import pandas as pd
     logging.info("Requisição recebida para /listar-duplicatas...")
 
     # SQL para selecionar apenas os registros "sujos"
@@ -446,8 +1287,9 @@ def listar_duplicatas():
 
     try:
         # Usamos o Pandas para ler o SQL e converter para HTML
-        with db.engine.connect() as conn:
-            df_duplicatas = pd.read_sql(sql_query_duplicatas, conn)
+        with engine_leitura().connect() as conn:
+            with cronometrar_pandas('read_sql_duplicatas'):
+                df_duplicatas = pd.read_sql_query(sql_query_duplicatas, conn)
 
         if df_duplicatas.empty:
             logging.info("Nenhuma duplicata encontrada.")
@@ -459,7 +1301,8 @@ def listar_duplicatas():
         logging.info(f"Encontradas {len(df_duplicatas)} duplicatas. Exibindo...")
 
         # Converte o DataFrame do Pandas em uma tabela HTML bonita
-        html_table = df_duplicatas.to_html(index=False, classes='table table-striped', border=1)
+        with cronometrar_pandas('to_html_duplicatas'):
+            html_table = df_duplicatas.to_html(index=False, classes='table table-striped', border=1)
 
         return (
             f"<h1>Lista de Localizações Duplicadas (Sinalizadas como 'DUPLICATE_ERROR')</h1>"
@@ -477,10 +1320,358 @@ def listar_duplicatas():
         )
 
 
-@app.route('/test-cliente-faker', methods=['GET'])
+# --- API de Duplicatas (JSON paginado) ---
+# Paginação por keyset em (chave_estado_cidade_key, id_localizacao): cada página continua depois
+# da última linha da anterior (cursor opaco), usando os índices parciais criados na Etapa 1 do ETL.
+# O custo de uma página não depende de quantas duplicatas existem nem de quantas páginas já foram
+# lidas (ao contrário de OFFSET). As linhas são lidas com cursor do lado do servidor e enviadas
+# em streaming, sem montar a página inteira em memória. A chave nunca é NULL (o ETL monta com
+# COALESCE, igual ao join do enriquecimento de clientes): com chave NULL a comparação de tupla
+# do keyset daria NULL e a linha sumiria de todas as páginas seguintes.
+LIMITE_PADRAO_DUPLICATAS = 500
+MAX_LIMITE_DUPLICATAS = 5_000
+COLUNAS_DUPLICATAS = ['id_localizacao', 'id_estado', 'cidade', 'estado', 'chave_estado_cidade_key']
+
+
+def codificar_cursor_duplicatas(chave, id_localizacao):
+    """Cursor opaco (base64 url-safe) com a última (chave, id_localizacao) entregue."""
+    return base64.urlsafe_b64encode(json.dumps([chave, id_localizacao]).encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor_duplicatas(cursor):
+    """Inverso de codificar_cursor_duplicatas; ValueError se o cursor for inválido."""
+    try:
+        chave, id_localizacao = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Cursor inválido.")
+    return chave, id_localizacao
+
+
+@bp.route('/api/duplicatas', methods=['GET'])
+def api_duplicatas():
+    """
+    Duplicatas ('DUPLICATE_ERROR') da 'dim_localizacao_suja_com_status' em JSON paginado.
+    Parâmetros: limite (padrão LIMITE_PADRAO_DUPLICATAS), estado (sigla) e cursor (o
+    'proximo_cursor' da página anterior). Resposta: {"itens": [...], "proximo_cursor": ...};
+    proximo_cursor é null na última página.
+    """
+    try:
+        limite = int(request.args.get('limite', LIMITE_PADRAO_DUPLICATAS))
+        apos = decodificar_cursor_duplicatas(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"status": "erro", "mensagem": f"Parâmetro inválido: {e}"}), 400
+    if not 0 < limite <= MAX_LIMITE_DUPLICATAS:
+        return jsonify({"status": "erro", "mensagem": f"'limite' deve estar entre 1 e {MAX_LIMITE_DUPLICATAS}."}), 400
+    estado = request.args.get('estado', '').strip().upper() or None
+
+    filtros = ["dq_status = 'DUPLICATE_ERROR'"]
+    parametros = {'limite': limite + 1}  # Uma linha a mais indica se existe próxima página
+    if estado:
+        filtros.append("estado = :estado")
+        parametros['estado'] = estado
+    if apos:
+        filtros.append("(chave_estado_cidade_key, id_localizacao) > (:apos_chave, :apos_id)")
+        parametros['apos_chave'], parametros['apos_id'] = apos
+
+    sql_pagina = text(f"""
+                      SELECT {', '.join(COLUNAS_DUPLICATAS)}
+                      FROM public_analytics.dim_localizacao_suja_com_status
+                      WHERE {' AND '.join(filtros)}
+                      ORDER BY chave_estado_cidade_key, id_localizacao
+                      LIMIT :limite
+                      """)
+
+    # A consulta roda antes da resposta começar: erro de SQL (ex.: tabela ainda não criada) vira 500
+    conn = conexao.conexao_streaming(engine_leitura(), limite + 1)
+    try:
+        conexao.definir_statement_timeout(conn, TIMEOUT_LEITURA_API_MS)
+        resultado = conn.execute(sql_pagina, parametros)
+    except Exception as e:
+        conn.close()
+        logging.error(f"ERRO ao listar duplicatas (API): {e}")
+        return jsonify({
+            "status": "erro",
+            "mensagem": str(e),
+            "dica": "Rode /processar-cidades-sinalizar-duplicadas pelo menos uma vez.",
+        }), 500
+
+    def gerar_pagina():
+        yield '{"itens": ['
+        ultima, tem_proxima = None, False
+        for n, linha in enumerate(resultado):
+            if n == limite:  # Linha extra: só confirma que há próxima página
+                tem_proxima = True
+                break
+            yield (',' if n else '') + json.dumps(dict(zip(COLUNAS_DUPLICATAS, linha)), ensure_ascii=False)
+            ultima = linha
+        proximo = codificar_cursor_duplicatas(ultima[4], ultima[0]) if tem_proxima else None
+        yield f'], "limite": {limite}, "proximo_cursor": {json.dumps(proximo)}}}'
+
+    # A conexão é devolvida ao pool quando a resposta é fechada, mesmo que o gerador nunca
+    # chegue a rodar (HEAD, cliente que desconecta antes do primeiro byte)
+    resposta = Response(gerar_pagina(), mimetype='application/json')
+    resposta.call_on_close(conn.close)
+    return resposta
+
+
+# --- API dos Marts (JSON com cache) ---
+# Os marts do dbt servidos em JSON, com filtros. As respostas já serializadas ficam num cache LRU
+# limitado por número de entradas e por bytes. Cada entrada guarda a "versão" da tabela de origem
+# (oid + relfilenode, que mudam a cada rebuild do dbt, e o contador de linhas modificadas do
+# pg_stat): quando a versão muda, as entradas daquele mart são descartadas. A versão também
+# compõe o ETag, então um dashboard que repete a consulta com If-None-Match recebe 304 sem
+# consulta ao mart nem serialização.
+SCHEMA_MARTS = 'public_public_analytics'
+MARTS_API = {
+    'consumo-regional': {
+        'tabela': f'{SCHEMA_MARTS}.analise_consumo_regional',
+        'filtros': ['estado', 'tipo_cliente', 'periodo'],
+        'ordem': 'ano, mes, estado, tipo_cliente',
+        'ordem_top': 'consumo_total_kwh DESC',
+    },
+    'consumo-regional-movel': {
+        'tabela': f'{SCHEMA_MARTS}.analise_consumo_regional_movel',
+        'filtros': ['estado', 'tipo_cliente', 'periodo'],
+        'ordem': 'ano, mes, estado, tipo_cliente',
+        'ordem_top': 'consumo_total_kwh DESC',
+    },
+    'perdas-energia': {
+        'tabela': f'{SCHEMA_MARTS}.analise_perdas_energia',
+        'filtros': ['estado', 'periodo'],
+        'ordem': 'ano, mes, estado',
+        'ordem_top': 'perda_tecnica_total_kwh + perda_nao_tecnica_total_kwh DESC',
+    },
+    'ocorrencias-tecnicas': {
+        'tabela': f'{SCHEMA_MARTS}.analise_ocorrencias_tecnicas',
+        'filtros': ['estado', 'periodo'],
+        'ordem': 'ano, mes, id_ocorrencia_fato',
+        'ordem_top': 'tempo_reparo_h DESC',
+    },
+    'top-clientes': {
+        'tabela': 'public_analytics.top_clientes_por_consumo',
+        'filtros': ['estado'],
+        'ordem': 'rank_consumo_geral',
+        'ordem_top': 'rank_consumo_geral',
+    },
+}
+MAX_LINHAS_API_MARTS = 50_000  # Respostas maiores são truncadas (use 'top' ou filtros)
+MAX_ENTRADAS_CACHE_MARTS = 256
+MAX_BYTES_CACHE_MARTS = 64 * 1024 * 1024
+INTERVALO_VERIFICACAO_MARTS_SEGUNDOS = 2  # Versões das tabelas consultadas no máximo uma vez por intervalo
+
+_CACHE_MARTS = OrderedDict()  # (mart, filtros) -> (versão da tabela, corpo JSON em bytes); do menos ao mais recente
+_ESTADO_CACHE_MARTS = {'bytes': 0, 'versoes': {}, 'verificado_em': None}
+METRICAS_CACHE_MARTS = {'hits': 0, 'misses': 0, 'nao_modificados': 0, 'despejos': 0, 'invalidacoes': 0}
+_LOCK_CACHE_MARTS = threading.Lock()
+
+
+def versoes_marts():
+    """
+    Versão atual de cada tabela de MARTS_API (None se ainda não existir). Reaproveita a
+    última leitura do catálogo por INTERVALO_VERIFICACAO_MARTS_SEGUNDOS.
+    """
+    with _LOCK_CACHE_MARTS:
+        verificado_em = _ESTADO_CACHE_MARTS['verificado_em']
+        if verificado_em is not None and time.monotonic() - verificado_em < INTERVALO_VERIFICACAO_MARTS_SEGUNDOS:
+            return _ESTADO_CACHE_MARTS['versoes']
+
+    sql_versoes = text("""
+                       SELECT n.nspname || '.' || c.relname                                    AS tabela,
+                              c.oid::text || '-' || c.relfilenode::text || '-' ||
+                              COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)::text       AS versao
+                       FROM pg_class AS c
+                                JOIN pg_namespace AS n ON n.oid = c.relnamespace
+                                LEFT JOIN pg_stat_all_tables AS s ON s.relid = c.oid
+                       WHERE n.nspname || '.' || c.relname = ANY (:tabelas)
+                       """)
+    tabelas = [config['tabela'] for config in MARTS_API.values()]
+    # Lida no mesmo endpoint dos dados. Numa réplica física o oid/relfilenode acompanha os rebuilds
+    # do dbt, mas os contadores do pg_stat são locais: lá, só os rebuilds invalidam o cache.
+    with engine_leitura().connect() as conn:
+        versoes = dict(conn.execute(sql_versoes, {'tabelas': tabelas}).all())
+
+    with _LOCK_CACHE_MARTS:
+        mudaram = {t for t in tabelas if versoes.get(t) != _ESTADO_CACHE_MARTS['versoes'].get(t)}
+        if mudaram and _ESTADO_CACHE_MARTS['verificado_em'] is not None:
+            for chave in [c for c, (tabela, _, _) in _CACHE_MARTS.items() if tabela in mudaram]:
+                _ESTADO_CACHE_MARTS['bytes'] -= len(_CACHE_MARTS.pop(chave)[2])
+            METRICAS_CACHE_MARTS['invalidacoes'] += len(mudaram)
+            logging.info(f"Marts reconstruídos, cache invalidado: {', '.join(sorted(mudaram))}")
+        _ESTADO_CACHE_MARTS['versoes'] = versoes
+        _ESTADO_CACHE_MARTS['verificado_em'] = time.monotonic()
+    return versoes
+
+
+def _guardar_no_cache_marts(chave, tabela, versao, corpo):
+    """Insere no LRU e despeja as entradas menos usadas até caber nos limites."""
+    if len(corpo) > MAX_BYTES_CACHE_MARTS:
+        return
+    with _LOCK_CACHE_MARTS:
+        if chave in _CACHE_MARTS:
+            _ESTADO_CACHE_MARTS['bytes'] -= len(_CACHE_MARTS.pop(chave)[2])
+        _CACHE_MARTS[chave] = (tabela, versao, corpo)
+        _ESTADO_CACHE_MARTS['bytes'] += len(corpo)
+        while len(_CACHE_MARTS) > MAX_ENTRADAS_CACHE_MARTS or _ESTADO_CACHE_MARTS['bytes'] > MAX_BYTES_CACHE_MARTS:
+            _, (_, _, antigo) = _CACHE_MARTS.popitem(last=False)
+            _ESTADO_CACHE_MARTS['bytes'] -= len(antigo)
+            METRICAS_CACHE_MARTS['despejos'] += 1
+
+
+def _valor_json(valor):
+    """Conversão dos tipos do banco que o json não conhece (NUMERIC e datas)."""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def filtros_mart(nome_mart, args):
+    """
+    Valida e normaliza os filtros da query string para o mart: estado, tipo_cliente,
+    de/ate ('AAAA-MM') e top. Retorna um dicionário ordenável (parte da chave do cache).
+    ValueError para filtro inválido ou não suportado pelo mart.
+    """
+    config = MARTS_API[nome_mart]
+    filtros = {}
+    for nome in ('estado', 'tipo_cliente'):
+        if args.get(nome):
+            if nome not in config['filtros']:
+                raise ValueError(f"O mart {nome_mart} não tem filtro por '{nome}'.")
+            filtros[nome] = args[nome].strip().upper() if nome == 'estado' else args[nome].strip().capitalize()
+    for nome in ('de', 'ate'):
+        if args.get(nome):
+            if 'periodo' not in config['filtros']:
+                raise ValueError(f"O mart {nome_mart} não tem filtro por período.")
+            filtros[nome] = _mes_para_indice(args[nome])
+    if args.get('top'):
+        filtros['top'] = int(args['top'])
+        if not 0 < filtros['top'] <= MAX_LINHAS_API_MARTS:
+            raise ValueError(f"'top' deve estar entre 1 e {MAX_LINHAS_API_MARTS}.")
+    return filtros
+
+
+def consultar_mart(nome_mart, filtros):
+    """Executa a consulta filtrada no mart e devolve o corpo JSON (bytes)."""
+    config = MARTS_API[nome_mart]
+    condicoes, parametros = [], {}
+    if 'estado' in filtros:
+        condicoes.append("estado = :estado")
+    if 'tipo_cliente' in filtros:
+        condicoes.append("tipo_cliente::text = :tipo_cliente")
+    if 'de' in filtros:
+        condicoes.append("ano * 12 + mes - 1 >= :de")
+    if 'ate' in filtros:
+        condicoes.append("ano * 12 + mes - 1 <= :ate")
+    parametros.update(filtros)
+    limite = filtros.get('top', MAX_LINHAS_API_MARTS)
+    parametros['limite'] = limite + 1  # Uma linha a mais indica truncamento
+
+    sql_mart = text(f"""
+                    SELECT *
+                    FROM {config['tabela']}
+                    {('WHERE ' + ' AND '.join(condicoes)) if condicoes else ''}
+                    ORDER BY {config['ordem_top'] if 'top' in filtros else config['ordem']}
+                    LIMIT :limite
+                    """)
+    with engine_leitura().connect() as conn:
+        conexao.definir_statement_timeout(conn, TIMEOUT_LEITURA_API_MS)
+        linhas = [dict(linha._mapping) for linha in conn.execute(sql_mart, parametros)]
+
+    # ano/mes são NUMERIC no banco: saem como inteiros, conforme o registro comum/esquemas.py
+    nome_tabela = config['tabela'].split('.')[-1]
+    if nome_tabela in esquemas.ESQUEMAS_MARTS:
+        inteiras = [nome for nome, dtype in esquemas.colunas_pandas(nome_tabela) if dtype.startswith('int')]
+        for linha in linhas:
+            for nome in inteiras:
+                if linha.get(nome) is not None:
+                    linha[nome] = int(linha[nome])
+
+    truncado = 'top' not in filtros and len(linhas) > limite
+    corpo = {
+        'mart': nome_mart,
+        'filtros': filtros,
+        'linhas': min(len(linhas), limite),
+        'truncado': truncado,
+        'itens': linhas[:limite],
+    }
+    return json.dumps(corpo, default=_valor_json, ensure_ascii=False).encode('utf-8')
+
+
+@bp.route('/api/marts', methods=['GET'])
+def listar_marts_api():
+    """Marts disponíveis, seus filtros e as métricas do cache."""
+    with _LOCK_CACHE_MARTS:
+        cache = {**METRICAS_CACHE_MARTS, 'entradas': len(_CACHE_MARTS), 'bytes': _ESTADO_CACHE_MARTS['bytes']}
+    return jsonify({
+        'marts': {nome: {'tabela': c['tabela'], 'filtros': c['filtros'] + ['top']} for nome, c in MARTS_API.items()},
+        'cache': cache,
+    })
+
+
+@bp.route('/api/marts/<nome_mart>', methods=['GET'])
+def api_mart(nome_mart):
+    """
+    Linhas de um mart em JSON. Filtros (query string): estado, tipo_cliente, de e ate
+    ('AAAA-MM', inclusive) e top (N primeiras linhas pela ordem de ranking do mart).
+    Responde com ETag; com If-None-Match igual e tabela inalterada, responde 304.
+    """
+    if nome_mart not in MARTS_API:
+        return jsonify({"status": "erro", "mensagem": f"Mart desconhecido. Marts: {', '.join(MARTS_API)}."}), 404
+    try:
+        filtros = filtros_mart(nome_mart, request.args)
+    except ValueError as e:
+        return jsonify({"status": "erro", "mensagem": f"Filtro inválido: {e}"}), 400
+
+    tabela = MARTS_API[nome_mart]['tabela']
+    try:
+        versao = versoes_marts().get(tabela)
+    except Exception as e:
+        logging.error(f"ERRO ao verificar a versão dos marts: {e}")
+        return jsonify({"status": "erro", "mensagem": str(e)}), 500
+    if versao is None:
+        return jsonify({"status": "erro", "mensagem": f"A tabela {tabela} não existe. Rode o dbt run."}), 404
+
+    chave = (nome_mart, tuple(sorted(filtros.items())))
+    etag = hashlib.sha1(f"{versao}|{chave}".encode('utf-8')).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        with _LOCK_CACHE_MARTS:
+            METRICAS_CACHE_MARTS['nao_modificados'] += 1
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return resposta
+
+    with _LOCK_CACHE_MARTS:
+        entrada = _CACHE_MARTS.get(chave)
+        if entrada is not None and entrada[1] == versao:
+            _CACHE_MARTS.move_to_end(chave)
+            METRICAS_CACHE_MARTS['hits'] += 1
+            corpo = entrada[2]
+        else:
+            METRICAS_CACHE_MARTS['misses'] += 1
+            corpo = None
+
+    if corpo is None:
+        try:
+            corpo = consultar_mart(nome_mart, filtros)
+        except Exception as e:
+            logging.error(f"ERRO ao consultar o mart {nome_mart}: {e}")
+            return jsonify({"status": "erro", "mensagem": str(e)}), 500
+        _guardar_no_cache_marts(chave, tabela, versao, corpo)
+
+    resposta = Response(corpo, mimetype='application/json')
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'  # O cliente pode guardar, mas revalida com o ETag
+    return resposta
+
+
+@bp.route('/test-cliente-faker', methods=['GET'])
 def get_cliente_faker():
-    """Endpoint que retorna um cliente aleatório com integridade de localização."""
-    cliente = criar_cliente_aleatorio(db)
+    """
+    Endpoint que retorna um cliente aleatório com integridade de localização.
+    Não grava nada, então não reserva id_cliente (id_cliente vem null): o id só é alocado ao salvar.
+    """
+    cliente = criar_cliente_aleatorio(db, reservar_id=False)
 
     if cliente is None:
         return jsonify({"erro": "Falha na geração. O setup do DB (setup_dimensoes_em_memoria) pode ter falhado."}, 500)
@@ -488,13 +1679,20 @@ def get_cliente_faker():
     return jsonify(cliente)
 
 
-@app.route('/adicionar-cliente-faker', methods=['GET'])
+@bp.route('/adicionar-cliente-faker', methods=['GET'])
 def adicionar_cliente_faker():
     """
     Cria um cliente aleatório E salva na tabela public.clientes_bruto.
     """
     # 1. Gera o cliente da mesma forma
-    cliente_data = criar_cliente_aleatorio(db)
+    try:
+        cliente_data = criar_cliente_aleatorio(db)
+    except Exception as e:
+        return jsonify({
+            "status": "FALHA",
+            "mensagem": "Não foi possível reservar um id_cliente.",
+            "detalhe": str(e)
+        }), 500
 
     if cliente_data is None:
         return jsonify({"erro": "Falha na geração. O setup do DB (setup_dimensoes_em_memoria) pode ter falhado."}, 500)
@@ -541,18 +1739,139 @@ def adicionar_cliente_faker():
         }, 500)
 
 
-@app.route('/teste-conexao', methods=['GET'])
+# --- Geração de Clientes em Lote ---
+TAMANHO_LOTE_CLIENTES = 50_000  # Clientes gerados e gravados (um COPY + commit) por vez
+MAX_CLIENTES_POR_REQUISICAO = 5_000_000
+TAMANHO_POOL_NOMES = 2_000  # Nomes e sobrenomes pré-gerados pelo Faker e combinados ao acaso
+
+
+def gerar_pool_nomes(tamanho=TAMANHO_POOL_NOMES):
+    """Pré-gera (uma vez por requisição) listas de primeiros nomes e sobrenomes únicos do Faker."""
+    import numpy as np
+    fake = obter_faker()
+    primeiros = np.array(sorted({fake.first_name() for _ in range(tamanho)}), dtype=object)
+    sobrenomes = np.array(sorted({fake.last_name() for _ in range(tamanho)}), dtype=object)
+    return primeiros, sobrenomes
+
+
+def gerar_lote_clientes(ids, rng, pool_nomes, dimensoes):
+    """
+    Versão vetorizada de criar_cliente_aleatorio para vários clientes: mesmas fontes (snapshot de
+    DADOS_BASE), mas localização, tipo, data e nome sorteados com NumPy para o lote inteiro.
+    Retorna um DataFrame com as colunas de clientes_bruto.
+    """
+    import numpy as np
+    import pandas as pd
+    n = len(ids)
+    locais = amostrar_localizacoes(dimensoes, n, rng)
+
+    data_inicio, data_fim = dimensoes['intervalo_data']
+    dias = rng.integers(0, (data_fim - data_inicio).days + 1, size=n)
+
+    primeiros, sobrenomes = pool_nomes
+    nomes = primeiros[rng.integers(0, len(primeiros), size=n)] + ' ' + sobrenomes[rng.integers(0, len(sobrenomes), size=n)]
+
+    return pd.DataFrame({
+        'id_cliente': ids,
+        'nome_cliente': nomes,
+        'cidade': locais['cidade'],
+        'estado': locais['estado_sigla'],
+        'tipo_cliente': rng.choice(np.array(dimensoes['tipos_cliente'], dtype=object), size=n),
+        'data_adesao': np.datetime64(data_inicio, 'D') + dias,
+    })
+
+
+@bp.route('/adicionar-clientes-faker-lote', methods=['POST'])
+def adicionar_clientes_faker_lote():
+    """
+    Gera N clientes aleatórios numa única requisição e grava em public.clientes_bruto.
+    Parâmetros (query string ou JSON): quantidade (obrigatório) e seed (opcional).
+    Os clientes são gerados e copiados (COPY) em lotes de TAMANHO_LOTE_CLIENTES, cada um na sua
+    transação: a memória fica limitada a um lote e uma falha só desfaz o lote corrente.
+    """
+    import numpy as np
+    parametros = {**request.args, **(request.get_json(silent=True) or {})}
+    try:
+        quantidade = int(parametros.get('quantidade', 0))
+        seed = int(parametros['seed']) if parametros.get('seed') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"status": "erro", "mensagem": "'quantidade' e 'seed' devem ser inteiros."}), 400
+    if not 0 < quantidade <= MAX_CLIENTES_POR_REQUISICAO:
+        return jsonify({"status": "erro",
+                        "mensagem": f"'quantidade' deve estar entre 1 e {MAX_CLIENTES_POR_REQUISICAO}."}), 400
+    # Um único snapshot para a requisição inteira: uma recarga no meio não mistura versões
+    dimensoes = obter_dimensoes()
+    if not dimensoes['n_localizacoes']:
+        return jsonify({"status": "erro",
+                        "mensagem": "Falha na geração. O setup do DB (setup_dimensoes_em_memoria) pode ter falhado."}), 500
+
+    logging.info(f"Iniciando geração de {quantidade} clientes em lote...")
+    inicio = time.perf_counter()
+    tempo_geracao = tempo_escrita = 0.0
+    inseridos = 0
+    ids_inseridos = []
+    rng = np.random.default_rng(seed)
+
+    try:
+        pool_nomes = gerar_pool_nomes()
+        for inicio_lote in range(0, quantidade, TAMANHO_LOTE_CLIENTES):
+            t0 = time.perf_counter()
+            ids = np.array(reservar_ids('clientes_bruto', min(TAMANHO_LOTE_CLIENTES, quantidade - inicio_lote)))
+            with cronometrar_pandas('gerar_lote_clientes'):
+                df_lote = gerar_lote_clientes(ids, rng, pool_nomes, dimensoes)
+            t1 = time.perf_counter()
+
+            raw_conn = db.engine.raw_connection()
+            try:
+                cursor = raw_conn.cursor()
+                with cronometrar_pandas('copiar_dataframe_clientes_bruto'):
+                    copia_postgres.copiar_dataframe(cursor, df_lote, 'public.clientes_bruto')
+                raw_conn.commit()
+            except Exception:
+                raw_conn.rollback()
+                raise
+            finally:
+                raw_conn.close()
+
+            tempo_geracao += t1 - t0
+            tempo_escrita += time.perf_counter() - t1
+            inseridos += len(df_lote)
+            ids_inseridos.extend([int(ids[0]), int(ids[-1])])
+            logging.info(f"Lote de clientes gravado: {inseridos}/{quantidade}")
+
+    except Exception as e:
+        logging.error(f"Erro na geração de clientes em lote após {inseridos} inseridos: {e}")
+        return jsonify({"status": "erro", "mensagem": str(e), "registros_inseridos": inseridos}), 500
+
+    segundos = time.perf_counter() - inicio
+    logging.info(f"Sucesso! {inseridos} clientes inseridos em {segundos:.2f}s ({inseridos / segundos:,.0f} clientes/s).")
+    return jsonify({
+        "status": "sucesso",
+        "registros_inseridos": inseridos,
+        "primeiro_id_cliente": min(ids_inseridos),
+        "ultimo_id_cliente": max(ids_inseridos),
+        "lotes": -(-quantidade // TAMANHO_LOTE_CLIENTES),
+        "segundos": round(segundos, 3),
+        "segundos_geracao": round(tempo_geracao, 3),
+        "segundos_escrita": round(tempo_escrita, 3),
+        "clientes_por_seg": round(inseridos / segundos, 1),
+    }), 201
+
+
+@bp.route('/teste-conexao', methods=['GET'])
 def teste_conexao():
     """
     Endpoint de diagnóstico que consulta o último registro da tabela clientes_bruto
     para testar a conexão com o PostgreSQL e a existência da tabela.
     """
+    import pandas as pd
     logging.info("Iniciando teste de conexão com o PostgreSQL...")
     sql_ultimo_registro = text("SELECT * FROM public.clientes_bruto ORDER BY id_cliente DESC LIMIT 1;")
 
     try:
         with db.engine.connect() as conn:
-            resultado = pd.read_sql(sql_ultimo_registro, conn)
+            with cronometrar_pandas('read_sql_teste_conexao'):
+                resultado = esquemas.aplicar_esquema(pd.read_sql_query(sql_ultimo_registro, conn), 'clientes_bruto')
 
             if resultado.empty:
                 return jsonify({
@@ -578,9 +1897,9 @@ def teste_conexao():
         detalhe = f"Erro de banco de dados: {mensagem_erro}"
 
         if "fe_sendauth" in mensagem_erro or "password" in mensagem_erro:
-            detalhe = "Verifique as credenciais (db_user, db_pass)."
+            detalhe = "Verifique as credenciais em LIGHT_DB_URL (comum/conexao.py)."
         elif "could not connect to server" in mensagem_erro:
-            detalhe = "Verifique se o host (db_host) e a porta (db_port) estão corretos e se o PostgreSQL está rodando."
+            detalhe = "Verifique se o host e a porta de LIGHT_DB_URL estão corretos e se o PostgreSQL está rodando."
         elif "relation" in mensagem_erro and "does not exist" in mensagem_erro:
             detalhe = "A tabela 'public.clientes_bruto' (ou outra consultada no setup) não existe."
 
@@ -591,273 +1910,790 @@ def teste_conexao():
         }, 500)
 
 
-@app.route('/gerar-medicoes-lote', methods=['POST'])
-def gerar_medicoes_lote():
-    """
-    Gera e insere dados mock em lote para a tabela medicoes_energia_bruto
-    para clientes de 1001 a 1050 (9 meses cada).
-    Usa o db.session do Flask-SQLAlchemy.
-    """
-    logging.info("Iniciando geração de medições em lote...")
-
-    dados_para_inserir = []
-
-    CLIENTE_ID_INICIAL = 1001
-    CLIENTE_ID_FINAL = 1050
-    MES_INICIAL = 2
-    MES_FINAL = 10
+# --- Motor Genérico de Dados Mock ---
+# Datasets que o motor sabe gerar: uma linha por (chave, mês) do período pedido.
+#   chave: 'cliente' (faixa de id_cliente) ou 'estado' (lista de siglas)
+#   dia: 'primeiro' (dia 1 do mês) ou 'aleatorio' (dia sorteado dentro do mês)
+#   valores: coluna -> distribuição padrão (sobrescrita pelo parâmetro 'distribuicao')
+DATASETS_MOCK = {
+    'medicoes': {
+        'tabela': 'medicoes_energia_bruto',
+        'chave': 'cliente',
+        'coluna_data': 'data_medicao',
+        'dia': 'primeiro',
+        'valores': {'consumo_kwh': {'tipo': 'uniforme', 'min': 600, 'max': 3000}},
+        'tipo_medicao_padrao': 'Normal',
+    },
+    'perdas': {
+        'tabela': 'perdas_energia_bruto',
+        'chave': 'estado',
+        'coluna_data': 'data_perda',
+        'dia': 'aleatorio',
+        'valores': {
+            'perda_tecnica_kwh': {'tipo': 'inteiro', 'min': 500, 'max': 1100},
+            'perda_nao_tecnica_kwh': {'tipo': 'inteiro', 'min': 400, 'max': 900},
+        },
+    },
+}
 
-    try:
-        # --- CORREÇÃO AQUI ---
-        # Inicia a transação ANTES de qualquer operação de DB
-        with db.session.begin():
+def _distribuicao_uniforme(rng, n, p):
+    return rng.uniform(p['min'], p['max'], n).round(2)
 
-            # 1. Buscar o último id_medicao da tabela
-            sql_max_id = text("SELECT MAX(id_medicao) FROM public.medicoes_energia_bruto")
-            resultado = db.session.execute(sql_max_id).scalar()
-
-            proximo_id_medicao = (resultado or 0) + 1
-
-            logging.info(f"Iniciando geração. Próximo id_medicao: {proximo_id_medicao}")
-
-            # 2. Gerar os dados mock em memória
-            for id_cliente in range(CLIENTE_ID_INICIAL, CLIENTE_ID_FINAL + 1):
-                for mes in range(MES_INICIAL, MES_FINAL + 1):
-                    data_medicao_str = f"2025-{mes:02d}-01"
-                    consumo_kwh_val = round(fake.pyfloat(min_value=600, max_value=3000, right_digits=2), 2)
-
-                    dados_para_inserir.append({
-                        "id_medicao": proximo_id_medicao,
-                        "id_cliente": id_cliente,
-                        "data_medicao": data_medicao_str,
-                        "consumo_kwh": consumo_kwh_val,
-                        "tipo_medicao": "Normal"
-                    })
-                    proximo_id_medicao += 1
-
-            # 3. Inserir todos os dados em lote
-            if not dados_para_inserir:
-                logging.warning("Nenhum dado foi gerado para inserção.")
-                # Retornar aqui não causará problemas,
-                # o 'with' fará um rollback automático da transação vazia.
-                return jsonify({"status": "aviso", "mensagem": "Nenhum dado foi gerado."}), 200
-
-            logging.info(f"Pronto para inserir {len(dados_para_inserir)} registros em lote...")
-
-            sql_insert = text("""
-                              INSERT INTO public.medicoes_energia_bruto
-                                  (id_medicao, id_cliente, data_medicao, consumo_kwh, tipo_medicao)
-                              VALUES (:id_medicao, :id_cliente, :data_medicao, :consumo_kwh, :tipo_medicao)
-                              """)
-
-            # Executa a inserção DENTRO do mesmo 'with'
-            db.session.execute(sql_insert, dados_para_inserir)
 
-        # FIM DO 'with db.session.begin()'
-        # Se chegou aqui, o commit foi feito automaticamente.
+def _distribuicao_inteira(rng, n, p):
+    return rng.integers(p['min'], p['max'] + 1, n)
 
-        total_inserido = len(dados_para_inserir)
-        logging.info(f"Sucesso! {total_inserido} registros inseridos.")
 
-        return jsonify({
-            "status": "sucesso",
-            "registros_inseridos": total_inserido,
-            "ultimo_id_medicao_inserido": proximo_id_medicao - 1
-        }), 201
+def _distribuicao_normal(rng, n, p):
+    return rng.normal(p['media'], p['desvio'], n).clip(p.get('min', 0), p.get('max', float('inf'))).round(2)
 
-    except Exception as e:
-        # O 'with db.session.begin()' faz o rollback automaticamente em caso de exceção.
-        logging.error(f"Erro na operação de inserção em lote: {e}")
-        return jsonify({"status": "erro", "mensagem": str(e)}), 500
 
-@app.route('/gerar-medicoes-lote-nov-dez', methods=['POST'])
-def gerar_medicoes_lote_nov_dez():
-    """
-    Gera e insere dados mock (NOV e DEZ) para a tabela medicoes_energia_bruto
-    para clientes de 1001 a 1050.
-    """
-    logging.info("Iniciando geração de medições em lote (Nov/Dez)...")
+# Distribuições disponíveis (parâmetros: min/max, ou media/desvio com min/max opcionais para truncar)
+DISTRIBUICOES_MOCK = {
+    'uniforme': _distribuicao_uniforme,
+    'inteiro': _distribuicao_inteira,
+    'normal': _distribuicao_normal,
+}
 
-    dados_para_inserir = []
+LINHAS_POR_LOTE_MOCK = 100_000  # Linhas geradas e copiadas (um COPY + commit) por vez
+MAX_LINHAS_MOCK = 50_000_000
 
-    # --- Regras de Negócio (Nov/Dez) ---
-    CLIENTE_ID_INICIAL = 1001
-    CLIENTE_ID_FINAL = 1050
-    MESES_PARA_GERAR = [11, 12]  # Apenas Novembro e Dezembro
-    ANO_GERACAO = 2025
-    CONSUMO_MIN = 400.0
-    CONSUMO_MAX = 2000.0
-    TIPO_MEDICAO_FIXO = "Estimada"  # Novo tipo
-    # ------------------------------------
 
-    try:
-        # Inicia a transação única para SELECT MAX e INSERT
-        with db.session.begin():
+def _mes_para_indice(texto):
+    """'2025-02' -> índice absoluto do mês (ano * 12 + mês - 1)."""
+    ano, mes = (int(parte) for parte in str(texto).split('-'))
+    if not 1 <= mes <= 12:
+        raise ValueError(f"Mês inválido: {texto}")
+    return ano * 12 + mes - 1
 
-            # 1. Buscar o último id_medicao da tabela
-            sql_max_id = text("SELECT MAX(id_medicao) FROM public.medicoes_energia_bruto")
-            resultado = db.session.execute(sql_max_id).scalar()
 
-            proximo_id_medicao = (resultado or 0) + 1
+def montar_especificacao_mock(parametros):
+    """
+    Valida os parâmetros da geração e completa com os padrões do dataset. Levanta ValueError.
 
-            logging.info(f"Iniciando geração (Nov/Dez). Próximo id_medicao: {proximo_id_medicao}")
+    Exemplo (medições de fev a out/2025 para os clientes 1001 a 1050):
+        {"dataset": "medicoes", "clientes": {"inicio": 1001, "fim": 1050},
+         "periodo": {"inicio": "2025-02", "fim": "2025-10"},
+         "distribuicao": {"consumo_kwh": {"tipo": "normal", "media": 1500, "desvio": 300, "min": 0}},
+         "tipo_medicao": "Normal", "seed": 42}
+    """
+    import numpy as np
+    nome = parametros.get('dataset')
+    if nome not in DATASETS_MOCK:
+        raise ValueError(f"'dataset' deve ser um de: {', '.join(DATASETS_MOCK)}.")
+    dataset = DATASETS_MOCK[nome]
+
+    if dataset['chave'] == 'cliente':
+        faixa = parametros.get('clientes') or {}
+        inicio, fim = int(faixa['inicio']), int(faixa['fim'])
+        if inicio > fim:
+            raise ValueError("'clientes.inicio' deve ser menor ou igual a 'clientes.fim'.")
+        chaves = np.arange(inicio, fim + 1, dtype=np.int64)
+    else:
+        estados = parametros.get('estados') or list(MAP_ESTADOS_ID)
+        chaves = np.array([str(e).upper() for e in estados], dtype=object)
+
+    periodo = parametros.get('periodo') or {}
+    indices_mes = np.arange(_mes_para_indice(periodo['inicio']), _mes_para_indice(periodo['fim']) + 1)
+    if parametros.get('meses'):
+        indices_mes = indices_mes[np.isin(indices_mes % 12 + 1, [int(m) for m in parametros['meses']])]
+    if len(chaves) == 0 or len(indices_mes) == 0:
+        raise ValueError("A combinação de chaves e período não gera nenhuma linha.")
+
+    distribuicoes = {coluna: dict(padrao) for coluna, padrao in dataset['valores'].items()}
+    pedidas = parametros.get('distribuicao') or {}
+    # Uma única distribuição (com 'tipo') vale para todas as colunas de valor
+    pedidas = {coluna: pedidas for coluna in distribuicoes} if 'tipo' in pedidas else pedidas
+    for coluna, distribuicao in pedidas.items():
+        if coluna not in distribuicoes:
+            raise ValueError(f"Coluna de valor desconhecida para {nome}: {coluna}")
+        if distribuicao.get('tipo') not in DISTRIBUICOES_MOCK:
+            raise ValueError(f"'tipo' da distribuição deve ser um de: {', '.join(DISTRIBUICOES_MOCK)}.")
+        distribuicoes[coluna] = distribuicao
+
+    especificacao = {
+        'dataset': nome,
+        'chaves': chaves,
+        'indices_mes': indices_mes,
+        'distribuicoes': distribuicoes,
+        'seed': int(parametros['seed']) if parametros.get('seed') is not None else None,
+        'linhas_por_lote': max(1, int(parametros.get('linhas_por_lote') or LINHAS_POR_LOTE_MOCK)),
+        'total_linhas': len(chaves) * len(indices_mes),
+    }
+    if 'tipo_medicao_padrao' in dataset:
+        especificacao['tipo_medicao'] = parametros.get('tipo_medicao', dataset['tipo_medicao_padrao'])
+        if especificacao['tipo_medicao'] not in esquemas.ENUMS_POSTGRES['tipo_medicao_enum']:
+            raise ValueError(f"'tipo_medicao' deve ser um de: {esquemas.ENUMS_POSTGRES['tipo_medicao_enum']}.")
+    if not 0 < especificacao['total_linhas'] <= MAX_LINHAS_MOCK:
+        raise ValueError(f"A geração pedida tem {especificacao['total_linhas']} linhas (máximo {MAX_LINHAS_MOCK}).")
+    return especificacao
 
-            # 2. Gerar os dados mock em memória
-            # 50 usuários (1001 a 1050)
-            for id_cliente in range(CLIENTE_ID_INICIAL, CLIENTE_ID_FINAL + 1):
-                # 2 meses (11 e 12)
-                for mes in MESES_PARA_GERAR:
-                    data_medicao_str = f"{ANO_GERACAO}-{mes:02d}-01"
 
-                    # Usa o 'fake' global com a nova faixa de consumo
-                    consumo_kwh_val = round(fake.pyfloat(min_value=CONSUMO_MIN, max_value=CONSUMO_MAX, right_digits=2),
-                                            2)
+def gerar_lote_mock(especificacao, inicio, fim, rng):
+    """
+    Gera as linhas [inicio, fim) da grade chave x mês, vetorizado: a linha i corresponde à chave
+    i // n_meses e ao mês i % n_meses. Retorna o DataFrame sem a coluna de id.
+    """
+    import numpy as np
+    import pandas as pd
+    dataset = DATASETS_MOCK[especificacao['dataset']]
+    indices_mes = especificacao['indices_mes']
+    posicoes = np.arange(inicio, fim)
+    chaves = especificacao['chaves'][posicoes // len(indices_mes)]
+    meses = indices_mes[posicoes % len(indices_mes)]
+
+    primeiro_dia = (meses // 12 - 1970) * 12 + meses % 12
+    datas = primeiro_dia.astype('datetime64[M]').astype('datetime64[D]')
+    if dataset['dia'] == 'aleatorio':
+        dias_no_mes = ((primeiro_dia + 1).astype('datetime64[M]').astype('datetime64[D]') - datas).astype(int)
+        datas = datas + rng.integers(0, dias_no_mes)
+
+    colunas = {'id_cliente' if dataset['chave'] == 'cliente' else 'estado': chaves,
+               dataset['coluna_data']: datas}
+    for coluna, distribuicao in especificacao['distribuicoes'].items():
+        colunas[coluna] = DISTRIBUICOES_MOCK[distribuicao['tipo']](rng, len(posicoes), distribuicao)
+    if 'tipo_medicao' in especificacao:
+        colunas['tipo_medicao'] = especificacao['tipo_medicao']
+    return pd.DataFrame(colunas)
+
+
+def gerar_dados_mock(especificacao):
+    """
+    Executa uma especificação do motor de mock: gera e grava em lotes de 'linhas_por_lote' linhas,
+    cada lote com ids do alocador, um COPY e um commit próprio. A memória fica limitada a um lote,
+    qualquer que seja o total. Retorna o resumo da geração (linhas, ids, tempos, linhas/s).
+    """
+    import numpy as np
+    dataset = DATASETS_MOCK[especificacao['dataset']]
+    tabela = dataset['tabela']
+    coluna_id = esquemas.ESQUEMAS[tabela]['id']
+    colunas_tabela = [nome for nome, _ in esquemas.colunas_postgres(tabela)]
+    rng = np.random.default_rng(especificacao['seed'])
+    total = especificacao['total_linhas']
+    passo = especificacao['linhas_por_lote']
+
+    inicio = time.perf_counter()
+    inseridos = 0
+    primeiro_id = ultimo_id = None
+    for inicio_lote in range(0, total, passo):
+        fim_lote = min(inicio_lote + passo, total)
+        with cronometrar_pandas(f"gerar_lote_mock_{especificacao['dataset']}"):
+            df_lote = gerar_lote_mock(especificacao, inicio_lote, fim_lote, rng)
+        df_lote[coluna_id] = reservar_ids(tabela, len(df_lote))
+
+        raw_conn = db.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            with cronometrar_pandas(f"copiar_dataframe_{tabela}"):
+                copia_postgres.copiar_dataframe(cursor, df_lote[colunas_tabela], f"public.{tabela}")
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+        inseridos += len(df_lote)
+        primeiro_id = primeiro_id if primeiro_id is not None else int(df_lote[coluna_id].iloc[0])
+        ultimo_id = int(df_lote[coluna_id].iloc[-1])
+        logging.info(f"Lote mock de {especificacao['dataset']} gravado: {inseridos}/{total}")
+
+    segundos = time.perf_counter() - inicio
+    logging.info(f"Sucesso! {inseridos} linhas de {especificacao['dataset']} inseridas em {segundos:.2f}s.")
+    return {
+        "dataset": especificacao['dataset'],
+        "tabela": f"public.{tabela}",
+        "registros_inseridos": inseridos,
+        f"primeiro_{coluna_id}": primeiro_id,
+        f"ultimo_{coluna_id}": ultimo_id,
+        "lotes": -(-total // passo),
+        "segundos": round(segundos, 3),
+        "linhas_por_seg": round(inseridos / segundos, 1) if segundos else None,
+    }
 
-                    dados_para_inserir.append({
-                        "id_medicao": proximo_id_medicao,
-                        "id_cliente": id_cliente,
-                        "data_medicao": data_medicao_str,
-                        "consumo_kwh": consumo_kwh_val,
-                        "tipo_medicao": TIPO_MEDICAO_FIXO
-                    })
 
-                    # OBRIGATÓRIO: Incrementa o ID para o *próximo registro*
-                    proximo_id_medicao += 1
+@bp.route('/gerar-dados-mock', methods=['POST'])
+def gerar_dados_mock_endpoint():
+    """
+    Endpoint genérico do motor de mock. Recebe a especificação em JSON (ver montar_especificacao_mock):
+    dataset, faixa de clientes ou estados, período, meses, distribuição, tipo de medição e seed.
+    """
+    try:
+        especificacao = montar_especificacao_mock(request.get_json(silent=True) or {})
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "erro", "mensagem": f"Parâmetros inválidos: {e}"}), 400
 
-            # 3. Inserir todos os dados em lote
-            if not dados_para_inserir:
-                logging.warning("Nenhum dado (Nov/Dez) foi gerado para inserção.")
-                return jsonify({"status": "aviso", "mensagem": "Nenhum dado foi gerado."}), 200
+    logging.info(f"Iniciando geração mock de {especificacao['total_linhas']} linhas de {especificacao['dataset']}...")
+    try:
+        with trava_tarefa('gerar-dados-mock', request.get_json(silent=True) or {}):
+            return jsonify({"status": "sucesso", **gerar_dados_mock(especificacao)}), 201
+    except TarefaEmAndamento as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 409
+    except Exception as e:
+        logging.error(f"Erro na geração mock de {especificacao['dataset']}: {e}")
+        return jsonify({"status": "erro", "mensagem": str(e)}), 500
 
-            total_a_inserir = len(dados_para_inserir)  # Deve ser 100 (50 clientes * 2 meses)
-            logging.info(f"Pronto para inserir {total_a_inserir} registros (Nov/Dez) em lote...")
 
-            sql_insert = text("""
-                              INSERT INTO public.medicoes_energia_bruto
-                                  (id_medicao, id_cliente, data_medicao, consumo_kwh, tipo_medicao)
-                              VALUES (:id_medicao, :id_cliente, :data_medicao, :consumo_kwh, :tipo_medicao)
-                              """)
+def _executar_geracao_legada(parametros, coluna_id, descricao):
+    """Rotas antigas: mesma geração, agora pelo motor genérico, com a resposta no formato original."""
+    logging.info(f"Iniciando geração em lote ({descricao})...")
+    try:
+        with trava_tarefa('gerar-dados-mock', parametros):
+            resumo = gerar_dados_mock(montar_especificacao_mock(parametros))
+    except TarefaEmAndamento as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 409
+    except Exception as e:
+        logging.error(f"Erro na operação de inserção em lote ({descricao}): {e}")
+        return jsonify({"status": "erro", "mensagem": str(e)}), 500
 
-            # Executa a inserção DENTRO do mesmo 'with'
-            db.session.execute(sql_insert, dados_para_inserir)
+    return jsonify({
+        "status": "sucesso",
+        "registros_inseridos": resumo['registros_inseridos'],
+        f"ultimo_{coluna_id}_inserido": resumo[f'ultimo_{coluna_id}'],
+    }), 201
 
-        # FIM DO 'with db.session.begin()' - Commit automático
 
-        logging.info(f"Sucesso! {total_a_inserir} registros (Nov/Dez) inseridos.")
+@bp.route('/gerar-medicoes-lote', methods=['POST'])
+def gerar_medicoes_lote():
+    """
+    Gera e insere dados mock em lote para a tabela medicoes_energia_bruto
+    para clientes de 1001 a 1050 (9 meses cada).
+    """
+    return _executar_geracao_legada({
+        'dataset': 'medicoes',
+        'clientes': {'inicio': 1001, 'fim': 1050},
+        'periodo': {'inicio': '2025-02', 'fim': '2025-10'},
+        'tipo_medicao': 'Normal',
+    }, 'id_medicao', 'Fev-Out')
 
-        return jsonify({
-            "status": "sucesso",
-            "registros_inseridos": total_a_inserir,
-            "ultimo_id_medicao_inserido": proximo_id_medicao - 1
-        }), 201
 
-    except Exception as e:
-        # Rollback automático em caso de exceção
-        logging.error(f"Erro na operação de inserção em lote (Nov/Dez): {e}")
-        return jsonify({"status": "erro", "mensagem": str(e)}), 500
+@bp.route('/gerar-medicoes-lote-nov-dez', methods=['POST'])
+def gerar_medicoes_lote_nov_dez():
+    """
+    Gera e insere dados mock (NOV e DEZ) para a tabela medicoes_energia_bruto
+    para clientes de 1001 a 1050.
+    """
+    return _executar_geracao_legada({
+        'dataset': 'medicoes',
+        'clientes': {'inicio': 1001, 'fim': 1050},
+        'periodo': {'inicio': '2025-11', 'fim': '2025-12'},
+        'distribuicao': {'tipo': 'uniforme', 'min': 400.0, 'max': 2000.0},
+        'tipo_medicao': 'Estimada',
+    }, 'id_medicao', 'Nov/Dez')
 
 
-@app.route('/gerar-perdas-lote-jan-jul', methods=['POST'])
+@bp.route('/gerar-perdas-lote-jan-jul', methods=['POST'])
 def gerar_perdas_lote_jan_jul():
     """
     Gera e insere dados mock de PERDAS (Jan a Jul/2025) para BA, SP, MG.
     """
-    logging.info("Iniciando geração de PERDAS de energia em lote (Jan-Jul)...")
+    return _executar_geracao_legada({
+        'dataset': 'perdas',
+        'estados': ['BA', 'SP', 'MG'],
+        'periodo': {'inicio': '2025-01', 'fim': '2025-07'},
+    }, 'id_perda', 'Perdas Jan-Jul')
+
+
+def executar_geracao_mock_job(job, **parametros):
+    """Tarefa de job do motor de mock: valida a especificação e grava os lotes como uma etapa."""
+    especificacao = montar_especificacao_mock(parametros)
+    with etapa_job(job, f"Geração de {especificacao['total_linhas']} linhas de {especificacao['dataset']}"):
+        return gerar_dados_mock(especificacao)
+
+
+# Tipos de job aceitos por POST /jobs/<tipo> -> função (job, **parametros) que devolve o resultado
+TAREFAS_JOBS = {
+    'processar-cidades-sinalizar-duplicadas': executar_etl_completo,
+    'sinalizar-duplicadas-incremental': executar_sinalizacao_incremental,
+    'remover-duplicatas': executar_remocao_duplicatas,
+    'sincronizar-status': executar_sincronizacao_status,
+    'enriquecer-clientes-incremental': executar_enriquecimento_incremental,
+    'gerar-dados-mock': executar_geracao_mock_job,
+}
 
-    dados_para_inserir = []
 
-    # --- Regras de Negócio (Perdas) ---
-    ESTADOS_ALVO = ['BA', 'SP', 'MG']
-    MES_INICIAL = 1
-    MES_FINAL = 7
-    ANO_GERACAO = 2025
-    # ------------------------------------
+@bp.route('/jobs/<tipo>', methods=['POST'])
+def submeter_job_endpoint(tipo):
+    """
+    Submete um job em segundo plano e responde na hora com o job_id (202). Os parâmetros vão no
+    corpo JSON (ex.: a especificação do /gerar-dados-mock). Se um job igual já estiver na fila
+    ou executando, responde 200 com esse job (deduplicado).
+    """
+    if tipo not in TAREFAS_JOBS:
+        return jsonify({"status": "erro", "mensagem": f"Tipo de job desconhecido. Tipos: {', '.join(TAREFAS_JOBS)}."}), 404
+
+    parametros = request.get_json(silent=True) or {}
+    if tipo == 'gerar-dados-mock':
+        # Valida já na submissão, para o erro de parâmetro voltar como 400 e não como job com erro
+        try:
+            montar_especificacao_mock(parametros)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"status": "erro", "mensagem": f"Parâmetros inválidos: {e}"}), 400
+    elif parametros:
+        return jsonify({"status": "erro", "mensagem": f"O job {tipo} não recebe parâmetros."}), 400
+
+    job, criado = submeter_job(tipo, parametros)
+    return jsonify({
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "deduplicado": not criado,
+        "url_status": f"/jobs/{job['job_id']}",
+    }), 202 if criado else 200
+
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def status_job(job_id):
+    """Status, resultado, erro e tempo de cada etapa de um job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"status": "erro", "mensagem": "Job não encontrado neste processo."}), 404
+    return jsonify(job)
+
+
+@bp.route('/jobs', methods=['GET'])
+def listar_jobs():
+    """Jobs deste processo, do mais recente para o mais antigo (sem os resultados)."""
+    return jsonify([
+        {chave: job[chave] for chave in ('job_id', 'tipo', 'status', 'criado_em', 'segundos', 'etapa_com_erro')}
+        for job in reversed(list(JOBS.values()))
+    ])
+
+
+# --- Ingestão de medições em micro-lotes ---
+# POST /ingestao/medicoes recebe medições em NDJSON ou CSV, valida contra o esquema de
+# medicoes_energia_bruto e coloca as linhas num buffer do processo. Uma única thread grava o buffer
+# com um COPY por micro-lote quando ele junta TAMANHO_LOTE_INGESTAO linhas ou quando a submissão
+# mais antiga já esperou INTERVALO_FLUSH_INGESTAO_SEGUNDOS: milhares de POSTs pequenos viram poucos
+# COPYs. Com o buffer cheio, a requisição espera um pouco por espaço e depois recebe 429.
+TABELA_INGESTAO = 'medicoes_energia_bruto'
+COLUNAS_INGESTAO = ['id_cliente', 'data_medicao', 'consumo_kwh', 'tipo_medicao']
+TAMANHO_LOTE_INGESTAO = int(os.environ.get('FLASKLIGHT_INGESTAO_LOTE', 5_000))  # Gatilho de tamanho (linhas)
+INTERVALO_FLUSH_INGESTAO_SEGUNDOS = float(os.environ.get('FLASKLIGHT_INGESTAO_INTERVALO', 0.5))  # Gatilho de tempo
+MAX_LINHAS_PENDENTES_INGESTAO = 100_000  # Linhas na fila + em gravação antes de aplicar backpressure
+MAX_LINHAS_POR_REQUISICAO_INGESTAO = 20_000
+ESPERA_BACKPRESSURE_SEGUNDOS = 2.0  # Quanto uma requisição espera por espaço no buffer antes do 429
+TIMEOUT_ACK_INGESTAO_SEGUNDOS = 30.0  # Depois disso o POST responde 202 e o ack fica no GET de status
+MAX_RECEBIMENTOS_HISTORICO = 10_000  # Acks mantidos em memória para o GET de status
+MAX_ERROS_VALIDACAO = 20  # Erros de validação devolvidos por requisição
+CONSUMO_MAXIMO_KWH = 99_999_999.99  # Maior valor do NUMERIC(10, 2)
+ID_MAXIMO_INTEGER = 2**31 - 1
+
+_FILA_INGESTAO = deque()  # Submissões aguardando o flush: {'recebimento_id', 'df', 'recebido_em', 'futuro'}
+_ESTADO_INGESTAO = {'linhas_na_fila': 0, 'linhas_pendentes': 0, 'pid_flusher': None}
+_COND_INGESTAO = threading.Condition()
+RECEBIMENTOS_INGESTAO = OrderedDict()  # recebimento_id -> Future com o ack do lote que gravou a submissão
+
+METRICA_INGESTAO_LINHAS = 'flasklight_ingestao_linhas_total'
+METRICA_INGESTAO_LOTE = 'flasklight_ingestao_lote_linhas'
+METRICA_INGESTAO_FLUSH = 'flasklight_ingestao_flush_seconds'
+METRICA_INGESTAO_PENDENTES = 'flasklight_ingestao_linhas_pendentes'
+metricas.registrar(METRICA_INGESTAO_LINHAS, metricas.CONTADOR,
+                   "Linhas recebidas pela ingestão de medições, por resultado.")
+metricas.registrar(METRICA_INGESTAO_LOTE, metricas.HISTOGRAMA, "Linhas por micro-lote gravado com COPY.",
+                   buckets=(1, 10, 100, 500, 1_000, 2_500, 5_000, 10_000, 20_000))
+metricas.registrar(METRICA_INGESTAO_FLUSH, metricas.HISTOGRAMA, "Duração da gravação de cada micro-lote (ids + COPY + commit).")
+metricas.registrar(METRICA_INGESTAO_PENDENTES, metricas.GAUGE,
+                   "Linhas no buffer de ingestão (na fila ou em gravação), no momento da coleta.")
+
+
+def ler_corpo_medicoes(corpo, mimetype):
+    """
+    Converte o corpo da requisição num DataFrame de texto: CSV com cabeçalho (text/csv) ou
+    NDJSON, um objeto JSON por linha (application/x-ndjson, o padrão). Os tipos ficam para a validação.
+    """
+    import pandas as pd
+    if mimetype in ('text/csv', 'application/csv'):
+        try:
+            return pd.read_csv(io.BytesIO(corpo), dtype=str, keep_default_na=False)
+        except (ValueError, pd.errors.ParserError) as e:
+            raise ValueError(f"CSV inválido: {e}")
+
+    registros = []
+    for numero, linha in enumerate(corpo.splitlines(), start=1):
+        if not linha.strip():
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError as e:
+            raise ValueError(f"Linha {numero} não é um JSON válido: {e}")
+        if not isinstance(registro, dict):
+            raise ValueError(f"Linha {numero} não é um objeto JSON.")
+        registros.append(registro)
+    return pd.DataFrame.from_records(registros)
+
+
+def validar_medicoes(df):
+    """
+    Valida as medições de forma vetorizada: id_cliente inteiro positivo, data ISO, consumo numérico
+    dentro do NUMERIC(10, 2) e tipo_medicao entre os valores do tipo_medicao_enum.
+    Retorna (DataFrame tipado nas COLUNAS_INGESTAO, lista de erros, total de linhas inválidas).
+    """
+    import numpy as np
+    import pandas as pd
+    faltando = [coluna for coluna in COLUNAS_INGESTAO if coluna not in df.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}.")
+
+    id_cliente = pd.to_numeric(df['id_cliente'], errors='coerce')
+    data_medicao = pd.to_datetime(df['data_medicao'], errors='coerce', format='ISO8601')
+    consumo = pd.to_numeric(df['consumo_kwh'], errors='coerce')
+    tipo = df['tipo_medicao'].astype('string')
+
+    invalidas_por_coluna = {
+        'id_cliente': (id_cliente.isna() | (id_cliente <= 0) | (id_cliente > ID_MAXIMO_INTEGER)
+                       | (id_cliente % 1 != 0)).fillna(True),
+        'data_medicao': data_medicao.isna(),
+        'consumo_kwh': (consumo.isna() | (consumo < 0) | (consumo > CONSUMO_MAXIMO_KWH)).fillna(True),
+        'tipo_medicao': ~tipo.isin(esquemas.ENUMS_POSTGRES['tipo_medicao_enum']).fillna(False),
+    }
 
+    erros = []
+    invalidas = pd.Series(False, index=df.index)
+    for coluna, mascara in invalidas_por_coluna.items():
+        invalidas |= mascara
+        for posicao in np.flatnonzero(mascara.to_numpy())[:MAX_ERROS_VALIDACAO - len(erros)]:
+            erros.append({"linha": int(posicao) + 1, "coluna": coluna, "valor": str(df[coluna].iloc[posicao])})
+    if erros:
+        return None, sorted(erros, key=lambda erro: erro['linha']), int(invalidas.sum())
+
+    # consumo fica em float64 arredondado: o texto enviado ao COPY é o valor exato do NUMERIC(10, 2)
+    df_valido = pd.DataFrame({
+        'id_cliente': id_cliente.astype('int32'),
+        'data_medicao': data_medicao.dt.normalize(),
+        'consumo_kwh': consumo.astype('float64').round(2),
+        'tipo_medicao': tipo.astype('category'),
+    })
+    return df_valido, [], 0
+
+
+def _garantir_flusher_ingestao(aplicacao):
+    """Inicia a thread de flush uma vez por processo (inclusive no filho após um fork). Chamar com o lock."""
+    if _ESTADO_INGESTAO['pid_flusher'] == os.getpid():
+        return
+    # Submissões herdadas do pai pertencem às requisições dele
+    _FILA_INGESTAO.clear()
+    _ESTADO_INGESTAO.update(linhas_na_fila=0, linhas_pendentes=0, pid_flusher=os.getpid())
+    threading.Thread(target=_laco_flusher_ingestao, args=(aplicacao,), name='ingestao-flush', daemon=True).start()
+
+
+def enfileirar_medicoes(df):
+    """
+    Coloca as medições validadas no buffer e devolve a submissão (com o Future do ack), ou None se
+    o buffer continuar cheio após ESPERA_BACKPRESSURE_SEGUNDOS. Uma submissão nunca é dividida entre lotes.
+    """
+    limite = time.monotonic() + ESPERA_BACKPRESSURE_SEGUNDOS
+    with _COND_INGESTAO:
+        _garantir_flusher_ingestao(current_app._get_current_object())
+        while _ESTADO_INGESTAO['linhas_pendentes'] + len(df) > MAX_LINHAS_PENDENTES_INGESTAO:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return None
+            _COND_INGESTAO.wait(restante)
+
+        submissao = {
+            'recebimento_id': uuid.uuid4().hex,
+            'df': df,
+            'recebido_em': time.monotonic(),
+            'futuro': Future(),
+        }
+        _FILA_INGESTAO.append(submissao)
+        _ESTADO_INGESTAO['linhas_na_fila'] += len(df)
+        _ESTADO_INGESTAO['linhas_pendentes'] += len(df)
+        RECEBIMENTOS_INGESTAO[submissao['recebimento_id']] = submissao['futuro']
+        while len(RECEBIMENTOS_INGESTAO) > MAX_RECEBIMENTOS_HISTORICO:
+            RECEBIMENTOS_INGESTAO.popitem(last=False)
+        _COND_INGESTAO.notify_all()
+    return submissao
+
+
+def _proximo_lote_ingestao():
+    """Espera um dos gatilhos (tamanho ou tempo) e retira da fila as submissões do próximo micro-lote."""
+    with _COND_INGESTAO:
+        while True:
+            if not _FILA_INGESTAO:
+                _COND_INGESTAO.wait()
+                continue
+            espera = _FILA_INGESTAO[0]['recebido_em'] + INTERVALO_FLUSH_INGESTAO_SEGUNDOS - time.monotonic()
+            if _ESTADO_INGESTAO['linhas_na_fila'] >= TAMANHO_LOTE_INGESTAO or espera <= 0:
+                break
+            _COND_INGESTAO.wait(espera)
+
+        lote, linhas = [], 0
+        while _FILA_INGESTAO and (not lote or linhas + len(_FILA_INGESTAO[0]['df']) <= TAMANHO_LOTE_INGESTAO):
+            submissao = _FILA_INGESTAO.popleft()
+            lote.append(submissao)
+            linhas += len(submissao['df'])
+        _ESTADO_INGESTAO['linhas_na_fila'] -= linhas
+    return lote
+
+
+def gravar_lote_ingestao(lote, aplicacao):
+    """
+    Grava um micro-lote numa transação: ids do alocador de blocos, um COPY e um commit. Depois do
+    commit, o Future de cada submissão recebe o ack do lote; numa falha (inclusive ao montar o
+    lote), todas recebem o erro e as linhas saem da contagem de pendentes.
+    """
+    import pandas as pd
+    linhas_lote = sum(len(submissao['df']) for submissao in lote)
+    lote_id = uuid.uuid4().hex
+    inicio = time.perf_counter()
     try:
-        # Inicia a transação única para SELECT MAX e INSERT
-        with db.session.begin():
+        df = pd.concat([submissao['df'] for submissao in lote], ignore_index=True)
+        with aplicacao.app_context():
+            df.insert(0, esquemas.ESQUEMAS[TABELA_INGESTAO]['id'], reservar_ids(TABELA_INGESTAO, linhas_lote))
+            raw_conn = db.engine.raw_connection()
+            try:
+                cursor = raw_conn.cursor()
+                copia_postgres.copiar_dataframe(cursor, df, f"public.{TABELA_INGESTAO}")
+                raw_conn.commit()
+            except Exception:
+                raw_conn.rollback()
+                raise
+            finally:
+                raw_conn.close()
+    except Exception as e:
+        logging.error(f"ERRO ao gravar o micro-lote de ingestão {lote_id} ({linhas_lote} linhas): {e}")
+        metricas.incrementar(METRICA_INGESTAO_LINHAS, linhas_lote, resultado='erro_gravacao')
+        for submissao in lote:
+            submissao['futuro'].set_exception(e)
+        return
+    finally:
+        segundos = time.perf_counter() - inicio
+        with _COND_INGESTAO:
+            _ESTADO_INGESTAO['linhas_pendentes'] -= linhas_lote
+            _COND_INGESTAO.notify_all()
+
+    metricas.observar(METRICA_INGESTAO_FLUSH, segundos)
+    metricas.observar(METRICA_INGESTAO_LOTE, linhas_lote)
+    metricas.incrementar(METRICA_INGESTAO_LINHAS, linhas_lote, resultado='gravada')
+    logging.info(f"Micro-lote de ingestão {lote_id} gravado: {linhas_lote} linhas de {len(lote)} submissões "
+                 f"em {segundos:.3f}s.")
+
+    gravado_em = datetime.now().isoformat(timespec='milliseconds')
+    ids = df['id_medicao'].to_numpy()
+    posicao = 0
+    for submissao in lote:
+        n = len(submissao['df'])
+        submissao['futuro'].set_result({
+            "recebimento_id": submissao['recebimento_id'],
+            "status": "gravado",
+            "registros": n,
+            "primeiro_id_medicao": int(ids[posicao]),
+            "ultimo_id_medicao": int(ids[posicao + n - 1]),
+            "lote": {"lote_id": lote_id, "registros": linhas_lote, "submissoes": len(lote),
+                     "gravado_em": gravado_em, "segundos_gravacao": round(segundos, 3)},
+            "segundos_na_fila": round(time.monotonic() - submissao['recebido_em'], 3),
+        })
+        posicao += n
 
-            # 1. Buscar o último id_perda
-            sql_max_id = text("SELECT MAX(id_perda) FROM public.perdas_energia_bruto")
-            resultado = db.session.execute(sql_max_id).scalar()
-
-            # Define o próximo ID, tratando caso a tabela esteja vazia
-            proximo_id_perda = (resultado or 0) + 1
-
-            logging.info(f"Iniciando geração de Perdas. Próximo id_perda: {proximo_id_perda}")
-
-            # 2. Gerar os dados mock em memória
-            # Loop pelos 3 estados
-            for estado in ESTADOS_ALVO:
-                # Loop pelos 7 meses (1 ao 7)
-                for mes in range(MES_INICIAL, MES_FINAL + 1):
-                    # Gera uma data com dia aleatório dentro do mês/ano corretos
-                    primeiro_dia_mes = date(ANO_GERACAO, mes, 1)
-                    # Pega o número do último dia do mês (ex: 31, 28, 31, 30...)
-                    ultimo_dia_num = calendar.monthrange(ANO_GERACAO, mes)[1]
-                    ultimo_dia_mes = date(ANO_GERACAO, mes, ultimo_dia_num)
-
-                    # Usa o Faker para pegar uma data aleatória nesse intervalo
-                    data_perda_obj = fake.date_between_dates(date_start=primeiro_dia_mes, date_end=ultimo_dia_mes)
-                    data_perda_str = data_perda_obj.strftime('%Y-%m-%d')
-
-                    # Gera perdas com 'random.randint' (pois 'random' já está importado no seu código)
-                    perda_tec = random.randint(500, 1100)
-                    perda_nao_tec = random.randint(400, 900)
-
-                    dados_para_inserir.append({
-                        "id_perda": proximo_id_perda,
-                        "data_perda": data_perda_str,
-                        "estado": estado,
-                        "perda_tecnica_kwh": perda_tec,
-                        "perda_nao_tecnica_kwh": perda_nao_tec
-                    })
-
-                    # OBRIGATÓRIO: Incrementa o ID para o *próximo registro*
-                    proximo_id_perda += 1
-
-            # 3. Inserir todos os dados em lote
-            # Total deve ser 21 (3 estados * 7 meses)
-            total_a_inserir = len(dados_para_inserir)
-            if total_a_inserir == 0:
-                logging.warning("Nenhum dado de Perda (Jan-Jul) foi gerado.")
-                return jsonify({"status": "aviso", "mensagem": "Nenhum dado foi gerado."}), 200
-
-            logging.info(f"Pronto para inserir {total_a_inserir} registros (Perdas Jan-Jul) em lote...")
-
-            # SQL baseado no seu exemplo de INSERT
-            sql_insert = text("""
-                              INSERT INTO public.perdas_energia_bruto
-                              (id_perda, data_perda, estado, perda_tecnica_kwh, perda_nao_tecnica_kwh)
-                              VALUES (:id_perda, :data_perda, :estado, :perda_tecnica_kwh, :perda_nao_tecnica_kwh)
-                              """)
-
-            # Executa a inserção DENTRO do mesmo 'with'
-            db.session.execute(sql_insert, dados_para_inserir)
 
-        # FIM DO 'with db.session.begin()' - Commit automático
+def _laco_flusher_ingestao(aplicacao):
+    """Thread de flush: um micro-lote por vez, então as gravações da ingestão nunca concorrem entre si."""
+    while True:
+        lote = _proximo_lote_ingestao()
+        try:
+            gravar_lote_ingestao(lote, aplicacao)
+        except Exception as e:
+            logging.error(f"ERRO inesperado na thread de flush da ingestão: {e}")
+            for submissao in lote:
+                if not submissao['futuro'].done():
+                    submissao['futuro'].set_exception(e)
 
-        logging.info(f"Sucesso! {total_a_inserir} registros (Perdas Jan-Jul) inseridos.")
 
-        return jsonify({
-            "status": "sucesso",
-            "registros_inseridos": total_a_inserir,
-            "ultimo_id_perda_inserido": proximo_id_perda - 1
-        }), 201
+@bp.route('/ingestao/medicoes', methods=['POST'])
+def ingerir_medicoes():
+    """
+    Ingestão de medições em micro-lotes. O corpo é NDJSON (application/x-ndjson, um objeto por
+    linha) ou CSV com cabeçalho (text/csv), com id_cliente, data_medicao, consumo_kwh e tipo_medicao.
+    Uma linha inválida rejeita a requisição inteira (400, com as primeiras linhas e colunas com erro).
+    Por padrão responde 201 com o ack do micro-lote que gravou as linhas; com ?aguardar=0 responde
+    202 na hora e o ack fica em GET /ingestao/medicoes/<recebimento_id>. Buffer cheio: 429 + Retry-After.
+    """
+    corpo = request.get_data(cache=False)
+    if not corpo.strip():
+        return jsonify({"status": "erro", "mensagem": "Corpo vazio."}), 400
 
+    try:
+        df = ler_corpo_medicoes(corpo, request.mimetype)
+        if len(df) > MAX_LINHAS_POR_REQUISICAO_INGESTAO:
+            return jsonify({"status": "erro", "mensagem": f"Máximo de {MAX_LINHAS_POR_REQUISICAO_INGESTAO} "
+                                                          f"medições por requisição."}), 413
+        df_valido, erros, n_invalidas = validar_medicoes(df)
+    except ValueError as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+    if erros:
+        metricas.incrementar(METRICA_INGESTAO_LINHAS, len(df), resultado='rejeitada_validacao')
+        return jsonify({"status": "erro", "mensagem": f"{n_invalidas} de {len(df)} linhas inválidas.",
+                        "erros": erros}), 400
+    if df_valido.empty:
+        return jsonify({"status": "erro", "mensagem": "Nenhuma medição no corpo."}), 400
+
+    submissao = enfileirar_medicoes(df_valido)
+    if submissao is None:
+        metricas.incrementar(METRICA_INGESTAO_LINHAS, len(df_valido), resultado='rejeitada_backpressure')
+        resposta = jsonify({"status": "erro", "mensagem": "Buffer de ingestão cheio. Tente novamente."})
+        resposta.headers['Retry-After'] = str(max(1, round(INTERVALO_FLUSH_INGESTAO_SEGUNDOS * 2)))
+        return resposta, 429
+
+    pendente = {
+        "recebimento_id": submissao['recebimento_id'],
+        "status": "pendente",
+        "registros": len(df_valido),
+        "url_status": f"/ingestao/medicoes/{submissao['recebimento_id']}",
+    }
+    if request.args.get('aguardar', '1') == '0':
+        return jsonify(pendente), 202
+    try:
+        return jsonify(submissao['futuro'].result(timeout=TIMEOUT_ACK_INGESTAO_SEGUNDOS)), 201
+    except FuturesTimeoutError:
+        return jsonify(pendente), 202
     except Exception as e:
-        # Rollback automático em caso de exceção
-        logging.error(f"Erro na operação de inserção em lote (Perdas Jan-Jul): {e}")
-        return jsonify({"status": "erro", "mensagem": str(e)}), 500
-
-if __name__ == '__main__':
+        return jsonify({"recebimento_id": submissao['recebimento_id'], "status": "erro",
+                        "mensagem": f"Falha ao gravar o micro-lote: {e}"}), 500
+
+
+@bp.route('/ingestao/medicoes/<recebimento_id>', methods=['GET'])
+def status_ingestao_medicoes(recebimento_id):
+    """Ack de uma submissão da ingestão: pendente, gravado (com o micro-lote) ou erro."""
+    futuro = RECEBIMENTOS_INGESTAO.get(recebimento_id)
+    if futuro is None:
+        return jsonify({"status": "erro", "mensagem": "Recebimento não encontrado neste processo."}), 404
+    if not futuro.done():
+        return jsonify({"recebimento_id": recebimento_id, "status": "pendente"})
+    if futuro.exception() is not None:
+        return jsonify({"recebimento_id": recebimento_id, "status": "erro", "mensagem": str(futuro.exception())})
+    return jsonify(futuro.result())
+
+
+@bp.route('/dimensoes/metricas', methods=['GET'])
+def metricas_dimensoes():
+    """Métricas do cache de dimensões (hits, recargas, falhas) e o estado do snapshot atual."""
+    dimensoes = DADOS_BASE
+    bytes_localizacoes = sum(
+        codigos.nbytes + valores.nbytes + sum(sys.getsizeof(v) for v in valores)
+        for codigos, valores in dimensoes.get('localizacoes', {}).values()
+    )
+    with _LOCK_DIMENSOES:
+        metricas = dict(METRICAS_DIMENSOES)
+        recarga_em_andamento = _ESTADO_RECARGA['em_andamento']
+    leituras = metricas['hits'] + metricas['stale'] + metricas['misses']
+    return jsonify({
+        **metricas,
+        'taxa_hit': round(metricas['hits'] / leituras, 4) if leituras else None,
+        'recarga_em_andamento': recarga_em_andamento,
+        'ttl_segundos': TTL_DIMENSOES_SEGUNDOS,
+        'versao': dimensoes.get('versao'),
+        'carregado_em': dimensoes.get('carregado_em'),
+        'segundos_para_expirar': round(dimensoes['expira_em'] - time.monotonic(), 1) if dimensoes else None,
+        'n_localizacoes': dimensoes.get('n_localizacoes', 0),
+        'bytes_localizacoes': bytes_localizacoes,
+    })
+
+
+@bp.route('/dimensoes/invalidar', methods=['POST'])
+def invalidar_dimensoes_endpoint():
+    """Expira o cache de dimensões e recarrega em segundo plano (chamar após um dbt run)."""
+    disparada = invalidar_dimensoes()
+    return jsonify({
+        "status": "sucesso",
+        "mensagem": "Recarga das dimensões iniciada." if disparada else "Uma recarga das dimensões já está em andamento.",
+    }), 202
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas no formato texto do Prometheus (séries deste processo)."""
+    for bind, engine_app in db.engines.items():
+        pool = engine_app.pool
+        if isinstance(pool, QueuePool):
+            nome_bind = bind or 'principal'
+            metricas.definir(METRICA_POOL_CONEXOES, pool.checkedout(), bind=nome_bind, estado='em_uso')
+            metricas.definir(METRICA_POOL_CONEXOES, pool.checkedin(), bind=nome_bind, estado='livre')
+            metricas.definir(METRICA_POOL_CONEXOES, max(pool.overflow(), 0), bind=nome_bind, estado='overflow')
+
+    with _LOCK_DIMENSOES:
+        eventos_dimensoes = dict(METRICAS_DIMENSOES)
+    with _LOCK_CACHE_MARTS:
+        eventos_marts = dict(METRICAS_CACHE_MARTS)
+    for cache, eventos in (('dimensoes', eventos_dimensoes), ('marts', eventos_marts)):
+        for evento, valor in eventos.items():
+            if isinstance(valor, int):
+                metricas.definir(METRICA_CACHES, valor, cache=cache, evento=evento)
+
+    with _LOCK_JOBS:
+        contagem_jobs = {}
+        for job in JOBS.values():
+            contagem_jobs[(job['tipo'], job['status'])] = contagem_jobs.get((job['tipo'], job['status']), 0) + 1
+    for (tipo, status), quantidade in contagem_jobs.items():
+        metricas.definir(METRICA_JOBS, quantidade, tipo=tipo, status=status)
+
+    with _COND_INGESTAO:
+        metricas.definir(METRICA_INGESTAO_PENDENTES, _ESTADO_INGESTAO['linhas_pendentes'])
+
+    return Response(metricas.texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@bp.route('/prontidao', methods=['GET'])
+def prontidao():
+    """
+    Readiness: 200 quando as dimensões já foram carregadas do banco; 503 enquanto o aquecimento
+    roda ou se ele falhou (nesse caso, passada a espera após a falha, dispara uma nova tentativa).
+    """
+    estado = estado_aquecimento()
+    dimensoes = DADOS_BASE
+    if estado == 'falhou' and time.monotonic() >= dimensoes.get('expira_em', 0):
+        disparar_recarga_dimensoes()
+
+    return jsonify({
+        "pronto": estado == 'pronto',
+        "estado": estado,
+        "aquecimento_iniciado_em": _ESTADO_AQUECIMENTO['iniciado_em'],
+        "pronto_apos_segundos": _ESTADO_AQUECIMENTO['pronto_apos_segundos'],
+        "segundos_desde_o_inicio": round(time.monotonic() - _INICIO_PROCESSO, 3),
+        "dimensoes_versao": dimensoes.get('versao'),
+        "dimensoes_carregadas_em": dimensoes.get('carregado_em'),
+    }), 200 if estado == 'pronto' else 503
+
+
+@bp.before_app_request
+def garantir_aquecimento():
+    # Processo que não aqueceu no criar_app (ex.: filho de um fork com a aplicação pré-carregada):
+    # dispara o aquecimento sem bloquear a requisição. Quem precisa das dimensões usa obter_dimensoes().
+    if not DADOS_BASE:
+        disparar_recarga_dimensoes()
+
+
+def criar_app(aquecer_dimensoes=True):
+    """
+    Fábrica da aplicação: configuração, SQLAlchemy, instrumentação dos engines e rotas. Não
+    acessa o banco; com aquecer_dimensoes, as dimensões são carregadas numa thread de fundo
+    (acompanhe em GET /prontidao). Com gunicorn: gunicorn 'app:criar_app()'.
+    """
+    app = Flask(__name__)
+
+    # URL e ajuste do pool vêm de comum/conexao.py (LIGHT_DB_URL, LIGHT_DB_POOL_SIZE, ...). Com
+    # LIGHT_DB_URL_LEITURA definida, as APIs de leitura analítica usam o bind 'leitura' (ver engine_leitura).
+    app.config['SQLALCHEMY_DATABASE_URI'] = conexao.url_banco()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Ajuste padrão do projeto (pre-ping, pool, statement_timeout global) + medição da espera por conexão.
+    # SQLALCHEMY_ENGINE_OPTIONS só vale para o engine principal: o bind recebe as opções explicitamente.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = conexao.opcoes_engine(application_name='flasklight',
+                                                                    poolclass=PoolComMetricas)
+    if conexao.tem_endpoint_leitura():
+        app.config['SQLALCHEMY_BINDS'] = {
+            'leitura': {'url': conexao.url_banco(leitura=True), **app.config['SQLALCHEMY_ENGINE_OPTIONS']},
+        }
+
+    db.init_app(app)
     with app.app_context():
-        logging.info("Executando setup inicial da aplicação...")
-        setup_dimensoes_em_memoria()
-    app.run(debug=True, use_reloader=False)
+        for engine_app in db.engines.values():
+            instrumentar_engine(engine_app)
+
+    app.register_blueprint(bp)
+    if aquecer_dimensoes:
+        iniciar_aquecimento(app)
+    return app
 
-@app.before_request
-def garantir_dados_carregados():
-    if not DADOS_BASE.get('localizacoes'):
-        logging.info("DADOS_BASE vazio — executando setup_dimensoes_em_memoria() novamente...")
-        setup_dimensoes_em_memoria()
\ No newline at end of file
+
+if __name__ == '__main__':
+    criar_app().run(debug=True, use_reloader=False)
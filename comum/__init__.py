@@ -0,0 +1 @@
+"""Código compartilhado entre dbtProject, FlaskLight e JupyterLight."""
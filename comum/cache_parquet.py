@@ -0,0 +1,191 @@
+"""
+Cache de staging em Parquet tipado para os quatro CSVs de origem.
+
+Cada CSV é convertido uma única vez para um Parquet comprimido (zstd), com os tipos do
+registro comum/esquemas.py: datas em date32, ids em int32 e as colunas de tipo/estado
+como categóricas (dictionary). O arquivo de cache é identificado pelo hash SHA-256 do CSV
+(e por uma assinatura do esquema), então qualquer alteração na origem gera um novo cache.
+As leituras seguintes pulam o parse do texto e leem só as colunas pedidas.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from . import esquemas
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+CACHE_DIR_NOME = '.cache_parquet'
+SUFIXO_INDICE_HASH = '.hash.json'  # Um índice por CSV: processos paralelos não disputam o mesmo arquivo
+COMPRESSAO = 'zstd'
+HASH_BLOCK_SIZE = 1024 * 1024
+TAMANHO_ROW_GROUP = 128 * 1024
+
+if pa is not None:
+    # Tipos do Arrow equivalentes aos dtypes declarados em comum/esquemas.py
+    _TIPOS_ARROW = {
+        'int8': pa.int8(),
+        'int16': pa.int16(),
+        'int32': pa.int32(),
+        'float32': pa.float32(),
+        'float64': pa.float64(),
+        'string': pa.string(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+        esquemas.DATA: pa.date32(),
+    }
+
+    # Esquemas tipados dos CSVs de origem (chave: nome do arquivo)
+    SCHEMAS_PARQUET = {
+        esquema['arquivo']: pa.schema([(nome, _TIPOS_ARROW[dtype]) for nome, dtype, _ in esquema['colunas']])
+        for esquema in esquemas.ESQUEMAS.values()
+    }
+else:
+    SCHEMAS_PARQUET = {}
+
+
+def schema_arrow(tabela):
+    """Esquema Arrow de uma tabela bruta ou de um mart declarado em comum/esquemas.py."""
+    _exigir_pyarrow()
+    return pa.schema([(nome, _TIPOS_ARROW[dtype]) for nome, dtype in esquemas.colunas_pandas(tabela)])
+
+
+def pyarrow_disponivel():
+    """Indica se o pyarrow está instalado (sem ele o cache não é usado)."""
+    return pa is not None
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError("O cache Parquet requer o pyarrow. Execute: pip install pyarrow")
+
+
+def diretorio_cache(caminho_csv):
+    """Diretório do cache: '.cache_parquet' ao lado do CSV de origem."""
+    return os.path.join(os.path.dirname(os.path.abspath(caminho_csv)), CACHE_DIR_NOME)
+
+
+def _gravar_atomicamente(destino, escrever):
+    """
+    Grava `destino` via um arquivo temporário único no mesmo diretório + os.replace: processos
+    paralelos gravando o mesmo arquivo nunca disputam o temporário, e quem lê vê a versão inteira.
+    """
+    descritor, caminho_tmp = tempfile.mkstemp(prefix=os.path.basename(destino) + '.', suffix='.tmp',
+                                              dir=os.path.dirname(destino))
+    os.close(descritor)
+    try:
+        escrever(caminho_tmp)
+        os.replace(caminho_tmp, destino)
+    except BaseException:
+        if os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+        raise
+
+
+def hash_arquivo(caminho_csv):
+    """
+    SHA-256 do CSV. O resultado é guardado num índice por (tamanho, mtime), um arquivo por CSV,
+    para que execuções repetidas não precisem reler o arquivo só para calcular o hash.
+    """
+    stat = os.stat(caminho_csv)
+    cache_dir = diretorio_cache(caminho_csv)
+    caminho_indice = os.path.join(cache_dir, os.path.basename(caminho_csv) + SUFIXO_INDICE_HASH)
+
+    try:
+        with open(caminho_indice, encoding='utf-8') as f:
+            entrada = json.load(f)
+    except (FileNotFoundError, ValueError):
+        entrada = None
+    if entrada and entrada['tamanho'] == stat.st_size and entrada['mtime_ns'] == stat.st_mtime_ns:
+        return entrada['sha256']
+
+    sha256 = hashlib.sha256()
+    with open(caminho_csv, 'rb') as f:
+        while bloco := f.read(HASH_BLOCK_SIZE):
+            sha256.update(bloco)
+
+    entrada = {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256.hexdigest()}
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def escrever(caminho_tmp):
+        with open(caminho_tmp, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f, indent=2)
+
+    _gravar_atomicamente(caminho_indice, escrever)
+    return entrada['sha256']
+
+
+def caminho_parquet(caminho_csv):
+    """
+    Caminho do Parquet correspondente à versão atual do CSV: <nome>-<hash do CSV>-<assinatura do esquema>.parquet.
+    A assinatura faz uma mudança de tipos em comum/esquemas.py invalidar o cache existente.
+    """
+    nome_base = os.path.splitext(os.path.basename(caminho_csv))[0]
+    sha256 = hash_arquivo(caminho_csv)
+    schema = SCHEMAS_PARQUET.get(os.path.basename(caminho_csv))
+    assinatura = hashlib.sha256(str(schema).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(diretorio_cache(caminho_csv), f"{nome_base}-{sha256[:16]}-{assinatura}.parquet")
+
+
+def converter_csv_para_parquet(caminho_csv):
+    """
+    Converte o CSV para o Parquet tipado, se ainda não houver cache para este hash.
+    Versões antigas do cache do mesmo arquivo são removidas. Retorna o caminho do Parquet.
+    """
+    _exigir_pyarrow()
+    destino = caminho_parquet(caminho_csv)
+    if os.path.exists(destino):
+        return destino
+
+    nome = os.path.basename(caminho_csv)
+    schema = SCHEMAS_PARQUET.get(nome)
+    convert_options = pa_csv.ConvertOptions(
+        column_types=dict(zip(schema.names, schema.types)) if schema is not None else None
+    )
+    tabela = pa_csv.read_csv(caminho_csv, convert_options=convert_options)
+    if schema is not None:
+        # Nomes de coluna normalizados e ordem do esquema declarado
+        tabela = tabela.rename_columns([c.lower().replace(' ', '_') for c in tabela.column_names])
+        tabela = tabela.select(schema.names).cast(schema)
+
+    _gravar_atomicamente(destino, lambda caminho_tmp: pq.write_table(
+        tabela, caminho_tmp, compression=COMPRESSAO, row_group_size=TAMANHO_ROW_GROUP))
+    logging.info(f"Cache Parquet criado para {nome}: {destino} ({tabela.num_rows} linhas).")
+
+    # Remove caches de versões anteriores do mesmo CSV
+    prefixo = os.path.splitext(nome)[0] + '-'
+    for antigo in os.listdir(os.path.dirname(destino)):
+        caminho_antigo = os.path.join(os.path.dirname(destino), antigo)
+        if antigo.startswith(prefixo) and antigo.endswith('.parquet') and caminho_antigo != destino:
+            try:
+                os.remove(caminho_antigo)
+            except FileNotFoundError:
+                pass  # Outro processo já removeu
+    return destino
+
+
+def ler_tabela(caminho_csv, colunas=None, filtros=None):
+    """Lê o cache do CSV como pyarrow.Table (criando-o se preciso), só com as colunas pedidas."""
+    return pq.read_table(converter_csv_para_parquet(caminho_csv), columns=colunas, filters=filtros)
+
+
+def ler_dataset(caminho_csv, colunas=None, filtros=None):
+    """
+    Lê o CSV a partir do cache Parquet como DataFrame: ids em int32, categóricas como
+    pandas.Categorical e datas como datetime64. 'filtros' segue o formato do pyarrow,
+    ex.: [('id_medicao', '>', 12000)], e aproveita as estatísticas dos row groups.
+    """
+    return ler_tabela(caminho_csv, colunas, filtros).to_pandas(date_as_object=False)
+
+
+def iterar_lotes(caminho_csv, linhas_por_lote, colunas=None):
+    """Itera o cache Parquet em DataFrames de até 'linhas_por_lote' linhas (leitura em streaming)."""
+    arquivo = pq.ParquetFile(converter_csv_para_parquet(caminho_csv))
+    for lote in arquivo.iter_batches(batch_size=linhas_por_lote, columns=colunas):
+        yield lote.to_pandas(date_as_object=False)
@@ -0,0 +1,44 @@
+"""
+COPY do PostgreSQL (FROM STDIN / TO STDOUT) para os dois drivers suportados: psycopg2
+(cursor.copy_expert) e psycopg 3 (cursor.copy), que é o padrão do SQLAlchemy >= 2.1.
+Usado pelo data_loader.py, pelo run/data_enrichment.py e pelo FlaskLight.
+"""
+import io
+
+COPY_BUFFER_SIZE = 1024 * 1024  # Tamanho dos blocos trocados com o COPY (1 MB)
+
+
+def copiar_para_stdin(cursor, sql_copy, arquivo):
+    """Executa o COPY ... FROM STDIN lendo de um arquivo (ou buffer) binário."""
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql_copy, arquivo, size=COPY_BUFFER_SIZE)
+        return
+
+    with cursor.copy(sql_copy) as copy:
+        while bloco := arquivo.read(COPY_BUFFER_SIZE):
+            copy.write(bloco)
+
+
+def copiar_para_stdout(cursor, sql_copy, arquivo):
+    """Executa o COPY ... TO STDOUT escrevendo num arquivo binário, bloco a bloco."""
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql_copy, arquivo, size=COPY_BUFFER_SIZE)
+        return
+
+    with cursor.copy(sql_copy) as copy:
+        for bloco in copy:
+            arquivo.write(bloco)
+
+
+def copiar_dataframe(cursor, df, tabela):
+    """
+    Envia um DataFrame para `tabela` (nome qualificado, ex.: 'public.clientes_bruto') via COPY,
+    serializado como CSV num buffer em memória. As colunas do DataFrame devem existir na tabela.
+    Retorna o número de linhas copiadas.
+    """
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, header=False, encoding='utf-8')
+    buffer.seek(0)
+    sql_copy = f"COPY {tabela} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, ENCODING 'UTF8')"
+    copiar_para_stdin(cursor, sql_copy, buffer)
+    return len(df)
@@ -0,0 +1,186 @@
+"""
+Registro único dos esquemas dos quatro datasets de origem (e dos marts lidos em Python).
+
+Para cada coluna são declarados o dtype compacto do Pandas e o tipo do PostgreSQL da tabela
+bruta. data_loader.py, cache_parquet.py, run/data_enrichment.py e o FlaskLight leem daqui,
+em vez de deixar o Pandas/to_sql inferir int64, object, TEXT e BIGINT.
+"""
+
+# Marcador de coluna de data: lida com parse_dates e mantida como datetime64 em memória
+DATA = 'date'
+
+# Valores dos ENUMs do PostgreSQL (fonte única para o DDL do data_loader)
+ENUMS_POSTGRES = {
+    'tipo_cliente_enum': ['Residencial', 'Comercial', 'Industrial'],
+    'tipo_medicao_enum': ['Normal', 'Estimada'],
+}
+
+# Tabela bruta -> arquivo CSV, coluna de id e colunas (nome, dtype Pandas, tipo PostgreSQL).
+# Colunas de domínio pequeno ficam como 'category' sem categorias fixas: um valor inesperado
+# não vira NaN silenciosamente no Pandas, e o ENUM do PostgreSQL continua validando na carga.
+ESQUEMAS = {
+    'clientes_bruto': {
+        'arquivo': 'clientes.csv',
+        'id': 'id_cliente',
+        'colunas': [
+            ('id_cliente', 'int32', 'INTEGER'),
+            ('nome_cliente', 'string', 'VARCHAR(255)'),
+            ('cidade', 'string', 'VARCHAR(255)'),
+            ('estado', 'category', 'VARCHAR(2)'),
+            ('tipo_cliente', 'category', 'tipo_cliente_enum'),
+            ('data_adesao', DATA, 'DATE'),
+        ],
+    },
+    'medicoes_energia_bruto': {
+        'arquivo': 'medicoes_energia.csv',
+        'id': 'id_medicao',
+        'colunas': [
+            ('id_medicao', 'int32', 'INTEGER'),
+            ('id_cliente', 'int32', 'INTEGER'),
+            ('data_medicao', DATA, 'DATE'),
+            ('consumo_kwh', 'float64', 'NUMERIC(10, 2)'),
+            ('tipo_medicao', 'category', 'tipo_medicao_enum'),
+        ],
+    },
+    'ocorrencias_tecnicas_bruto': {
+        'arquivo': 'ocorrencias_tecnicas.csv',
+        'id': 'id_ocorrencia',
+        'colunas': [
+            ('id_ocorrencia', 'int32', 'INTEGER'),
+            ('data_ocorrencia', DATA, 'DATE'),
+            ('cidade', 'string', 'VARCHAR(255)'),
+            ('estado', 'category', 'VARCHAR(2)'),
+            ('tipo_ocorrencia', 'category', 'VARCHAR(100)'),
+            ('tempo_reparo_h', 'float64', 'NUMERIC(5, 2)'),
+        ],
+    },
+    'perdas_energia_bruto': {
+        'arquivo': 'perdas_energia.csv',
+        'id': 'id_perda',
+        'colunas': [
+            ('id_perda', 'int32', 'INTEGER'),
+            ('data_perda', DATA, 'DATE'),
+            ('estado', 'category', 'VARCHAR(2)'),
+            ('perda_tecnica_kwh', 'float64', 'NUMERIC(10, 2)'),
+            ('perda_nao_tecnica_kwh', 'float64', 'NUMERIC(10, 2)'),
+        ],
+    },
+}
+
+# Marts lidos pelo run/data_enrichment.py: apenas os dtypes do Pandas (as tabelas são do dbt)
+ESQUEMAS_MARTS = {
+    'analise_consumo_regional': {
+        'colunas': [
+            ('ano', 'int16'),
+            ('mes', 'int8'),
+            ('estado', 'category'),
+            ('tipo_cliente', 'category'),
+            ('consumo_total_kwh', 'float64'),
+            ('consumo_medio_kwh', 'float64'),
+            ('perda_tecnica_kwh', 'float64'),
+            ('perda_nao_tecnica_kwh', 'float64'),
+        ],
+    },
+    'analise_consumo_regional_movel': {
+        'colunas': [
+            ('ano', 'int16'),
+            ('mes', 'int8'),
+            ('estado', 'category'),
+            ('tipo_cliente', 'category'),
+            ('consumo_total_kwh', 'float64'),
+            ('consumo_medio_movel_3m', 'float64'),
+            ('consumo_medio_movel_6m', 'float64'),
+            ('consumo_medio_movel_12m', 'float64'),
+            ('consumo_yoy_delta_kwh', 'float64'),
+            ('consumo_yoy_pct', 'float64'),
+        ],
+    },
+    'analise_ocorrencias_tecnicas': {
+        'colunas': [
+            ('id_ocorrencia_fato', 'int32'),
+            ('id_tempo', 'int32'),
+            ('ano', 'int16'),
+            ('mes', 'int8'),
+            ('cidade', 'string'),
+            ('estado', 'category'),
+            ('tipo_ocorrencia', 'category'),
+            ('tempo_reparo_h', 'float64'),
+        ],
+    },
+    'analise_perdas_energia': {
+        'colunas': [
+            ('ano', 'int16'),
+            ('mes', 'int8'),
+            ('estado', 'category'),
+            ('perda_tecnica_total_kwh', 'float64'),
+            ('perda_nao_tecnica_total_kwh', 'float64'),
+        ],
+    },
+}
+
+
+def tabela_do_arquivo(nome_arquivo):
+    """Nome da tabela bruta correspondente a um CSV de origem (ex.: 'clientes.csv' -> 'clientes_bruto')."""
+    for tabela, esquema in ESQUEMAS.items():
+        if esquema['arquivo'] == nome_arquivo:
+            return tabela
+    raise KeyError(f"Nenhum esquema registrado para o arquivo {nome_arquivo}.")
+
+
+def colunas_postgres(tabela):
+    """Lista (coluna, tipo PostgreSQL) da tabela bruta, na ordem do CSV."""
+    return [(nome, tipo_pg) for nome, _, tipo_pg in ESQUEMAS[tabela]['colunas']]
+
+
+def colunas_pandas(tabela):
+    """Lista (coluna, dtype Pandas) de uma tabela bruta ou de um mart, na ordem declarada."""
+    return [(nome, dtype) for nome, dtype, *_ in _colunas(tabela)]
+
+
+def dtypes_pandas(tabela):
+    """Dicionário de dtypes para pd.read_csv (as colunas de data ficam em colunas_data)."""
+    return {nome: dtype for nome, dtype, *_ in _colunas(tabela) if dtype != DATA}
+
+
+def colunas_data(tabela):
+    """Colunas de data da tabela, para o parse_dates do pd.read_csv."""
+    return [nome for nome, dtype, *_ in _colunas(tabela) if dtype == DATA]
+
+
+def ler_csv(caminho, tabela, **kwargs):
+    """pd.read_csv já com os dtypes compactos e as datas declaradas para a tabela."""
+    import pandas as pd
+    return pd.read_csv(caminho, dtype=dtypes_pandas(tabela), parse_dates=colunas_data(tabela), **kwargs)
+
+
+def aplicar_esquema(df, tabela):
+    """
+    Converte as colunas de um DataFrame (ex.: vindo de pd.read_sql) para os dtypes declarados.
+    Colunas ausentes no registro ou no DataFrame são mantidas como estão.
+    """
+    import pandas as pd
+    conversoes = {nome: dtype for nome, dtype, *_ in _colunas(tabela) if nome in df.columns and dtype != DATA}
+    df = df.astype(conversoes)
+    for nome in colunas_data(tabela):
+        if nome in df.columns:
+            df[nome] = pd.to_datetime(df[nome])
+    return df
+
+
+def ddl_enums():
+    """
+    Bloco DO $$...$$ que cria os ENUMs de ENUMS_POSTGRES apenas se ainda não existirem
+    no catálogo pg_type (CREATE TYPE não aceita IF NOT EXISTS).
+    """
+    comandos = "\n".join(
+        f"    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = '{nome}') THEN\n"
+        f"        CREATE TYPE {nome} AS ENUM ({', '.join(repr(v) for v in valores)});\n"
+        f"    END IF;"
+        for nome, valores in ENUMS_POSTGRES.items()
+    )
+    return f"DO $$\nBEGIN\n{comandos}\nEND\n$$;"
+
+
+def _colunas(tabela):
+    esquema = ESQUEMAS.get(tabela) or ESQUEMAS_MARTS[tabela]
+    return esquema['colunas']
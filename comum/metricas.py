@@ -0,0 +1,106 @@
+"""
+Registro de métricas em memória (contadores, gauges e histogramas) com exposição no formato
+texto do Prometheus (versão 0.0.4), sem depender do prometheus_client.
+
+Cada métrica é declarada uma vez com registrar() e alimentada por incrementar(), definir() e
+observar() (ou o context manager cronometrar()), com labels passados como argumentos nomeados.
+O registro é por processo: com vários workers, cada um expõe as suas próprias séries.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTADOR = 'counter'
+GAUGE = 'gauge'
+HISTOGRAMA = 'histogram'
+
+# Limites (em segundos) dos buckets de latência: de 1 ms a 1 min
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_METRICAS = {}  # nome -> {'tipo', 'ajuda', 'buckets', 'series': {labels (tupla ordenada) -> estado}}
+_LOCK = threading.Lock()
+
+
+def registrar(nome, tipo, ajuda, buckets=BUCKETS_LATENCIA):
+    """Declara uma métrica (idempotente: registrar de novo com o mesmo nome não apaga as séries)."""
+    with _LOCK:
+        if nome not in _METRICAS:
+            _METRICAS[nome] = {'tipo': tipo, 'ajuda': ajuda, 'buckets': tuple(buckets), 'series': {}}
+
+
+def incrementar(nome, valor=1, **labels):
+    """Soma `valor` a um contador."""
+    chave = tuple(sorted(labels.items()))
+    with _LOCK:
+        series = _METRICAS[nome]['series']
+        series[chave] = series.get(chave, 0) + valor
+
+
+def definir(nome, valor, **labels):
+    """Define o valor atual de um gauge (ou de um contador mantido fora deste registro)."""
+    chave = tuple(sorted(labels.items()))
+    with _LOCK:
+        _METRICAS[nome]['series'][chave] = valor
+
+
+def observar(nome, valor, **labels):
+    """Registra uma observação num histograma."""
+    chave = tuple(sorted(labels.items()))
+    with _LOCK:
+        metrica = _METRICAS[nome]
+        estado = metrica['series'].get(chave)
+        if estado is None:
+            # Contagem por bucket (não acumulada) + o bucket +Inf, soma e total de observações
+            estado = metrica['series'][chave] = {'buckets': [0] * (len(metrica['buckets']) + 1), 'soma': 0.0, 'contagem': 0}
+        estado['buckets'][bisect.bisect_left(metrica['buckets'], valor)] += 1
+        estado['soma'] += valor
+        estado['contagem'] += 1
+
+
+@contextmanager
+def cronometrar(nome, **labels):
+    """Mede o bloco e registra a duração (s) no histograma, inclusive se o bloco falhar."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nome, time.perf_counter() - inicio, **labels)
+
+
+def _escapar(valor):
+    """Escapa barra invertida, aspas e quebra de linha no valor de um label."""
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(chave, extra=()):
+    pares = list(chave) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def texto_prometheus():
+    """Todas as métricas registradas no formato texto de exposição do Prometheus."""
+    linhas = []
+    with _LOCK:
+        for nome, metrica in _METRICAS.items():
+            linhas.append(f"# HELP {nome} {metrica['ajuda']}")
+            linhas.append(f"# TYPE {nome} {metrica['tipo']}")
+            for chave, estado in metrica['series'].items():
+                if metrica['tipo'] != HISTOGRAMA:
+                    linhas.append(f"{nome}{_labels(chave)} {_numero(estado)}")
+                    continue
+                acumulado = 0
+                for limite, quantidade in zip(metrica['buckets'] + (float('inf'),), estado['buckets']):
+                    acumulado += quantidade
+                    linhas.append(f"{nome}_bucket{_labels(chave, [('le', _numero(limite))])} {acumulado}")
+                linhas.append(f"{nome}_sum{_labels(chave)} {_numero(estado['soma'])}")
+                linhas.append(f"{nome}_count{_labels(chave)} {estado['contagem']}")
+    return '\n'.join(linhas) + '\n'
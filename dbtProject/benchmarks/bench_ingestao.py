@@ -0,0 +1,308 @@
+"""
+Benchmark de ingestão do data_loader com dados sintéticos em escala.
+
+1. Gera versões escaladas (10x, 100x, 1000x...) dos quatro CSVs de origem, de forma
+   determinística (seed) e com integridade referencial: toda medição aponta para um cliente
+   gerado e ocorrências/perdas usam apenas cidades/estados presentes nos clientes.
+2. Cria um banco PostgreSQL descartável, roda cada estratégia de carga do data_loader num
+   subprocesso isolado (para medir o pico de memória de cada uma) e apaga o banco no final.
+3. Grava linhas/s, tempo total e pico de RSS em um arquivo JSON Lines, uma linha por medição.
+
+Exemplo:
+    python benchmarks/bench_ingestao.py --escalas 10 100 --estrategias copy paralelo streaming
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+DIR_BENCH = os.path.dirname(os.path.abspath(__file__))
+DIR_PROJETO = os.path.dirname(DIR_BENCH)
+sys.path.insert(0, DIR_PROJETO)
+
+import data_loader  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DIR_DADOS = os.path.join(DIR_BENCH, 'dados')
+ARQUIVO_RESULTADOS = os.path.join(DIR_BENCH, 'resultados', 'ingestao.jsonl')
+SEED_PADRAO = 42
+ESCALAS_PADRAO = [10]
+CLIENTES_POR_LOTE = 100_000  # Clientes gerados (e escritos) por vez, para a geração não estourar a memória
+
+# Tamanho da amostra original (escala 1x)
+CLIENTES_BASE = 1000
+MESES_MEDICAO = pd.date_range('2024-01-01', '2024-12-01', freq='MS')
+OCORRENCIAS_BASE = 500
+ESTADOS_PERDAS = ['SP', 'MG', 'BA']
+
+ESTRATEGIAS = {
+    'to_sql': lambda: data_loader.load_data_to_postgres(modo=data_loader.MODO_TO_SQL),
+    'copy': lambda: data_loader.load_data_to_postgres(modo=data_loader.MODO_COPY),
+    'paralelo': lambda: data_loader.load_data_to_postgres_paralelo(modo=data_loader.MODO_COPY),
+    'streaming': lambda: data_loader.load_data_to_postgres_streaming(modo=data_loader.MODO_COPY),
+    'incremental': lambda: data_loader.load_data_to_postgres_incremental(modo=data_loader.MODO_COPY),
+}
+ESTRATEGIAS_PADRAO = ['copy', 'paralelo', 'streaming', 'incremental']
+
+
+# --- 1. Geração dos dados sintéticos ---
+
+def diretorio_escala(escala, seed):
+    return os.path.join(DIR_DADOS, f"x{escala}-seed{seed}")
+
+
+def gerar_dados(escala, seed=SEED_PADRAO):
+    """
+    Gera os quatro CSVs na escala pedida a partir das distribuições da amostra original.
+    Se o diretório já existir com todos os arquivos, reaproveita (a geração é determinística).
+    Retorna o diretório e o número de linhas de cada arquivo.
+    """
+    destino = diretorio_escala(escala, seed)
+    caminho_meta = os.path.join(destino, 'meta.json')
+    if os.path.exists(caminho_meta):
+        with open(caminho_meta, encoding='utf-8') as f:
+            return destino, json.load(f)['linhas']
+
+    os.makedirs(destino, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    clientes_base = pd.read_csv(os.path.join(DIR_PROJETO, 'clientes.csv'))
+    medicoes_base = pd.read_csv(os.path.join(DIR_PROJETO, 'medicoes_energia.csv'))
+    ocorrencias_base = pd.read_csv(os.path.join(DIR_PROJETO, 'ocorrencias_tecnicas.csv'))
+
+    nomes = clientes_base['nome_cliente'].to_numpy()
+    localizacoes = clientes_base[['cidade', 'estado']].drop_duplicates().to_numpy()
+    tipos_cliente = np.array(sorted(clientes_base['tipo_cliente'].unique()))
+    tipos_ocorrencia = np.array(sorted(ocorrencias_base['tipo_ocorrencia'].unique()))
+    prob_estimada = (medicoes_base['tipo_medicao'] == 'Estimada').mean()
+    consumo_min, consumo_max = medicoes_base['consumo_kwh'].min(), medicoes_base['consumo_kwh'].max()
+    dia_adesao_min = np.datetime64('2020-01-01')
+    dias_adesao = (np.datetime64('2025-06-30') - dia_adesao_min).astype(int)
+
+    total_clientes = CLIENTES_BASE * escala
+    caminhos = {nome: os.path.join(destino, nome) for nome in data_loader.FILE_TO_TABLE_MAP}
+    linhas = dict.fromkeys(caminhos, 0)
+    for caminho in caminhos.values():
+        # Restos de uma geração interrompida (sem meta.json): os CSVs são escritos em modo append
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    # Clientes e medições, em lotes de clientes (12 medições mensais por cliente, como na amostra)
+    for inicio in range(0, total_clientes, CLIENTES_POR_LOTE):
+        ids = np.arange(inicio + 1, min(inicio + CLIENTES_POR_LOTE, total_clientes) + 1, dtype=np.int64)
+        idx_local = rng.integers(0, len(localizacoes), len(ids))
+        clientes = pd.DataFrame({
+            'id_cliente': ids,
+            'nome_cliente': rng.choice(nomes, len(ids)),
+            'cidade': localizacoes[idx_local, 0],
+            'estado': localizacoes[idx_local, 1],
+            'tipo_cliente': rng.choice(tipos_cliente, len(ids)),
+            'data_adesao': dia_adesao_min + rng.integers(0, dias_adesao, len(ids)).astype('timedelta64[D]'),
+        })
+        clientes.to_csv(caminhos['clientes.csv'], mode='a', header=inicio == 0, index=False)
+
+        n_medicoes = len(ids) * len(MESES_MEDICAO)
+        medicoes = pd.DataFrame({
+            'id_medicao': np.arange(inicio * len(MESES_MEDICAO) + 1, inicio * len(MESES_MEDICAO) + n_medicoes + 1),
+            'id_cliente': np.repeat(ids, len(MESES_MEDICAO)),
+            'data_medicao': np.tile(MESES_MEDICAO.strftime('%Y-%m-%d'), len(ids)),
+            'consumo_kwh': np.round(rng.uniform(consumo_min, consumo_max, n_medicoes), 2),
+            'tipo_medicao': np.where(rng.random(n_medicoes) < prob_estimada, 'Estimada', 'Normal'),
+        })
+        medicoes.to_csv(caminhos['medicoes_energia.csv'], mode='a', header=inicio == 0, index=False,
+                        float_format='%.2f')
+        linhas['clientes.csv'] += len(clientes)
+        linhas['medicoes_energia.csv'] += len(medicoes)
+
+    # Ocorrências: cidades/estados sorteados entre as localizações dos clientes
+    n_ocorrencias = OCORRENCIAS_BASE * escala
+    idx_local = rng.integers(0, len(localizacoes), n_ocorrencias)
+    ocorrencias = pd.DataFrame({
+        'id_ocorrencia': np.arange(1, n_ocorrencias + 1),
+        'data_ocorrencia': np.datetime64('2024-01-01') + rng.integers(0, 366, n_ocorrencias).astype('timedelta64[D]'),
+        'cidade': localizacoes[idx_local, 0],
+        'estado': localizacoes[idx_local, 1],
+        'tipo_ocorrencia': rng.choice(tipos_ocorrencia, n_ocorrencias),
+        'tempo_reparo_h': np.round(rng.uniform(0.5, 6.0, n_ocorrencias), 1),
+    })
+    ocorrencias.to_csv(caminhos['ocorrencias_tecnicas.csv'], index=False)
+    linhas['ocorrencias_tecnicas.csv'] = len(ocorrencias)
+
+    # Perdas: um registro por estado e mês, repetido 'escala' vezes com dias diferentes
+    n_perdas = len(ESTADOS_PERDAS) * len(MESES_MEDICAO) * escala
+    meses = np.tile(np.repeat(MESES_MEDICAO.values.astype('datetime64[D]'), len(ESTADOS_PERDAS)), escala)
+    perdas = pd.DataFrame({
+        'id_perda': np.arange(1, n_perdas + 1),
+        'data_perda': meses + rng.integers(0, 28, n_perdas).astype('timedelta64[D]'),
+        'estado': np.tile(ESTADOS_PERDAS, len(MESES_MEDICAO) * escala),
+        'perda_tecnica_kwh': rng.integers(500, 3000, n_perdas),
+        'perda_nao_tecnica_kwh': rng.integers(300, 2000, n_perdas),
+    })
+    perdas.to_csv(caminhos['perdas_energia.csv'], index=False)
+    linhas['perdas_energia.csv'] = len(perdas)
+
+    with open(caminho_meta, 'w', encoding='utf-8') as f:
+        json.dump({'escala': escala, 'seed': seed, 'linhas': linhas}, f, indent=2)
+    logging.info(f"Dados sintéticos x{escala} gerados em {destino}: {linhas}")
+    return destino, linhas
+
+
+# --- 2. Banco descartável ---
+
+def criar_banco_descartavel(url_base):
+    """Cria um banco temporário no mesmo servidor de url_base. Retorna a URL do novo banco."""
+    url = make_url(url_base)
+    nome_banco = f"dblight_bench_{os.getpid()}"
+    admin = create_engine(url.set(database='postgres'), isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.execute(text(f"DROP DATABASE IF EXISTS {nome_banco}"))
+        conn.execute(text(f"CREATE DATABASE {nome_banco} ENCODING 'UTF8' TEMPLATE template0"))
+    admin.dispose()
+    return url.set(database=nome_banco).render_as_string(hide_password=False)
+
+
+def apagar_banco_descartavel(url_bench):
+    url = make_url(url_bench)
+    admin = create_engine(url.set(database='postgres'), isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.execute(text(f"DROP DATABASE IF EXISTS {url.database}"))
+    admin.dispose()
+
+
+def limpar_tabelas_brutas(url_bench):
+    """Apaga as tabelas brutas entre as estratégias, para que todas partam do zero."""
+    engine = create_engine(url_bench)
+    with engine.begin() as conn:
+        for tabela in data_loader.FILE_TO_TABLE_MAP.values():
+            conn.execute(text(f"DROP TABLE IF EXISTS {data_loader.SCHEMA_RAW}.{tabela}"))
+    engine.dispose()
+
+
+def contar_linhas(url_bench):
+    engine = create_engine(url_bench)
+    with engine.connect() as conn:
+        total = sum(
+            conn.execute(text(f"SELECT COUNT(*) FROM {data_loader.SCHEMA_RAW}.{tabela}")).scalar()
+            for tabela in data_loader.FILE_TO_TABLE_MAP.values()
+        )
+    engine.dispose()
+    return total
+
+
+# --- 3. Execução das estratégias ---
+
+def executar_estrategia(nome, diretorio, url_bench, usar_cache_parquet):
+    """Roda uma estratégia neste processo (chamado pelo subprocesso) e imprime as métricas em JSON."""
+    os.chdir(diretorio)
+    data_loader.DB_URL = url_bench
+    data_loader.USAR_CACHE_PARQUET = usar_cache_parquet and data_loader.USAR_CACHE_PARQUET
+    if os.path.exists(data_loader.MANIFEST_FILE):
+        os.remove(data_loader.MANIFEST_FILE)
+
+    inicio = time.perf_counter()
+    ESTRATEGIAS[nome]()
+    duracao = time.perf_counter() - inicio
+    print(json.dumps({'segundos': duracao, 'pico_rss_mb': data_loader.pico_rss_mb()}))
+
+
+def medir_estrategia(nome, diretorio, url_bench, usar_cache_parquet):
+    """Roda a estratégia num subprocesso novo e devolve as métricas impressas por ele."""
+    comando = [sys.executable, os.path.abspath(__file__), '--executar-estrategia', nome,
+               '--diretorio', diretorio, '--db-url', url_bench]
+    if not usar_cache_parquet:
+        comando.append('--sem-cache-parquet')
+    saida = subprocess.run(comando, capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def revisao_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=DIR_BENCH, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rodar_benchmark(escalas, estrategias, seed=SEED_PADRAO, db_url=data_loader.DB_URL,
+                    saida=ARQUIVO_RESULTADOS, usar_cache_parquet=True):
+    """Gera os dados, mede cada estratégia em cada escala e acrescenta os resultados em 'saida'."""
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    url_bench = criar_banco_descartavel(db_url)
+    revisao = revisao_git()
+    resultados = []
+
+    try:
+        for escala in escalas:
+            diretorio, linhas = gerar_dados(escala, seed)
+            total_linhas = sum(linhas.values())
+            if usar_cache_parquet and data_loader.USAR_CACHE_PARQUET:
+                # Aquece o cache Parquet fora da medição: a conversão é paga uma vez por versão do CSV
+                for nome in linhas:
+                    data_loader.cache_parquet.converter_csv_para_parquet(os.path.join(diretorio, nome))
+
+            for nome in estrategias:
+                limpar_tabelas_brutas(url_bench)
+                logging.info(f"Medindo '{nome}' na escala x{escala} ({total_linhas} linhas)...")
+                metricas = medir_estrategia(nome, diretorio, url_bench, usar_cache_parquet)
+                carregadas = contar_linhas(url_bench)
+
+                resultado = {
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'revisao': revisao,
+                    'escala': escala,
+                    'seed': seed,
+                    'estrategia': nome,
+                    'cache_parquet': usar_cache_parquet,
+                    'linhas': total_linhas,
+                    'linhas_carregadas': carregadas,
+                    'segundos': round(metricas['segundos'], 4),
+                    'linhas_por_seg': round(total_linhas / metricas['segundos'], 1),
+                    'pico_rss_mb': round(metricas['pico_rss_mb'], 1) if metricas['pico_rss_mb'] else None,
+                    'ok': carregadas == total_linhas,
+                }
+                resultados.append(resultado)
+                with open(saida, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(resultado) + '\n')
+                logging.info(f"  {nome}: {resultado['segundos']:.2f}s, {resultado['linhas_por_seg']:,.0f} linhas/s, "
+                             f"pico RSS {resultado['pico_rss_mb']} MB, ok={resultado['ok']}")
+    finally:
+        apagar_banco_descartavel(url_bench)
+
+    logging.info(f"Resultados gravados em {saida}")
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão do data_loader com dados sintéticos.")
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS_PADRAO,
+                        help="Fatores de escala sobre a amostra original (ex.: 10 100 1000).")
+    parser.add_argument('--estrategias', nargs='+', choices=list(ESTRATEGIAS), default=ESTRATEGIAS_PADRAO)
+    parser.add_argument('--seed', type=int, default=SEED_PADRAO)
+    parser.add_argument('--db-url', default=data_loader.DB_URL,
+                        help="Servidor onde o banco descartável será criado (o banco da URL não é alterado).")
+    parser.add_argument('--saida', default=ARQUIVO_RESULTADOS, help="Arquivo JSON Lines de resultados.")
+    parser.add_argument('--sem-cache-parquet', action='store_true')
+    parser.add_argument('--apenas-gerar', action='store_true', help="Só gera os dados sintéticos.")
+    # Uso interno: execução de uma estratégia no subprocesso
+    parser.add_argument('--executar-estrategia', choices=list(ESTRATEGIAS), help=argparse.SUPPRESS)
+    parser.add_argument('--diretorio', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.executar_estrategia:
+        executar_estrategia(args.executar_estrategia, args.diretorio, args.db_url, not args.sem_cache_parquet)
+    elif args.apenas_gerar:
+        for escala in args.escalas:
+            gerar_dados(escala, args.seed)
+    else:
+        rodar_benchmark(args.escalas, args.estrategias, args.seed, args.db_url, args.saida,
+                        not args.sem_cache_parquet)
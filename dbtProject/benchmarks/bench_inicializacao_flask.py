@@ -0,0 +1,151 @@
+"""
+Benchmark da inicialização a frio do FlaskLight.
+
+Cada repetição roda num subprocesso novo (imports e caches zerados) e mede:
+- o import do módulo FlaskLight/app.py;
+- o criar_app() (configuração, SQLAlchemy e disparo do aquecimento, sem acessar o banco);
+- a primeira requisição (por padrão GET /prontidao, que não depende das dimensões);
+- o tempo até GET /prontidao responder 200 (dimensões carregadas em segundo plano).
+Também mede, à parte, o custo dos imports adiados (pandas, NumPy e Faker pt_BR), que antes eram
+pagos no import do módulo. Grava a mediana de cada métrica em um arquivo JSON Lines.
+
+Exemplo:
+    python benchmarks/bench_inicializacao_flask.py --repeticoes 5 --rota /api/marts
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+DIR_BENCH = os.path.dirname(os.path.abspath(__file__))
+DIR_FLASK = os.path.join(os.path.dirname(os.path.dirname(DIR_BENCH)), 'FlaskLight')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ARQUIVO_RESULTADOS = os.path.join(DIR_BENCH, 'resultados', 'inicializacao_flask.jsonl')
+REPETICOES_PADRAO = 5
+ROTA_PADRAO = '/prontidao'
+TIMEOUT_PRONTO_SEGUNDOS = 60
+MODULOS_ADIADOS = ('pandas', 'numpy', 'faker')
+
+
+def medir_inicializacao(rota, timeout_pronto):
+    """Roda neste processo (chamado pelo subprocesso) e imprime as métricas em JSON."""
+    inicio = time.perf_counter()
+    sys.path.insert(0, DIR_FLASK)
+    import app as flasklight
+    apos_import = time.perf_counter()
+    aplicacao = flasklight.criar_app()
+    apos_criar_app = time.perf_counter()
+    modulos_carregados = [nome for nome in MODULOS_ADIADOS if nome in sys.modules]
+
+    cliente = aplicacao.test_client()
+    resposta = cliente.get(rota)
+    apos_primeira = time.perf_counter()
+
+    pronto = False
+    while time.perf_counter() - inicio < timeout_pronto:
+        if cliente.get('/prontidao').status_code == 200:
+            pronto = True
+            break
+        time.sleep(0.01)
+    apos_pronto = time.perf_counter()
+
+    print(json.dumps({
+        'import_s': apos_import - inicio,
+        'criar_app_s': apos_criar_app - apos_import,
+        'primeira_requisicao_s': apos_primeira - apos_criar_app,
+        'status_primeira_requisicao': resposta.status_code,
+        'ate_primeira_resposta_s': apos_primeira - inicio,
+        'ate_pronto_s': apos_pronto - inicio if pronto else None,
+        'modulos_adiados_carregados_no_start': modulos_carregados,
+    }))
+
+
+def medir_imports_adiados():
+    """Custo dos imports que saíram do caminho de inicialização (chamado pelo subprocesso)."""
+    inicio = time.perf_counter()
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    from faker import Faker
+    Faker('pt_BR')
+    print(json.dumps({'imports_adiados_s': time.perf_counter() - inicio}))
+
+
+def rodar_no_subprocesso(argumentos):
+    """Roda este script num subprocesso novo e devolve as métricas impressas por ele."""
+    comando = [sys.executable, os.path.abspath(__file__), *argumentos]
+    saida = subprocess.run(comando, capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def revisao_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=DIR_BENCH, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rodar_benchmark(repeticoes, rota=ROTA_PADRAO, timeout_pronto=TIMEOUT_PRONTO_SEGUNDOS, saida=ARQUIVO_RESULTADOS):
+    medicoes = []
+    for repeticao in range(1, repeticoes + 1):
+        medicoes.append(rodar_no_subprocesso(['--medir-inicializacao', '--rota', rota,
+                                              '--timeout-pronto', str(timeout_pronto)]))
+        logging.info(f"  Repetição {repeticao}: import {medicoes[-1]['import_s']:.3f}s, "
+                     f"primeira resposta {medicoes[-1]['ate_primeira_resposta_s']:.3f}s")
+    adiados = [rodar_no_subprocesso(['--medir-imports-adiados'])['imports_adiados_s'] for _ in range(repeticoes)]
+
+    def mediana(chave):
+        valores = [m[chave] for m in medicoes if m[chave] is not None]
+        return round(statistics.median(valores), 4) if valores else None
+
+    resultado = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'revisao': revisao_git(),
+        'repeticoes': repeticoes,
+        'rota': rota,
+        'import_s': mediana('import_s'),
+        'criar_app_s': mediana('criar_app_s'),
+        'primeira_requisicao_s': mediana('primeira_requisicao_s'),
+        'status_primeira_requisicao': medicoes[-1]['status_primeira_requisicao'],
+        'ate_primeira_resposta_s': mediana('ate_primeira_resposta_s'),
+        'ate_pronto_s': mediana('ate_pronto_s'),
+        'imports_adiados_s': round(statistics.median(adiados), 4),
+        'modulos_adiados_carregados_no_start': medicoes[-1]['modulos_adiados_carregados_no_start'],
+    }
+
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    with open(saida, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(resultado) + '\n')
+    logging.info(f"Medianas: import {resultado['import_s']}s, criar_app {resultado['criar_app_s']}s, "
+                 f"primeira requisição {resultado['primeira_requisicao_s']}s "
+                 f"(status {resultado['status_primeira_requisicao']}), pronto em {resultado['ate_pronto_s']}s; "
+                 f"imports adiados custam {resultado['imports_adiados_s']}s.")
+    logging.info(f"Resultados gravados em {saida}")
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark da inicialização a frio do FlaskLight.")
+    parser.add_argument('--repeticoes', type=int, default=REPETICOES_PADRAO, help="Subprocessos medidos.")
+    parser.add_argument('--rota', default=ROTA_PADRAO, help="Rota da primeira requisição (GET).")
+    parser.add_argument('--timeout-pronto', type=float, default=TIMEOUT_PRONTO_SEGUNDOS,
+                        help="Máximo de segundos esperando o /prontidao responder 200.")
+    parser.add_argument('--saida', default=ARQUIVO_RESULTADOS, help="Arquivo JSON Lines de resultados.")
+    # Uso interno: medições no subprocesso
+    parser.add_argument('--medir-inicializacao', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--medir-imports-adiados', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir_inicializacao:
+        medir_inicializacao(args.rota, args.timeout_pronto)
+    elif args.medir_imports_adiados:
+        medir_imports_adiados()
+    else:
+        rodar_benchmark(args.repeticoes, args.rota, args.timeout_pronto, args.saida)
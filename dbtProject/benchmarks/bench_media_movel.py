@@ -0,0 +1,146 @@
+"""
+Microbenchmark das médias móveis de consumo do run/data_enrichment.py.
+
+Compara a implementação antiga (groupby + transform com lambda de rolling por grupo) com
+calcular_janelas_moveis (uma passada vetorizada) num DataFrame sintético grande, no formato
+do mart analise_consumo_regional. Antes de medir, confere que a versão vetorizada reproduz a
+antiga quando não há meses ausentes, e mostra em quantas linhas elas divergem quando há
+lacunas (onde a versão antiga desloca a janela).
+
+Exemplo:
+    python benchmarks/bench_media_movel.py --series 5000 --meses 120 --repeticoes 3
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DIR_BENCH = os.path.dirname(os.path.abspath(__file__))
+DIR_PROJETO = os.path.dirname(DIR_BENCH)
+sys.path.insert(0, os.path.join(DIR_PROJETO, 'run'))
+
+import data_enrichment  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ARQUIVO_RESULTADOS = os.path.join(DIR_BENCH, 'resultados', 'media_movel.jsonl')
+SEED_PADRAO = 42
+SERIES_PADRAO = 5000
+MESES_PADRAO = 120
+REPETICOES_PADRAO = 3
+FRACAO_LACUNAS_PADRAO = 0.05
+TIPOS_CLIENTE = ['Residencial', 'Comercial', 'Industrial']
+
+
+def gerar_frame(n_series, n_meses, fracao_lacunas=0.0, seed=SEED_PADRAO):
+    """
+    DataFrame (ano, mes, estado, tipo_cliente, consumo_total_kwh) com `n_series` séries de
+    `n_meses` meses a partir de jan/2015. 'estado' aqui identifica a série (um código por grupo
+    de três tipos de cliente), simulando a granularidade por cidade. `fracao_lacunas` remove
+    meses ao acaso para produzir séries com buracos.
+    """
+    rng = np.random.default_rng(seed)
+    n_grupos = -(-n_series // len(TIPOS_CLIENTE))
+    serie = np.repeat(np.arange(n_series), n_meses)
+    indice_mes = np.tile(np.arange(n_meses), n_series) + 2015 * 12
+    df = pd.DataFrame({
+        'ano': (indice_mes // 12).astype('int16'),
+        'mes': (indice_mes % 12 + 1).astype('int8'),
+        'estado': pd.Categorical.from_codes(serie // len(TIPOS_CLIENTE) % n_grupos,
+                                            [f'G{i:05d}' for i in range(n_grupos)]),
+        'tipo_cliente': pd.Categorical.from_codes(serie % len(TIPOS_CLIENTE), TIPOS_CLIENTE),
+        'consumo_total_kwh': rng.gamma(2.0, 500.0, size=len(serie)).round(2),
+    })
+    if fracao_lacunas:
+        df = df[rng.random(len(df)) >= fracao_lacunas].reset_index(drop=True)
+    return df
+
+
+def media_movel_lambda(df):
+    """Implementação anterior: rolling por posição de linha, uma lambda por grupo."""
+    df = df.sort_values(['estado', 'tipo_cliente', 'ano', 'mes']).copy()
+    df['consumo_medio_movel_3m'] = df.groupby(['estado', 'tipo_cliente'], observed=True)[
+        'consumo_total_kwh'].transform(lambda x: x.rolling(window=3, min_periods=1).mean())
+    return df
+
+
+def media_movel_vetorizada(df, janelas=(3,), yoy=False):
+    return data_enrichment.calcular_janelas_moveis(df, 'consumo_total_kwh', data_enrichment.CHAVES_SERIE_CONSUMO,
+                                                   janelas=janelas, yoy=yoy)
+
+
+def cronometrar(funcao, repeticoes):
+    """Melhor tempo (s) entre as repetições."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def divergencias_3m(df):
+    """Número de linhas em que a média de 3 meses da versão antiga difere da vetorizada."""
+    antiga = media_movel_lambda(df).sort_index()['consumo_medio_movel_3m'].to_numpy()
+    nova = media_movel_vetorizada(df)['consumo_medio_movel_3m'].to_numpy()
+    return int((~np.isclose(antiga, nova)).sum())
+
+
+def rodar_benchmark(n_series, n_meses, repeticoes, fracao_lacunas, seed=SEED_PADRAO, saida=ARQUIVO_RESULTADOS):
+    df = gerar_frame(n_series, n_meses, seed=seed)
+    df_lacunas = gerar_frame(n_series, n_meses, fracao_lacunas, seed=seed)
+    logging.info(f"Frame sintético: {len(df):,} linhas ({n_series} séries x {n_meses} meses).")
+
+    divergentes = divergencias_3m(df)
+    if divergentes:
+        raise AssertionError(f"Sem lacunas, a versão vetorizada diverge da antiga em {divergentes} linhas.")
+    divergentes_lacunas = divergencias_3m(df_lacunas)
+    logging.info(f"Sem lacunas: resultados idênticos. Com {fracao_lacunas:.0%} de meses removidos: "
+                 f"{divergentes_lacunas:,} de {len(df_lacunas):,} linhas mudam (janela por calendário).")
+
+    casos = {
+        'lambda_3m': lambda: media_movel_lambda(df),
+        'vetorizada_3m': lambda: media_movel_vetorizada(df),
+        'vetorizada_3_6_12m_yoy': lambda: media_movel_vetorizada(df, janelas=(3, 6, 12), yoy=True),
+    }
+    tempos = {nome: cronometrar(funcao, repeticoes) for nome, funcao in casos.items()}
+
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    resultados = []
+    for nome, segundos in tempos.items():
+        resultado = {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'caso': nome,
+            'series': n_series,
+            'meses': n_meses,
+            'linhas': len(df),
+            'segundos': round(segundos, 4),
+            'speedup_vs_lambda': round(tempos['lambda_3m'] / segundos, 1),
+        }
+        resultados.append(resultado)
+        with open(saida, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(resultado) + '\n')
+        logging.info(f"  {nome}: {segundos:.3f}s ({resultado['speedup_vs_lambda']}x a lambda)")
+
+    logging.info(f"Resultados gravados em {saida}")
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Microbenchmark das médias móveis de consumo.")
+    parser.add_argument('--series', type=int, default=SERIES_PADRAO, help="Número de séries (estado x tipo).")
+    parser.add_argument('--meses', type=int, default=MESES_PADRAO, help="Meses por série.")
+    parser.add_argument('--repeticoes', type=int, default=REPETICOES_PADRAO)
+    parser.add_argument('--fracao-lacunas', type=float, default=FRACAO_LACUNAS_PADRAO,
+                        help="Fração de meses removidos no frame usado para comparar o tratamento de lacunas.")
+    parser.add_argument('--seed', type=int, default=SEED_PADRAO)
+    parser.add_argument('--saida', default=ARQUIVO_RESULTADOS, help="Arquivo JSON Lines de resultados.")
+    args = parser.parse_args()
+
+    rodar_benchmark(args.series, args.meses, args.repeticoes, args.fracao_lacunas, args.seed, args.saida)
@@ -0,0 +1,65 @@
+{{ config(
+    materialized='table',
+    alias='analise_consumo_regional_movel',
+    schema='public_analytics',
+    indexes=[
+        {'columns': ['estado', 'tipo_cliente', 'ano', 'mes'], 'unique': True},
+        {'columns': ['ano', 'mes']}
+    ]
+) }}
+
+-- Este modelo acrescenta ao consumo regional as médias móveis e a variação ano contra ano
+-- As janelas são de meses de calendário (RANGE sobre o índice do mês): um mês ausente
+-- fica fora da média em vez de deslocar a janela para um mês mais antigo
+
+{% set janelas = var('janelas_media_movel', [3, 6, 12]) %}
+
+with consumo as (
+    select
+        ano,
+        mes,
+        estado,
+        tipo_cliente,
+        consumo_total_kwh,
+        ano * 12 + mes - 1 as indice_mes
+    from {{ ref('analise_consumo_regional') }}
+),
+
+janelas as (
+    select
+        ano,
+        mes,
+        estado,
+        tipo_cliente,
+        consumo_total_kwh,
+        {% for janela in janelas %}
+        avg(consumo_total_kwh) over (
+            partition by estado, tipo_cliente
+            order by indice_mes
+            range between {{ janela - 1 }} preceding and current row
+        ) as consumo_medio_movel_{{ janela }}m,
+        {% endfor %}
+        -- Mesmo mês do ano anterior (nulo se esse mês não existir na série)
+        max(consumo_total_kwh) over (
+            partition by estado, tipo_cliente
+            order by indice_mes
+            range between 12 preceding and 12 preceding
+        ) as consumo_ano_anterior_kwh
+    from consumo
+)
+
+select
+    ano,
+    mes,
+    estado,
+    tipo_cliente,
+    consumo_total_kwh,
+    {% for janela in janelas %}
+    consumo_medio_movel_{{ janela }}m,
+    {% endfor %}
+    consumo_total_kwh - consumo_ano_anterior_kwh as consumo_yoy_delta_kwh,
+    (consumo_total_kwh - consumo_ano_anterior_kwh) / nullif(consumo_ano_anterior_kwh, 0) * 100 as consumo_yoy_pct
+
+from janelas
+
+order by estado, tipo_cliente, ano, mes
@@ -0,0 +1,395 @@
+"""
+Exportação dos marts em Parquet particionado por ano/mes, para o Power BI.
+
+Cada mart vira um diretório no layout Hive (<mart>/ano=2024/mes=1/dados.parquet), com colunas
+tipadas pelo registro comum/esquemas.py, compressão zstd e estatísticas por row group. Como no
+layout Hive padrão, ano e mes ficam só no caminho (pyarrow, pandas, Spark e DuckDB os reconstroem;
+no Power BI, a partir do Folder Path ou do manifesto). Um _manifest.json por mart (o prefixo '_'
+faz os leitores de dataset ignorá-lo) lista as partições com linhas, bytes e SHA-256 e marca
+quais mudaram desde a exportação anterior, para que o refresh leia só essas.
+
+No modo incremental (exportar_mart_incremental), o manifesto guarda também uma assinatura de cada
+período (ano, mes), calculada no banco, e a marca d'água (último período exportado). Só os
+períodos novos ou reprocessados (assinatura diferente) são extraídos: viram um arquivo delta em
+<mart>/_deltas/ e substituem as respectivas partições do snapshot, que continua compactado em um
+arquivo por partição. A assinatura (MD5 de cada linha) só é recalculada a partir da marca d'água
+menos MESES_REPROCESSAMENTO; o histórico anterior é conferido por contagem de linhas e, a cada
+DIAS_VERIFICACAO_COMPLETA, por uma verificação completa das assinaturas.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from comum import cache_parquet, conexao, esquemas
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DIR_PARQUET_PADRAO = 'parquet'
+ARQUIVO_MANIFESTO = '_manifest.json'
+DIR_DELTAS = '_deltas'
+MAX_DELTAS = 30  # Arquivos delta mantidos por mart (os mais antigos são apagados)
+ARQUIVO_PARTICAO = 'dados.parquet'
+COLUNAS_PARTICAO = ['ano', 'mes']
+COMPRESSAO = 'zstd'
+LINHAS_POR_LOTE = 100_000  # Linhas lidas do cursor do servidor por vez
+HASH_BLOCK_SIZE = 1024 * 1024
+MESES_REPROCESSAMENTO = 3  # Meses antes da marca d'água que sempre têm a assinatura recalculada
+DIAS_VERIFICACAO_COMPLETA = 7  # Intervalo máximo entre duas verificações das assinaturas de todo o mart
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError("A exportação Parquet requer o pyarrow. Execute: pip install pyarrow")
+
+
+def ler_manifesto(diretorio_mart):
+    """Manifesto da exportação anterior do mart ({} se não houver)."""
+    caminho = os.path.join(diretorio_mart, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def hash_arquivo(caminho):
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        while bloco := f.read(HASH_BLOCK_SIZE):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+def lotes_do_banco(engine: create_engine, schema, table_name, linhas_por_lote=LINHAS_POR_LOTE):
+    """
+    Lê o mart ordenado por ano/mes em lotes, com cursor do lado do servidor (stream_results):
+    a memória fica limitada a um lote, qualquer que seja o tamanho do mart.
+    """
+    query = text(f"SELECT * FROM {schema}.{table_name} ORDER BY {', '.join(COLUNAS_PARTICAO)}")
+    return conexao.ler_sql_em_lotes(engine, query, linhas_por_lote)
+
+
+def assinaturas_periodos(engine: create_engine, schema, table_name, desde=None, periodos=()):
+    """
+    Linhas e assinatura de cada período (ano, mes) do mart, calculadas no banco: soma dos
+    primeiros 64 bits do MD5 de cada linha (independe da ordem). Só uma linha por período
+    trafega, e qualquer reprocessamento de um mês muda a assinatura dele. Com desde=(ano, mes),
+    só os períodos a partir dele (e os informados em periodos) são assinados.
+    """
+    filtro = ""
+    parametros = {}
+    if desde is not None:
+        filtro = """
+            WHERE (ano, mes) >= (:ano_desde, :mes_desde)
+               OR (ano, mes) IN (SELECT * FROM unnest(CAST(:anos AS int[]), CAST(:meses AS int[])))"""
+        parametros = {'ano_desde': desde[0], 'mes_desde': desde[1],
+                      'anos': [ano for ano, _ in periodos], 'meses': [mes for _, mes in periodos]}
+    query = text(f"""
+        SELECT ano::int AS ano, mes::int AS mes, count(*) AS linhas,
+               sum(('x' || substr(md5(t::text), 1, 16))::bit(64)::bigint)::text AS assinatura
+        FROM {schema}.{table_name} t{filtro}
+        GROUP BY 1, 2
+    """)
+    with engine.connect() as conn:
+        return {(linha.ano, linha.mes): {'linhas': linha.linhas, 'assinatura': linha.assinatura}
+                for linha in conn.execute(query, parametros)}
+
+
+def contagens_periodos(engine: create_engine, schema, table_name, ate):
+    """
+    Linhas de cada período anterior a ate=(ano, mes). Sinal barato de mudança no histórico:
+    só count(*), sem o MD5 de cada linha, que é o que pesa em assinaturas_periodos.
+    """
+    query = text(f"""
+        SELECT ano::int AS ano, mes::int AS mes, count(*) AS linhas
+        FROM {schema}.{table_name}
+        WHERE (ano, mes) < (:ano_ate, :mes_ate)
+        GROUP BY 1, 2
+    """)
+    with engine.connect() as conn:
+        return {(linha.ano, linha.mes): linha.linhas
+                for linha in conn.execute(query, {'ano_ate': ate[0], 'mes_ate': ate[1]})}
+
+
+def _periodo_menos_meses(periodo, meses):
+    ano, mes = periodo
+    total = ano * 12 + mes - 1 - meses
+    return total // 12, total % 12 + 1
+
+
+def _assinaturas_atuais(engine: create_engine, schema, table_name, manifesto_anterior, verificacao_completa=False):
+    """
+    Assinaturas dos períodos do mart sem recalcular o MD5 de todo o histórico a cada execução.
+
+    A partir da marca d'água menos MESES_REPROCESSAMENTO (a janela que o dbt costuma reprocessar),
+    as assinaturas são sempre recalculadas. Antes dela, só os períodos cuja contagem de linhas
+    mudou (ou que surgiram) são assinados de novo; os demais reaproveitam a assinatura do manifesto.
+    Uma correção que mantenha a contagem de um mês antigo só é vista na verificação completa, que
+    roda sem manifesto, quando pedida ou quando a última tem mais de DIAS_VERIFICACAO_COMPLETA.
+    Retorna (assinaturas, se a verificação foi completa).
+    """
+    marca = manifesto_anterior.get('marca_dagua')
+    ultima_completa = manifesto_anterior.get('verificacao_completa_em')
+    if (verificacao_completa or not marca or not ultima_completa
+            or datetime.now() - datetime.fromisoformat(ultima_completa) > timedelta(days=DIAS_VERIFICACAO_COMPLETA)):
+        return assinaturas_periodos(engine, schema, table_name), True
+
+    desde = _periodo_menos_meses(tuple(marca), MESES_REPROCESSAMENTO)
+    historico = {(p['ano'], p['mes']): p for p in manifesto_anterior.get('particoes', [])
+                 if (p['ano'], p['mes']) < desde}
+    contagens = contagens_periodos(engine, schema, table_name, desde)
+    mudaram = sorted(periodo for periodo, linhas in contagens.items()
+                     if historico.get(periodo, {}).get('linhas') != linhas)
+    atuais = assinaturas_periodos(engine, schema, table_name, desde=desde, periodos=mudaram)
+    for periodo in contagens.keys() - atuais.keys():
+        atuais[periodo] = {'linhas': historico[periodo]['linhas'], 'assinatura': historico[periodo]['assinatura']}
+    logging.info(f"Modelo {table_name}: assinaturas recalculadas desde {desde[0]}-{desde[1]:02d} "
+                 f"e em {len(mudaram)} período(s) anteriores com contagem alterada.")
+    return atuais, False
+
+
+def lotes_dos_periodos(engine: create_engine, schema, table_name, periodos, linhas_por_lote=LINHAS_POR_LOTE):
+    """Como lotes_do_banco, mas só com as linhas dos períodos (ano, mes) informados."""
+    query = text(f"""
+        SELECT * FROM {schema}.{table_name}
+        WHERE (ano, mes) IN (SELECT * FROM unnest(CAST(:anos AS int[]), CAST(:meses AS int[])))
+        ORDER BY {', '.join(COLUNAS_PARTICAO)}
+    """)
+    parametros = {'anos': [ano for ano, _ in periodos], 'meses': [mes for _, mes in periodos]}
+    return conexao.ler_sql_em_lotes(engine, query, linhas_por_lote, params=parametros)
+
+
+def _gravar_particoes(lotes, schema_arrow, tabela_esquema, diretorio):
+    """
+    Grava os lotes (ordenados por ano/mes) em um arquivo por partição. Como as partições chegam
+    em sequência, só um ParquetWriter fica aberto por vez. Retorna as partições gravadas.
+    """
+    particoes = []
+    writer = None
+    chave_atual = None
+
+    def fechar():
+        if writer is not None:
+            writer.close()
+
+    try:
+        for lote in lotes:
+            lote = esquemas.aplicar_esquema(lote, tabela_esquema)
+            for chave, parte in lote.groupby(COLUNAS_PARTICAO, sort=False):
+                chave = tuple(int(v) for v in chave)
+                if chave != chave_atual:
+                    if chave_atual is not None and chave < chave_atual:
+                        raise ValueError(f"Lotes fora de ordem por {COLUNAS_PARTICAO}: {chave} após {chave_atual}.")
+                    fechar()
+                    caminho_relativo = os.path.join(*(f"{col}={v}" for col, v in zip(COLUNAS_PARTICAO, chave)),
+                                                    ARQUIVO_PARTICAO)
+                    caminho = os.path.join(diretorio, caminho_relativo)
+                    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                    writer = pq.ParquetWriter(caminho, schema_arrow, compression=COMPRESSAO, write_statistics=True)
+                    chave_atual = chave
+                    particoes.append({**dict(zip(COLUNAS_PARTICAO, chave)), 'caminho': caminho_relativo, 'linhas': 0})
+                parte = parte.drop(columns=COLUNAS_PARTICAO)
+                writer.write_table(pa.Table.from_pandas(parte, schema=schema_arrow, preserve_index=False))
+                particoes[-1]['linhas'] += len(parte)
+    finally:
+        fechar()
+    return particoes
+
+
+def _schemas(tabela_esquema):
+    """Esquema completo do mart e o dos arquivos de partição (sem as colunas de partição)."""
+    schema_completo = cache_parquet.schema_arrow(tabela_esquema)
+    schema_particao = pa.schema([campo for campo in schema_completo if campo.name not in COLUNAS_PARTICAO])
+    return schema_completo, schema_particao
+
+
+def _salvar_manifesto(diretorio_mart, manifesto):
+    caminho = os.path.join(diretorio_mart, ARQUIVO_MANIFESTO)
+    with open(f"{caminho}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2)
+    os.replace(f"{caminho}.tmp", caminho)
+
+
+def exportar_mart_parquet(lotes, tabela_esquema, nome_saida, diretorio_base=DIR_PARQUET_PADRAO) -> dict:
+    """
+    Exporta `lotes` (DataFrames ordenados por ano/mes) para <diretorio_base>/<nome_saida>/.
+
+    O dataset novo é montado num diretório temporário ao lado do destino e só então trocado com
+    o anterior (duas renomeações), então a pasta nunca expõe um dataset pela metade.
+    Retorna o manifesto gravado.
+    """
+    _exigir_pyarrow()
+    inicio = time.perf_counter()
+    os.makedirs(diretorio_base, exist_ok=True)
+    destino = os.path.join(diretorio_base, nome_saida)
+    # As colunas de partição ficam no caminho, não dentro dos arquivos
+    schema_completo, schema_arrow = _schemas(tabela_esquema)
+    hashes_anteriores = {p['caminho']: p['sha256'] for p in ler_manifesto(destino).get('particoes', [])}
+
+    diretorio_tmp = tempfile.mkdtemp(dir=diretorio_base, prefix=f'.{nome_saida}.', suffix='.tmp')
+    try:
+        particoes = _gravar_particoes(lotes, schema_arrow, tabela_esquema, diretorio_tmp)
+        for particao in particoes:
+            caminho = os.path.join(diretorio_tmp, particao['caminho'])
+            particao['bytes'] = os.path.getsize(caminho)
+            particao['sha256'] = hash_arquivo(caminho)
+            particao['alterada'] = hashes_anteriores.get(particao['caminho']) != particao['sha256']
+
+        manifesto = {
+            'mart': tabela_esquema,
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'formato': 'parquet',
+            'compressao': COMPRESSAO,
+            'particionamento': COLUNAS_PARTICAO,
+            'colunas': [{'nome': campo.name, 'tipo': str(campo.type)} for campo in schema_completo],
+            'linhas': sum(p['linhas'] for p in particoes),
+            'bytes': sum(p['bytes'] for p in particoes),
+            'particoes': particoes,
+            'particoes_removidas': sorted(set(hashes_anteriores) - {p['caminho'] for p in particoes}),
+        }
+        with open(os.path.join(diretorio_tmp, ARQUIVO_MANIFESTO), 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2)
+        os.chmod(diretorio_tmp, 0o755)
+
+        # Troca: o anterior sai do caminho, o novo entra, e só então o anterior é apagado
+        antigo = None
+        if os.path.exists(destino):
+            antigo = f"{diretorio_tmp}.antigo"
+            os.replace(destino, antigo)
+        os.replace(diretorio_tmp, destino)
+        if antigo:
+            shutil.rmtree(antigo, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(diretorio_tmp, ignore_errors=True)
+        raise
+
+    alteradas = sum(p['alterada'] for p in manifesto['particoes'])
+    logging.info(f"Modelo {tabela_esquema} exportado para {destino}/ em Parquet. Linhas: {manifesto['linhas']}, "
+                 f"partições: {len(particoes)} ({alteradas} alteradas), "
+                 f"{manifesto['bytes'] / 1024:.1f} KB em {time.perf_counter() - inicio:.2f}s")
+    return manifesto
+
+
+def exportar_mart_incremental(engine: create_engine, schema, table_name, nome_saida,
+                              diretorio_base=DIR_PARQUET_PADRAO, verificacao_completa=False) -> dict:
+    """
+    Exportação incremental de um mart para <diretorio_base>/<nome_saida>/.
+
+    Compara as assinaturas dos períodos no banco com as do manifesto e extrai só os períodos
+    novos ou reprocessados (ver _assinaturas_atuais: só a janela da marca d'água é assinada de
+    novo, salvo na verificação completa). As linhas extraídas são gravadas num arquivo delta
+    (_deltas/delta-<data>.parquet, com ano/mes) e as partições correspondentes do snapshot são
+    substituídas, uma a uma, por renomeação atômica; períodos que sumiram do mart são removidos.
+    O manifesto (com a nova marca d'água) é gravado por último. Retorna o manifesto.
+    """
+    _exigir_pyarrow()
+    inicio = time.perf_counter()
+    destino = os.path.join(diretorio_base, nome_saida)
+    os.makedirs(os.path.join(destino, DIR_DELTAS), exist_ok=True)
+    schema_completo, schema_particao = _schemas(table_name)
+
+    manifesto_anterior = ler_manifesto(destino)
+    anteriores = {(p['ano'], p['mes']): p for p in manifesto_anterior.get('particoes', [])}
+    atuais, completa = _assinaturas_atuais(engine, schema, table_name, manifesto_anterior, verificacao_completa)
+    agora = datetime.now()
+    verificado_em = agora.isoformat(timespec='seconds') if completa else manifesto_anterior.get('verificacao_completa_em')
+
+    pendentes = sorted(
+        periodo for periodo, assinatura in atuais.items()
+        if anteriores.get(periodo, {}).get('assinatura') != assinatura['assinatura']
+        or not os.path.exists(os.path.join(destino, anteriores[periodo]['caminho']))
+    )
+    removidos = sorted(set(anteriores) - set(atuais))
+    if not pendentes and not removidos:
+        logging.info(f"Modelo {table_name}: nenhum período novo ou reprocessado desde "
+                     f"{manifesto_anterior.get('marca_dagua')}. Nada a exportar.")
+        if completa:
+            manifesto_anterior['verificacao_completa_em'] = verificado_em
+            _salvar_manifesto(destino, manifesto_anterior)
+        return manifesto_anterior
+
+    diretorio_tmp = tempfile.mkdtemp(dir=destino, prefix='.incremental.', suffix='.tmp')
+    try:
+        # Delta: as linhas extraídas, com o esquema completo, gravadas enquanto as partições são montadas
+        caminho_delta_tmp = os.path.join(diretorio_tmp, 'delta.parquet')
+        with pq.ParquetWriter(caminho_delta_tmp, schema_completo, compression=COMPRESSAO) as writer_delta:
+            def lotes_com_delta():
+                for lote in lotes_dos_periodos(engine, schema, table_name, pendentes):
+                    lote = esquemas.aplicar_esquema(lote, table_name)
+                    writer_delta.write_table(pa.Table.from_pandas(lote, schema=schema_completo, preserve_index=False))
+                    yield lote
+
+            novas = _gravar_particoes(lotes_com_delta(), schema_particao, table_name, diretorio_tmp)
+
+        for particao in novas:
+            caminho = os.path.join(diretorio_tmp, particao['caminho'])
+            particao['bytes'] = os.path.getsize(caminho)
+            particao['sha256'] = hash_arquivo(caminho)
+            particao['assinatura'] = atuais[(particao['ano'], particao['mes'])]['assinatura']
+            particao['alterada'] = True
+
+        # Compactação do snapshot: troca partição a partição e remove os períodos que sumiram
+        for particao in novas:
+            caminho_final = os.path.join(destino, particao['caminho'])
+            os.makedirs(os.path.dirname(caminho_final), exist_ok=True)
+            os.replace(os.path.join(diretorio_tmp, particao['caminho']), caminho_final)
+        for periodo in removidos:
+            caminho_final = os.path.join(destino, anteriores[periodo]['caminho'])
+            if os.path.exists(caminho_final):
+                os.remove(caminho_final)
+            shutil.rmtree(os.path.dirname(caminho_final), ignore_errors=True)
+
+        arquivo_delta = os.path.join(DIR_DELTAS, f"delta-{agora.strftime('%Y%m%dT%H%M%S')}.parquet")
+        os.replace(caminho_delta_tmp, os.path.join(destino, arquivo_delta))
+    finally:
+        shutil.rmtree(diretorio_tmp, ignore_errors=True)
+
+    periodos_novos = {(p['ano'], p['mes']) for p in novas}
+    particoes = sorted(
+        [{**p, 'alterada': False} for periodo, p in anteriores.items()
+         if periodo not in periodos_novos and periodo not in removidos] + novas,
+        key=lambda p: (p['ano'], p['mes'])
+    )
+    deltas = manifesto_anterior.get('deltas', []) + [{
+        'arquivo': arquivo_delta,
+        'gerado_em': agora.isoformat(timespec='seconds'),
+        'periodos': [list(periodo) for periodo in sorted(periodos_novos)],
+        'periodos_removidos': [list(periodo) for periodo in removidos],
+        'linhas': sum(p['linhas'] for p in novas),
+    }]
+    for antigo in deltas[:-MAX_DELTAS]:
+        caminho_antigo = os.path.join(destino, antigo['arquivo'])
+        if os.path.exists(caminho_antigo):
+            os.remove(caminho_antigo)
+
+    manifesto = {
+        'mart': table_name,
+        'gerado_em': agora.isoformat(timespec='seconds'),
+        'formato': 'parquet',
+        'compressao': COMPRESSAO,
+        'particionamento': COLUNAS_PARTICAO,
+        'colunas': [{'nome': campo.name, 'tipo': str(campo.type)} for campo in schema_completo],
+        'linhas': sum(p['linhas'] for p in particoes),
+        'bytes': sum(p['bytes'] for p in particoes),
+        'marca_dagua': list(max(atuais)) if atuais else None,
+        'verificacao_completa_em': verificado_em,
+        'particoes': particoes,
+        'particoes_removidas': [anteriores[periodo]['caminho'] for periodo in removidos],
+        'deltas': deltas[-MAX_DELTAS:],
+    }
+    _salvar_manifesto(destino, manifesto)
+
+    logging.info(f"Modelo {table_name} exportado de forma incremental para {destino}/. "
+                 f"Períodos extraídos: {len(novas)} ({deltas[-1]['linhas']} linhas), removidos: {len(removidos)}, "
+                 f"marca d'água: {manifesto['marca_dagua']}, em {time.perf_counter() - inicio:.2f}s")
+    return manifesto
@@ -0,0 +1,18 @@
+"""
+Testes das funções puras do projeto (sem banco). Os módulos não são um pacote instalável: cada
+um põe o próprio diretório no sys.path, então os testes fazem o mesmo.
+
+Execução (na raiz do repositório):
+    python -m pytest -q
+"""
+import os
+import sys
+
+DIR_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for diretorio in (DIR_RAIZ,
+                  os.path.join(DIR_RAIZ, 'FlaskLight'),
+                  os.path.join(DIR_RAIZ, 'dbtProject'),
+                  os.path.join(DIR_RAIZ, 'dbtProject', 'run')):
+    if diretorio not in sys.path:
+        sys.path.insert(0, diretorio)
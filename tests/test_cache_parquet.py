@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from comum import cache_parquet
+
+
+@pytest.fixture
+def csv(tmp_path):
+    caminho = tmp_path / 'medicoes_energia.csv'
+    caminho.write_text('id_medicao,consumo_kwh\n1,10.5\n', encoding='utf-8')
+    return caminho
+
+
+def caminho_indice(csv):
+    return os.path.join(cache_parquet.diretorio_cache(csv), csv.name + cache_parquet.SUFIXO_INDICE_HASH)
+
+
+def test_hash_e_o_sha256_do_csv_e_fica_num_indice_por_arquivo(csv):
+    assert cache_parquet.hash_arquivo(csv) == hashlib.sha256(csv.read_bytes()).hexdigest()
+    with open(caminho_indice(csv), encoding='utf-8') as f:
+        entrada = json.load(f)
+    assert entrada['tamanho'] == csv.stat().st_size
+    assert entrada['mtime_ns'] == csv.stat().st_mtime_ns
+
+
+def test_indice_e_reaproveitado_se_tamanho_e_mtime_nao_mudaram(csv):
+    cache_parquet.hash_arquivo(csv)
+    with open(caminho_indice(csv), encoding='utf-8') as f:
+        entrada = json.load(f)
+    entrada['sha256'] = 'do-indice'
+    with open(caminho_indice(csv), 'w', encoding='utf-8') as f:
+        json.dump(entrada, f)
+    assert cache_parquet.hash_arquivo(csv) == 'do-indice'
+
+
+def test_csv_alterado_recalcula_o_hash(csv):
+    cache_parquet.hash_arquivo(csv)
+    csv.write_text('id_medicao,consumo_kwh\n1,10.5\n2,20.0\n', encoding='utf-8')
+    assert cache_parquet.hash_arquivo(csv) == hashlib.sha256(csv.read_bytes()).hexdigest()
+
+
+def test_indice_corrompido_e_ignorado(csv):
+    os.makedirs(cache_parquet.diretorio_cache(csv))
+    with open(caminho_indice(csv), 'w', encoding='utf-8') as f:
+        f.write('{"tamanho": ')  # gravação interrompida
+    assert cache_parquet.hash_arquivo(csv) == hashlib.sha256(csv.read_bytes()).hexdigest()
+
+
+def test_indices_de_csvs_diferentes_sao_independentes(tmp_path, csv):
+    outro = tmp_path / 'clientes.csv'
+    outro.write_text('id_cliente\n1\n', encoding='utf-8')
+    cache_parquet.hash_arquivo(csv)
+    cache_parquet.hash_arquivo(outro)
+    assert os.path.exists(caminho_indice(csv)) and os.path.exists(caminho_indice(outro))
+
+
+def test_gravacao_atomica_nao_deixa_temporario(tmp_path):
+    destino = tmp_path / 'arquivo.json'
+
+    def escrever(caminho_tmp):
+        with open(caminho_tmp, 'w', encoding='utf-8') as f:
+            f.write('ok')
+
+    cache_parquet._gravar_atomicamente(str(destino), escrever)
+    assert destino.read_text(encoding='utf-8') == 'ok'
+
+    def falhar(caminho_tmp):
+        with open(caminho_tmp, 'w', encoding='utf-8') as f:
+            f.write('pela metade')
+        raise OSError('disco cheio')
+
+    with pytest.raises(OSError):
+        cache_parquet._gravar_atomicamente(str(destino), falhar)
+    assert destino.read_text(encoding='utf-8') == 'ok'
+    assert os.listdir(tmp_path) == ['arquivo.json']
@@ -0,0 +1,32 @@
+import base64
+
+import pytest
+
+import app as flasklight
+
+
+@pytest.mark.parametrize('chave, id_localizacao', [
+    ('barbosa_MG', '27494643245edc6deefb76d08daf67c1'),
+    ('são joão d\'aliança_GO', 'abc'),
+    ('', ''),
+])
+def test_cursor_ida_e_volta(chave, id_localizacao):
+    cursor = flasklight.codificar_cursor_duplicatas(chave, id_localizacao)
+    assert flasklight.decodificar_cursor_duplicatas(cursor) == (chave, id_localizacao)
+
+
+def test_cursor_e_seguro_para_url():
+    cursor = flasklight.codificar_cursor_duplicatas('?&/+=_MG', 'x' * 40)
+    assert cursor.isascii()
+    assert not set(cursor) & set('+/?&')
+
+
+@pytest.mark.parametrize('cursor', [
+    'nao-e-base64!',
+    base64.urlsafe_b64encode(b'{"a": 1}').decode('ascii'),
+    base64.urlsafe_b64encode(b'["so um"]').decode('ascii'),
+    'çã',
+])
+def test_cursor_invalido_levanta_value_error(cursor):
+    with pytest.raises(ValueError):
+        flasklight.decodificar_cursor_duplicatas(cursor)
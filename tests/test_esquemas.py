@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from comum import esquemas
+
+
+def test_ddl_enums_cria_cada_enum_so_se_nao_existir():
+    ddl = esquemas.ddl_enums()
+    assert ddl.startswith('DO $$\nBEGIN\n') and ddl.endswith('\nEND\n$$;')
+    for nome, valores in esquemas.ENUMS_POSTGRES.items():
+        assert f"IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = '{nome}') THEN" in ddl
+        assert f"CREATE TYPE {nome} AS ENUM ({', '.join(repr(v) for v in valores)});" in ddl
+    assert ddl.count('END IF;') == len(esquemas.ENUMS_POSTGRES)
+
+
+def test_enums_usados_nas_tabelas_estao_declarados():
+    tipos = {tipo_pg for esquema in esquemas.ESQUEMAS.values() for _, _, tipo_pg in esquema['colunas']}
+    assert {tipo for tipo in tipos if tipo.endswith('_enum')} <= set(esquemas.ENUMS_POSTGRES)
+
+
+@pytest.mark.parametrize('tabela', list(esquemas.ESQUEMAS))
+def test_numeric_e_lido_como_float64(tabela):
+    # float32 não representa NUMERIC(10, 2) com centavos exatos (ex.: 1234567.89)
+    for nome, dtype, tipo_pg in esquemas.ESQUEMAS[tabela]['colunas']:
+        if tipo_pg.startswith('NUMERIC'):
+            assert dtype == 'float64', nome
+
+
+def test_tabela_do_arquivo():
+    assert esquemas.tabela_do_arquivo('clientes.csv') == 'clientes_bruto'
+    with pytest.raises(KeyError):
+        esquemas.tabela_do_arquivo('inexistente.csv')
+
+
+def test_aplicar_esquema_converte_so_as_colunas_presentes():
+    df = pd.DataFrame({
+        'id_medicao': [1, 2],
+        'consumo_kwh': ['1234567.89', '0.10'],
+        'data_medicao': ['2025-01-01', '2025-02-01'],
+        'extra': ['a', 'b'],
+    })
+    resultado = esquemas.aplicar_esquema(df, 'medicoes_energia_bruto')
+    assert resultado['id_medicao'].dtype == 'int32'
+    assert resultado['consumo_kwh'].tolist() == [1234567.89, 0.10]
+    assert pd.api.types.is_datetime64_any_dtype(resultado['data_medicao'])
+    assert resultado['extra'].tolist() == ['a', 'b']
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as flasklight
+
+
+def especificacao_medicoes(**extras):
+    return flasklight.montar_especificacao_mock({
+        'dataset': 'medicoes',
+        'clientes': {'inicio': 1001, 'fim': 1004},
+        'periodo': {'inicio': '2024-11', 'fim': '2025-02'},
+        'seed': 42,
+        **extras,
+    })
+
+
+def test_grade_cliente_x_mes_completa():
+    especificacao = especificacao_medicoes()
+    assert especificacao['total_linhas'] == 16
+    df = flasklight.gerar_lote_mock(especificacao, 0, 16, np.random.default_rng(0))
+
+    assert len(df) == 16
+    assert sorted(df.columns) == ['consumo_kwh', 'data_medicao', 'id_cliente', 'tipo_medicao']
+    assert df.groupby('id_cliente').size().to_dict() == {1001: 4, 1002: 4, 1003: 4, 1004: 4}
+    meses = pd.to_datetime(df['data_medicao'])
+    assert (meses.dt.day == 1).all()  # medições: dia 1 do mês
+    assert sorted(meses.dt.strftime('%Y-%m').unique()) == ['2024-11', '2024-12', '2025-01', '2025-02']
+    assert df['consumo_kwh'].between(600, 3000).all()
+    assert (df['tipo_medicao'] == 'Normal').all()
+
+
+def test_lotes_concatenados_equivalem_a_grade_inteira():
+    especificacao = especificacao_medicoes()
+    inteira = flasklight.gerar_lote_mock(especificacao, 0, 16, np.random.default_rng(0))
+    lotes = pd.concat([flasklight.gerar_lote_mock(especificacao, inicio, min(inicio + 5, 16), np.random.default_rng(0))
+                       for inicio in range(0, 16, 5)], ignore_index=True)
+    pd.testing.assert_frame_equal(lotes[['id_cliente', 'data_medicao']], inteira[['id_cliente', 'data_medicao']])
+
+
+def test_mesma_seed_gera_os_mesmos_valores():
+    especificacao = especificacao_medicoes()
+    a = flasklight.gerar_lote_mock(especificacao, 0, 16, np.random.default_rng(especificacao['seed']))
+    b = flasklight.gerar_lote_mock(especificacao, 0, 16, np.random.default_rng(especificacao['seed']))
+    pd.testing.assert_frame_equal(a, b)
+
+
+def test_perdas_por_estado_com_dia_aleatorio_dentro_do_mes():
+    especificacao = flasklight.montar_especificacao_mock({
+        'dataset': 'perdas',
+        'estados': ['sp', 'RJ'],
+        'periodo': {'inicio': '2024-01', 'fim': '2024-12'},
+        'meses': [2],
+        'distribuicao': {'tipo': 'normal', 'media': 700, 'desvio': 50, 'min': 0},
+    })
+    df = flasklight.gerar_lote_mock(especificacao, 0, especificacao['total_linhas'], np.random.default_rng(1))
+
+    assert df['estado'].tolist() == ['SP', 'RJ']
+    datas = pd.to_datetime(df['data_perda'])
+    assert (datas.dt.month == 2).all() and datas.dt.day.between(1, 29).all()
+    assert (df[['perda_tecnica_kwh', 'perda_nao_tecnica_kwh']] >= 0).all().all()
+
+
+@pytest.mark.parametrize('parametros', [
+    {'dataset': 'inexistente'},
+    {'dataset': 'medicoes', 'clientes': {'inicio': 5, 'fim': 1}, 'periodo': {'inicio': '2025-01', 'fim': '2025-02'}},
+    {'dataset': 'medicoes', 'clientes': {'inicio': 1, 'fim': 2}, 'periodo': {'inicio': '2025-13', 'fim': '2025-02'}},
+    {'dataset': 'medicoes', 'clientes': {'inicio': 1, 'fim': 2}, 'periodo': {'inicio': '2025-01', 'fim': '2025-02'},
+     'tipo_medicao': 'Desconhecida'},
+    {'dataset': 'perdas', 'periodo': {'inicio': '2025-01', 'fim': '2025-02'},
+     'distribuicao': {'consumo_kwh': {'tipo': 'uniforme', 'min': 0, 'max': 1}}},
+])
+def test_especificacao_invalida_levanta_value_error(parametros):
+    with pytest.raises(ValueError):
+        flasklight.montar_especificacao_mock(parametros)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_enrichment
+
+CHAVES = data_enrichment.CHAVES_SERIE_CONSUMO
+
+
+def gerar_frame(n_series=6, n_meses=30, fracao_lacunas=0.0, seed=7):
+    """(ano, mes, estado, tipo_cliente, consumo_total_kwh), n_meses a partir de nov/2022."""
+    rng = np.random.default_rng(seed)
+    serie = np.repeat(np.arange(n_series), n_meses)
+    indice_mes = np.tile(np.arange(n_meses), n_series) + 2022 * 12 + 10
+    df = pd.DataFrame({
+        'ano': indice_mes // 12,
+        'mes': indice_mes % 12 + 1,
+        'estado': [f'E{s // 2}' for s in serie],
+        'tipo_cliente': ['Residencial' if s % 2 else 'Comercial' for s in serie],
+        'consumo_total_kwh': rng.gamma(2.0, 500.0, size=len(serie)).round(2),
+    })
+    if fracao_lacunas:
+        df = df[rng.random(len(df)) >= fracao_lacunas].reset_index(drop=True)
+    # Linhas fora de ordem: o cálculo não pode depender da ordenação da entrada
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def media_movel_lambda(df, janela):
+    """Implementação anterior: rolling por posição de linha, uma lambda por grupo."""
+    df = df.sort_values(CHAVES + ['ano', 'mes'])
+    return df.groupby(CHAVES)['consumo_total_kwh'].transform(
+        lambda x: x.rolling(window=janela, min_periods=1).mean()).sort_index()
+
+
+@pytest.mark.parametrize('janela', [3, 6, 12])
+def test_sem_lacunas_reproduz_o_rolling_por_grupo(janela):
+    df = gerar_frame()
+    resultado = data_enrichment.calcular_janelas_moveis(df, 'consumo_total_kwh', CHAVES, janelas=(janela,), yoy=False)
+    np.testing.assert_allclose(resultado[f'consumo_medio_movel_{janela}m'], media_movel_lambda(df, janela))
+
+
+def test_com_lacunas_a_janela_e_de_calendario():
+    df = pd.DataFrame({
+        'ano': [2024, 2024, 2024],
+        'mes': [1, 2, 5],  # março e abril ausentes
+        'estado': ['SP'] * 3,
+        'tipo_cliente': ['Residencial'] * 3,
+        'consumo_total_kwh': [100.0, 200.0, 400.0],
+    })
+    resultado = data_enrichment.calcular_janelas_moveis(df, 'consumo_total_kwh', CHAVES, janelas=(3,), yoy=False)
+    # Maio: a janela mar-mai só tem maio (o rolling por linhas puxaria jan e fev)
+    assert resultado['consumo_medio_movel_3m'].tolist() == [100.0, 150.0, 400.0]
+    assert media_movel_lambda(df, 3).iloc[2] == pytest.approx(700 / 3)
+
+
+def test_yoy_so_com_o_mesmo_mes_do_ano_anterior():
+    df = pd.DataFrame({
+        'ano': [2023, 2023, 2024, 2024],
+        'mes': [1, 2, 1, 3],
+        'estado': ['RJ'] * 4,
+        'tipo_cliente': ['Comercial'] * 4,
+        'consumo_total_kwh': [100.0, 80.0, 150.0, 90.0],
+    })
+    resultado = data_enrichment.calcular_janelas_moveis(df, 'consumo_total_kwh', CHAVES, janelas=(3,), yoy=True)
+    assert resultado['consumo_yoy_delta_kwh'].iloc[2] == pytest.approx(50.0)
+    assert resultado['consumo_yoy_pct'].iloc[2] == pytest.approx(50.0)
+    assert resultado['consumo_yoy_delta_kwh'].iloc[[0, 1, 3]].isna().all()
+
+
+def test_linha_repetida_na_serie_levanta_value_error():
+    df = gerar_frame(n_series=1, n_meses=3)
+    with pytest.raises(ValueError):
+        data_enrichment.calcular_janelas_moveis(pd.concat([df, df.iloc[:1]]), 'consumo_total_kwh', CHAVES)
+
+
+def test_frame_vazio_ganha_as_colunas():
+    df = gerar_frame().iloc[0:0]
+    resultado = data_enrichment.calcular_janelas_moveis(df, 'consumo_total_kwh', CHAVES, janelas=(3, 6), yoy=True)
+    assert resultado.empty
+    assert {'consumo_medio_movel_3m', 'consumo_medio_movel_6m', 'consumo_yoy_pct'} <= set(resultado.columns)
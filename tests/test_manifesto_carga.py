@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+import data_loader
+
+
+def test_manifesto_inexistente_e_vazio(tmp_path):
+    assert data_loader.ler_manifesto(str(tmp_path / 'manifesto.json')) == {}
+
+
+def test_manifesto_ida_e_volta_sem_temporario(tmp_path):
+    caminho = str(tmp_path / 'manifesto.json')
+    manifesto = {'clientes.csv': {'tamanho': 10, 'mtime_ns': 1, 'sha256': 'abc', 'marca_dagua': 1000}}
+    data_loader.salvar_manifesto(manifesto, caminho)
+    assert data_loader.ler_manifesto(caminho) == manifesto
+    assert os.listdir(tmp_path) == ['manifesto.json']
+
+
+def test_impressao_digital_calcula_o_sha256(tmp_path):
+    csv = tmp_path / 'clientes.csv'
+    csv.write_bytes(b'id_cliente\n1\n')
+    digital = data_loader.impressao_digital(str(csv))
+    assert digital == {'tamanho': csv.stat().st_size, 'mtime_ns': csv.stat().st_mtime_ns,
+                       'sha256': hashlib.sha256(b'id_cliente\n1\n').hexdigest()}
+
+
+def test_impressao_digital_reaproveita_o_hash_se_o_arquivo_nao_mudou(tmp_path):
+    csv = tmp_path / 'clientes.csv'
+    csv.write_bytes(b'id_cliente\n1\n')
+    anterior = {**data_loader.impressao_digital(str(csv)), 'sha256': 'do-manifesto'}
+    assert data_loader.impressao_digital(str(csv), anterior)['sha256'] == 'do-manifesto'
+
+    csv.write_bytes(b'id_cliente\n1\n2\n')
+    assert data_loader.impressao_digital(str(csv), anterior)['sha256'] == hashlib.sha256(b'id_cliente\n1\n2\n').hexdigest()
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+import app as flasklight
+
+
+def medicoes(**colunas):
+    base = {
+        'id_cliente': ['1', '2'],
+        'data_medicao': ['2025-01-15', '2025-02-01'],
+        'consumo_kwh': ['10.456', '0'],
+        'tipo_medicao': ['Normal', 'Estimada'],
+    }
+    base.update(colunas)
+    return pd.DataFrame(base)
+
+
+def test_medicoes_validas_saem_tipadas():
+    df, erros, invalidas = flasklight.validar_medicoes(medicoes())
+    assert (erros, invalidas) == ([], 0)
+    assert list(df.columns) == flasklight.COLUNAS_INGESTAO
+    assert df['id_cliente'].dtype == 'int32'
+    assert df['consumo_kwh'].tolist() == [10.46, 0.0]
+    assert df['data_medicao'].tolist() == [pd.Timestamp('2025-01-15'), pd.Timestamp('2025-02-01')]
+    assert df['tipo_medicao'].dtype == 'category'
+
+
+def test_coluna_ausente_levanta_value_error():
+    with pytest.raises(ValueError, match='consumo_kwh'):
+        flasklight.validar_medicoes(medicoes().drop(columns=['consumo_kwh']))
+
+
+@pytest.mark.parametrize('coluna, valor', [
+    ('id_cliente', '0'),
+    ('id_cliente', '1.5'),
+    ('id_cliente', str(2**31)),
+    ('id_cliente', 'abc'),
+    ('data_medicao', '15/01/2025'),
+    ('consumo_kwh', '-1'),
+    ('consumo_kwh', '100000000'),
+    ('tipo_medicao', 'normal'),
+])
+def test_valor_invalido_e_apontado_por_linha_e_coluna(coluna, valor):
+    entrada = medicoes()
+    entrada.loc[1, coluna] = valor
+    df, erros, invalidas = flasklight.validar_medicoes(entrada)
+    assert df is None
+    assert invalidas == 1
+    assert erros == [{'linha': 2, 'coluna': coluna, 'valor': valor}]
+
+
+def test_erros_sao_limitados_mas_a_contagem_nao():
+    n = flasklight.MAX_ERROS_VALIDACAO + 5
+    df, erros, invalidas = flasklight.validar_medicoes(pd.DataFrame({
+        'id_cliente': ['0'] * n,
+        'data_medicao': ['2025-01-01'] * n,
+        'consumo_kwh': ['-1'] * n,
+        'tipo_medicao': ['Normal'] * n,
+    }))
+    assert df is None
+    assert invalidas == n
+    assert len(erros) == flasklight.MAX_ERROS_VALIDACAO
+    assert [erro['linha'] for erro in erros] == sorted(erro['linha'] for erro in erros)